@@ -63,7 +63,12 @@
 #
 
 import io
+import os
+import time
+import shutil
+import tempfile
 import zipfile
+import concurrent.futures
 
 from . import AfpUtilities
 from .AfpUtilities import *
@@ -72,6 +77,385 @@ from .AfpUtilities.AfpBaseUtilities import *
 
 from . import AfpBaseRoutines
 from .AfpBaseRoutines import *
+
+## maximal number of compiled templates held in cache
+AfpAusgabe_templates_size = 32
+## cache of compiled templates, key: absolute path of template file
+AfpAusgabe_templates = {}
+
+## get compiled template for given file \n
+# the template is compiled once and reused as long as size and modification time of the file do not change
+# @param filename - path to flavoured file
+def AfpAusgabe_getTemplate(filename):
+    path = os.path.abspath(filename)
+    info = os.stat(path)
+    stamp = (info.st_mtime_ns, info.st_size)
+    template = AfpAusgabe_templates.get(path)
+    if template is None or not template.stamp == stamp:
+        template = AfpAusgabeTemplate(path, stamp)
+        if not path in AfpAusgabe_templates and len(AfpAusgabe_templates) >= AfpAusgabe_templates_size:
+            AfpAusgabe_templates.pop(next(iter(AfpAusgabe_templates)))
+        AfpAusgabe_templates[path] = template
+    return template
+## clear cache of compiled templates and template packages
+def AfpAusgabe_clearTemplates():
+    AfpAusgabe_templates.clear()
+    AfpAusgabe_packages.clear()
+## cache of template packages (packed .odt files), key: absolute path of package file
+AfpAusgabe_packages = {}
+## maximal size of a template package entry held in cache, larger entries are copied from the package file
+AfpAusgabe_package_entry_size = 262144
+
+## get entries of a template package (.odt) \n
+# list of [zipinfo, data], data of the 'content.xml' entry is None, 
+# data of entries larger than AfpAusgabe_package_entry_size is False. \n
+# The entries are read once and reused as long as size and modification time of the file do not change.
+# @param template - path to empty template package
+def AfpAusgabe_getPackage(template):
+    path = os.path.abspath(template)
+    info = os.stat(path)
+    stamp = (info.st_mtime_ns, info.st_size)
+    package = AfpAusgabe_packages.get(path)
+    if package is None or not package[0] == stamp:
+        entries = []
+        tmpl_file = zipfile.ZipFile(path,'r')
+        for entry in tmpl_file.infolist():
+            if entry.filename == 'content.xml':
+                entries.append([entry, None])
+            elif entry.file_size > AfpAusgabe_package_entry_size:
+                entries.append([entry, False])
+            else:
+                entries.append([entry, tmpl_file.read(entry.filename)])
+        tmpl_file.close()
+        package = [stamp, entries]
+        if not path in AfpAusgabe_packages and len(AfpAusgabe_packages) >= AfpAusgabe_templates_size:
+            AfpAusgabe_packages.pop(next(iter(AfpAusgabe_packages)))
+        AfpAusgabe_packages[path] = package
+    return package[1]
+## result file written while a flavoured file is inflated \n
+# .fodt and .xml files are written plain, for .odt files the entries of the template package are copied 
+# and the inflated text is written and compressed directly into the 'content.xml' entry. \n
+# The result is written into a temporary file in the target directory, which replaces the target file 
+# only when the result is finished by 'close', an existing target file stays untouched if the result is aborted.
+class AfpAusgabeResult(object):
+    ## constructor, opens temporary file and copies template package entries in front of 'content.xml'
+    # @param filename - name of file to be written
+    # @param template - name of empty template package to be used for .odt files
+    def  __init__(self, filename, template = None):
+        self.filename = filename
+        self.tempname = None
+        self.stream = None
+        self.odt_file = None
+        self.tmpl_file = None
+        self.entries = []
+        try:
+            if filename[-5:] == ".fodt" or filename[-4:] == ".xml":
+                self.stream = open(self.open_tempfile(), 'w', encoding='UTF-8') 
+            elif filename[-4:] == ".odt" and template and template[-4:] == ".odt":
+                self.entries = list(AfpAusgabe_getPackage(template))
+                self.tmpl_file = zipfile.ZipFile(template,'r')
+                self.odt_file = zipfile.ZipFile(self.open_tempfile(),'w')
+                while self.entries:
+                    entry, data = self.entries.pop(0)
+                    if data is None:
+                        self.stream = io.TextIOWrapper(self.odt_file.open(entry, 'w'), encoding='UTF-8', newline='')
+                        break
+                    self.copy_entry(entry, data)
+        except:
+            self.abort()
+            raise
+    ## create temporary file in the directory of the result file, 
+    # the access rights are set as they would be for a newly created result file
+    def open_tempfile(self):
+        path = os.path.abspath(self.filename)
+        fd, self.tempname = tempfile.mkstemp(prefix = "." + os.path.basename(path) + ".", dir = os.path.dirname(path))
+        os.close(fd)
+        if os.path.exists(path):
+            mode = os.stat(path).st_mode & 0o777
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(self.tempname, mode)
+        return self.tempname
+    ## copy template package entry into result
+    # @param entry - zipinfo of entry
+    # @param data - cached data of entry, if False entry is copied from the package file
+    def copy_entry(self, entry, data):
+        if data is False:
+            fin = self.tmpl_file.open(entry)
+            fout = self.odt_file.open(entry, 'w')
+            shutil.copyfileobj(fin, fout)
+            fout.close()
+            fin.close()
+        else:
+            self.odt_file.writestr(entry, data)
+    ## write text into result
+    # @param text - text to be written
+    def write(self, text):
+        if self.stream: self.stream.write(text)
+    ## finish result, copies template package entries behind 'content.xml', 
+    # closes file and moves it to the name of the result file
+    def close(self):
+        try:
+            if self.stream: 
+                self.stream.close()
+                self.stream = None
+            if self.odt_file:
+                for entry, data in self.entries:
+                    self.copy_entry(entry, data)
+                self.entries = []
+                self.odt_file.close()
+                self.tmpl_file.close()
+                self.odt_file = None
+                self.tmpl_file = None
+            if self.tempname:
+                os.replace(self.tempname, self.filename)
+                self.tempname = None
+        except:
+            self.abort()
+            raise
+    ## abort result, closes all files and removes the temporary file, the result file is not touched
+    def abort(self):
+        for fobj in [self.stream, self.odt_file, self.tmpl_file]:
+            if fobj:
+                try:
+                    fobj.close()
+                except Exception:
+                    pass
+        self.stream = None
+        self.odt_file = None
+        self.tmpl_file = None
+        self.entries = []
+        if self.tempname:
+            if os.path.exists(self.tempname): os.remove(self.tempname)
+            self.tempname = None
+
+## write result file, \n
+# .fodt and .xml files are written plain, .odt files are packed using the given template package
+# @param filename - name of file to be written
+# @param content - inflated text, string or text stream
+# @param template - name of empty template package to be used for .odt files
+def AfpAusgabe_writeResult(filename, content, template = None):
+    start = time.time()
+    result = AfpAusgabeResult(filename, template)
+    try:
+        if Afp_isString(content):
+            result.write(content)
+        elif result.stream:
+            content.seek(0)
+            shutil.copyfileobj(content, result.stream)
+    except:
+        result.abort()
+        raise
+    result.close()
+    return filename, time.time() - start
+## correct line, no '<>' brackets in execution brackets '[]', '{}'
+# @param line - line to be corrected
+def AfpAusgabe_correctLine(line):
+    if "[" in line:
+        line = AfpAusgabe_moveXmlTags(line, "[","]")
+    if "{" in line:
+        line = AfpAusgabe_moveXmlTags(line, "{","}")
+    return line
+## move xml tags out of given brackets
+# @param line - line, where tags should be moved
+# @param start - open brackets identifier
+# @param end - close brackets identifier
+def AfpAusgabe_moveXmlTags(line, start, end):
+    insides, outsides = Afp_between(line, start, end)
+    oplus = len(outsides) - len(insides)
+    if oplus: newline = outsides[0]
+    else: newline = ""
+    for i in range(len(insides)):
+        entry = insides[i]
+        insi, inso = Afp_between(entry, "<", ">")
+        if insi:
+            inside = ""
+            infront = ""
+            behind = ""
+            for ins in inso:
+                inside += ins
+            for ins in insi:
+                if ins[0] == "/":
+                    behind += "<" + ins + ">"
+                else:
+                    infront += "<" + ins + ">"
+            entry = infront + start + inside + end + behind
+        else:
+            entry = start + entry + end
+        newline += entry + outsides[i+oplus]
+    return newline
+
+## compiled line of a flavoured file \n
+# holds the corrected text and its parts: literal segments, field references, condition and WHILE header. \n
+# The parts are resolved when the line is first executed and reused by all following renderings.
+class AfpAusgabeLine(object):
+    ## constructor
+    # @param text - corrected text of line
+    def  __init__(self, text):
+        self.text = text
+        self.action = None
+        self.netto = None
+        self.while_flag = None
+        self.condition = None
+        self.output = None
+        self.header = None
+        self.felder = None
+        self.correlation = None
+    ## return parts inside and outside of '{}' brackets
+    def get_action(self):
+        if self.action is None:
+            self.action, self.netto = Afp_between(self.text, "{", "}")
+        return self.action, self.netto
+    ## return while flag: 0- no while, 1- start, 2- end
+    def get_while(self):
+        if self.while_flag is None:
+            self.while_flag = 0
+            action, netto = self.get_action()
+            if len(action) == 1 and action[0][:5] == "WHILE":
+                if action[0] == "WHILE END":
+                    self.while_flag = 2
+                else:
+                    self.while_flag = 1
+        return self.while_flag
+    ## return condition type ("IF", "ELSE IF", "ELSE" or None) and phrase to be evaluated
+    def get_condition(self):
+        if self.condition is None:
+            typ = None
+            phrase = None
+            action, netto = self.get_action()
+            if len(action) == 1:
+                if action[0][0:2] == "IF":
+                    typ = "IF"
+                    phrase = action[0][3:].strip()
+                elif action[0][0:4] == "ELSE":
+                    if len(action[0]) > 6 and action[0][5:7] == "IF":
+                        typ = "ELSE IF"
+                        phrase = action[0][6:].strip()
+                    else:
+                        typ = "ELSE"
+            self.condition = [typ, phrase]
+        return self.condition
+    ## return field references and literal segments of text to be written
+    def get_output(self):
+        if self.output is None:
+            action, netto = self.get_action()
+            if len(action) == 1: line = "".join(netto)
+            else: line = self.text
+            self.output = Afp_between(line, "[", "]")
+        return self.output
+    ## return parsed WHILE header \n
+    # [valid, function, function fields, order, datsels, clause fields, clause segments],
+    # clause fields are None for 'ROWS IN' loops
+    def get_header(self):
+        if self.header is None:
+            valid = False
+            function = ""
+            words = []
+            order = None
+            datsels = ""
+            fields = None
+            netto = None
+            action, anetto =  self.get_action()
+            if len(action) == 1 and action[0][:5] == "WHILE":
+                valid = True
+                split_func = action[0].split("FUNCTION")
+                if len(split_func) == 2:
+                    function = split_func[1].strip()
+                    words = Afp_getWords(function,".")
+                clause = split_func[0][6:]
+                if "ORDER BY" in clause:
+                    split = clause.split("ORDER BY")
+                    order = split[1].strip()
+                    clause = split[0].strip()
+                if clause[:7] == "ROWS IN":
+                    clause = clause[8:]
+                    if "AS" in clause:
+                        split = clause.split("AS")
+                        datsels = split[0].strip()
+                else:
+                    fields, netto = Afp_between(clause,"[","]")
+            self.header = [valid, function, words, order, datsels, fields, netto]
+        return self.header
+    ## return correlation of a WHILE header of the form {WHILE [Field.Outer] = Column.Inner} \n
+    # [field of outer loop, column of inner table], or None if header does not have this form
+    def get_correlation(self):
+        if self.correlation is None:
+            self.correlation = False
+            valid, function, words, order, datsels, fields, netto = self.get_header()
+            if valid and fields and len(fields) == 1 and len(netto) == 2 and not netto[0].strip():
+                feld = fields[0].strip()
+                split = netto[1].split()
+                if len(split) == 2 and split[0] == "=" and "." in split[1] and "." in feld and Afp_floatString(split[1], None) is None:
+                    self.correlation = [feld, split[1]]
+        if self.correlation: return self.correlation
+        return None
+    ## return fields used in this line, when it is part of a WHILE block
+    def get_felder(self):
+        if self.felder is None:
+            felder = []
+            fields, netto =  Afp_between(self.text,"[","]")
+            for field in fields: 
+                split = field.split(",")
+                if len(split) > 1:
+                    for sp in split:
+                        if not sp in felder: felder.append(sp)
+                elif "(" in field:
+                    fld, netto =  Afp_between(self.text,"(",")")
+                    split = Afp_split(fld[0],["+","-"])
+                    for spl in split:
+                        if not spl in felder: felder.append(spl)
+                elif "=" in field:
+                    split = field.split("=")
+                    if len(split) == 2:
+                        if not split[1] in felder: felder.append(split[1])
+                else:
+                    if not field in felder: felder.append(field)
+            self.felder = felder
+        return self.felder
+
+## compiled flavoured file \n
+# holds the corrected lines and the resolved field lists of the WHILE blocks
+class AfpAusgabeTemplate(object):
+    ## constructor
+    # @param filename - path to flavoured file
+    # @param stamp - modification time and size of file at compile time
+    def  __init__(self, filename, stamp = None):
+        self.filename = filename
+        self.stamp = stamp
+        self.lines = []
+        self.blocks = {}
+        fin = open(filename, 'r', encoding="UTF-8") 
+        for line in fin:
+            self.lines.append(AfpAusgabeLine(AfpAusgabe_correctLine(line)))
+        fin.close()
+    ## return resolved fields of a WHILE block \n
+    # list of [field, table], table is None for variables
+    # @param words - fields used in the function of the WHILE header
+    # @param lines - compiled lines of the block
+    def get_block_fields(self, words, lines):
+        key = (tuple(words), tuple(lines))
+        if not key in self.blocks:
+            self.blocks[key] = AfpAusgabe_resolveFields(words, lines)
+        return self.blocks[key]
+
+## resolve fields used in a WHILE block
+# @param words - fields used in the function of the WHILE header
+# @param lines - compiled lines of the block
+def AfpAusgabe_resolveFields(words, lines):
+    felder = list(words)
+    for line in lines:
+        for feld in line.get_felder():
+            if not feld in felder: felder.append(feld)
+    fields = []
+    for feld in felder:
+        split = feld.split(".")
+        if  len(split) > 1:
+            fields.append([feld, split[1].strip()])
+        else:
+            fields.append([feld, None])
+    return fields
   
 ## main class to handle document output   
 class AfpAusgabe(object):
@@ -104,8 +488,10 @@ class AfpAusgabe(object):
             self.serial_index = None
         self.datas_variables = None
         self.filecontent = None
+        self.template = None
         self.debug = debug
         self.tempfile = io.StringIO()
+        self.result = None
         #self.tempfile = tempfile.NamedTemporaryFile('w')
         #self.tempfile = open("/tmp/AfpTemp.txt", 'w') 
         self.serial_text = None
@@ -115,6 +501,8 @@ class AfpAusgabe(object):
         self.line_stack = [[]]
         self.stack_index = 0
         self.index_stack = [0]
+        self.prefetched = {}
+        self.prefetch_size = 500 # maximal number of keys in one prefetch query, 0: no prefetch
         self.serialized_variables = []
         self.variables = {}
         self.dummies = []
@@ -123,6 +511,7 @@ class AfpAusgabe(object):
     ## Destruktor      
     def __del__(self):
         if self.debug: print("AfpAusgabe Destruktor")
+        if getattr(self, "result", None): self.abort_resultfile()
     ## attach file which holds data to be used to inflate the flavoured text-file, \n
     # this may be used if no direct access to a mysql database is possible, only works if no data is given (self.data is None)
     # (used by the -d option of the commandline call)
@@ -154,17 +543,12 @@ class AfpAusgabe(object):
     # output:  0- no while, 1- start, 2- end
     # @param line - line to be analysed
     def is_while(self, line):
-        while_flag = 0
-        action, netto= Afp_between(line,"{","}")
-        if len(action) == 1:
-            if action[0][:5] == "WHILE":
-                if action[0] == "WHILE END":
-                    while_flag = 2
-                else:
-                    while_flag = 1
-        #else:
-            #print "is_while:",action, netto
-        return while_flag
+        return self.compiled(line).get_while()
+    ## return compiled version of line
+    # @param line - line text or already compiled line
+    def compiled(self, line):
+        if isinstance(line, AfpAusgabeLine): return line
+        return AfpAusgabeLine(line)
     ## check if all variables have been deliverd for a file
     # @param vars - dictionary holding variable values
     def check_variables(self, filename):
@@ -180,20 +564,27 @@ class AfpAusgabe(object):
             
     ## main method for reading an analysing flavoured file,
     # inflate the given file with data \n
-    # - the file is read here, WHILEs are handeled here 
+    # - the file is compiled once and held in a cache, WHILEs are handeled here 
     # - other options are delegated
     # @param filename - path to flavoured file
     def inflate(self, filename):
+        try:
+            self.inflate_lines(filename)
+        except:
+            # result file opened with open_resultfile is discarded, an existing file stays untouched
+            if self.result: self.abort_resultfile()
+            raise
+    ## inflate the lines of the given file, see 'inflate'
+    # @param filename - path to flavoured file
+    def inflate_lines(self, filename):
         if self.data is None:
             self.load_values_from_data()
-        #fin = open(filename, 'r') 
-        fin = open(filename, 'r', encoding="UTF-8") 
-        #self.line_stack.append([])
+        self.template = AfpAusgabe_getTemplate(filename)
         self.line_stack = [[]]
-        for line in fin:
-            #if self.debug: print "AfpAusgabe.inflate:", line
-            line = self.correct_line(line)
-            if self.serial_text and not self.serial_tag_include and self.serial_tag_end in line:
+        for line in self.template.lines:
+            #if self.debug: print "AfpAusgabe.inflate:", line.text
+            text = line.text
+            if self.serial_text and not self.serial_tag_include and self.serial_tag_end in text:
                 # invoke serial text before the end-tag line is executed
                 self.loop_serial_text()
             self.handle_line(line)
@@ -202,17 +593,16 @@ class AfpAusgabe(object):
                 self.serial_text.append(line)
             if self.serial_data:
                 if self.serial_text is None:
-                    if self.serial_tag_start in line :
+                    if self.serial_tag_start in text :
                         if self.serial_tag_start_skips:
                             self.serial_tag_start_skips -= 1
                         else:
                             # start sampling of serialised text, either with or without the actuel line
                             if self.serial_tag_include: self.serial_text = [line]
                             else: self.serial_text = []
-                elif self.serial_tag_include and self.serial_tag_end in line: 
+                elif self.serial_tag_include and self.serial_tag_end in text: 
                     # invoke serial text including end-tag line
                     self.loop_serial_text()
-        fin.close()
     ## handle serial data
     def loop_serial_text(self):
         if self.debug: print("AfpAusgabe.loop_serial_text:", self.serial_text)
@@ -235,7 +625,8 @@ class AfpAusgabe(object):
     # - other options are delegated
     # @param line - line to be proceeded
     def handle_line(self, line):
-        is_while = self.is_while(line)
+        line = self.compiled(line)
+        is_while = line.get_while()
         if is_while == 1:
             # start of new while loop
             self.line_stack[self.index_stack[-1]].append(line)
@@ -254,6 +645,7 @@ class AfpAusgabe(object):
                     #print "AfpAusgabe.inflate:", self.line_stack
                     self.execute_while(self.line_stack[0][0], 1)
                     # whiles executed, clear stack
+                    self.prefetched = {}
                     self.line_stack = [[]]
                     self.stack_index = 0
                     self.index_stack = [0]
@@ -288,39 +680,13 @@ class AfpAusgabe(object):
     ## correct line, no '<>' brackets in execution brackets '[]', '{}'
     # @paream line - line to be corrected
     def correct_line(self, line):
-        if "[" in line:
-            line = self.move_xml_tags(line, "[","]")
-        if "{" in line:
-            line = self.move_xml_tags(line, "{","}")
-        return line
+        return AfpAusgabe_correctLine(line)
     ## move xml tags out of given brackets
     # @param line - line, where tags should be moved
     # @param start - open brackets identifier
     # @param end - close brackets identifier
     def move_xml_tags(self, line, start, end):
-        insides, outsides = Afp_between(line, start, end)
-        oplus = len(outsides) - len(insides)
-        if oplus: newline = outsides[0]
-        else: newline = ""
-        for i in range(len(insides)):
-            entry = insides[i]
-            insi, inso = Afp_between(entry, "<", ">")
-            if insi:
-                inside = ""
-                infront = ""
-                behind = ""
-                for ins in inso:
-                    inside += ins
-                for ins in insi:
-                    if ins[0] == "/":
-                        behind += "<" + ins + ">"
-                    else:
-                        infront += "<" + ins + ">"
-                entry = infront + start + inside + end + behind
-            else:
-                entry = start + entry + end
-            newline += entry + outsides[i+oplus]
-        return newline
+        return AfpAusgabe_moveXmlTags(line, start, end)
     ## replace special html-tag by unicode sign for formulas
     # @phrase - string where tags have to be replaced
     def replace_html_tags(self, phrase):
@@ -335,28 +701,33 @@ class AfpAusgabe(object):
     # - line evaluation is deligated
     # @param line - line to be analysed
     def execute_line(self,line):
-        action, netto= Afp_between(line,"{","}")
+        line = self.compiled(line)
+        action, netto = line.get_action()
         #print "AfpAusgabe.execute_line:", action, netto
         if len(action) == 1:
-            #print "AfpAusgabe.execute_line:", action, netto
+            typ, phrase = line.get_condition()
             condition = False
-            if action[0][0:2] == "IF":
-                phrase = action[0][3:].strip()
+            if typ == "IF":
                 condition = self.evaluate_condition(phrase)
                 if condition:
-                    self.write_line(netto)
+                    self.write_compiled(line)
                 else:
                     self.execute_else = True
-            elif action[0][0:4] == "ELSE" and self.execute_else:
-                if len(action[0]) > 6 and action[0][5:7] == "IF":
-                    phrase = action[0][6:].strip()
+            elif typ and self.execute_else:
+                if typ == "ELSE IF":
                     condition = self.evaluate_condition(phrase)
                     if condition:
-                        self.write_line(netto)
+                        self.write_compiled(line)
                 else:
-                    self.write_line (netto)
+                    self.write_compiled(line)
         else:
-            self.write_line([line])
+            self.write_compiled(line)
+    ## write compiled line to temporary file, field references are replaced by values
+    # @param line - compiled line to be written
+    def write_compiled(self, line):
+        self.execute_else = None
+        fields, netto = line.get_output()
+        self.tempfile.write(self.concat_line(fields, netto))
     ## handle proper line evaluation including []-phrases and write line to temporary file \n
     # input may be given as list, that is interpreted as one line
     # @param lines - parts of one line to be analysed
@@ -587,16 +958,23 @@ class AfpAusgabe(object):
     # @param file_index - current index of the line in datafile
     def execute_while(self, while_line, stack_index, file_index = 0):  
         indices = None
+        prefetched = False
         while_clause, feldnamen, dsnamen, function, order = self.while_input(while_line, stack_index)
         if self.data is None:
             rows, indices = self.extract_rows_from_file(feldnamen, while_clause, file_index)
         else:
             #print ("AfpAusgabe.execute_while select:", feldnamen, while_clause, dsnamen, order)
             if while_clause:
-                rows = self.data.mysql.select(feldnamen, while_clause, dsnamen, order) 
+                rows = self.get_prefetched(while_line, stack_index, feldnamen, dsnamen, order)
+                if rows is None:
+                    rows = self.data.mysql.select(feldnamen, while_clause, dsnamen, order) 
+                else:
+                    prefetched = True
             else:
                 rows = self.extract_rows_from_data(feldnamen)            
             #print "AfpAusgabe.execute_while rows:", len(rows), "\n", rows
+            if rows and not prefetched and self.prefetch_size:
+                self.prefetch_while(stack_index, feldnamen, rows)
         felder = feldnamen.split(",")
         local_lines = self.line_stack[stack_index]
         if function:
@@ -619,7 +997,7 @@ class AfpAusgabe(object):
                 for line in local_lines:
                     if self.debug: print("AfpAusgabe.execute_while Linie", local_lines.index(line))
                     #print line
-                    if self.is_while(line) == 1:
+                    if line.get_while() == 1:
                         # start of new while loop
                         if self.debug: print("NEW WHILE:", stack_index + 1, "stack length",len(self.line_stack))
                         if indices is None:
@@ -629,72 +1007,99 @@ class AfpAusgabe(object):
                             self.execute_while(line, stack_index + 1, indices[i])
                             if self.debug: print("END NEW WHILE")
                     else:
-                        if self.debug: print("AfpAusgabe.execute_while execute linie", local_lines.index(line), "of WHILE", stack_index, "Linie:", line)
+                        if self.debug: print("AfpAusgabe.execute_while execute linie", local_lines.index(line), "of WHILE", stack_index, "Linie:", line.text)
                         self.execute_line(line)
+    ## prefetch rows of correlated nested WHILE loops for all rows of the outer loop \n
+    # one query with 'IN (...)' is used per nested loop, the result is grouped by the key value, 
+    # deeper levels are prefetched recursively from the grouped rows
+    # @param stack_index - index of the lines of the outer loop in self.line_stack
+    # @param feldnamen - names of fields delivered in the rows of the outer loop
+    # @param rows - rows of the outer loop
+    def prefetch_while(self, stack_index, feldnamen, rows):
+        child = stack_index + 1
+        if child >= len(self.line_stack): return
+        felder = feldnamen.split(",")
+        for line in self.line_stack[stack_index]:
+            if not line.get_while() == 1: continue
+            correlation = line.get_correlation()
+            if correlation is None: continue
+            feld, column = correlation
+            if not feld in felder: continue
+            ind = felder.index(feld)
+            keys = []
+            groups = {}
+            for row in rows:
+                key = row[ind]
+                if not type(key) == int:
+                    keys = None
+                    break
+                if not key in groups:
+                    groups[key] = []
+                    keys.append(key)
+            if not keys: continue
+            # generate field and table names of nested loop with the first key
+            marker = feld in self.values
+            value = self.values.get(feld)
+            self.values[feld] = keys[0]
+            clause, names, dats, function, order = self.while_input(line, child)
+            if marker: self.values[feld] = value
+            else: self.values.pop(feld)
+            lgh = len(names.split(","))
+            fetched = []
+            for i in range(0, len(keys), self.prefetch_size):
+                select = column + " IN ( " + " , ".join(Afp_toString(key) for key in keys[i:i+self.prefetch_size]) + " )"
+                for row in self.data.mysql.select(names + "," + column, select, dats, order):
+                    if not row[-1] in groups:
+                        fetched = None
+                        break
+                    groups[row[-1]].append(row[:lgh])
+                    fetched.append(row[:lgh])
+                if fetched is None: break
+            if self.debug: print("AfpAusgabe.prefetch_while:", child, column, len(keys), "keys", fetched is not None)
+            if fetched is None: continue
+            self.prefetched[(child, line)] = [feld, names, dats, order, groups]
+            if fetched:
+                self.prefetch_while(child, names, fetched)
+    ## return prefetched rows for a nested WHILE loop, if available
+    # @param while_line - holds the while conditions
+    # @param stack_index - index of the lines in this while loop in self.line_stack
+    # @param feldnamen - names of fields needed in this loop
+    # @param dsnamen - names of tables needed in this loop
+    # @param order - order clause of this loop
+    def get_prefetched(self, while_line, stack_index, feldnamen, dsnamen, order):
+        entry = self.prefetched.get((stack_index, while_line))
+        if entry and entry[1] == feldnamen and entry[2] == dsnamen and entry[3] == order:
+            key = self.values.get(entry[0])
+            if type(key) == int and key in entry[4]:
+                return entry[4][key]
+        return None
     ## analyses the while_line, \n
     # extracts the while_clause, fields, tables and optional the function
     # @param while_line - holds the while conditions
     # @param stack_index - index of the lines in this while loop in self.line_stack
     def while_input(self, while_line, stack_index):
         #print "AfpAusgabe.while_input input:", while_line, stack_index, self.line_stack
-        function = ""
-        datsels = ""
-        order = None
-        action, netto =  Afp_between(while_line,"{","}")
-        if len(action) == 1 and action[0][:5] == "WHILE":
-            split_func = action[0].split("FUNCTION")
-            if len(split_func) == 2:
-                # extract function
-                function = split_func[1].strip()
-                #funct, netto =  Afp_between(split_func[1],"(",")")
-                #function = funct[0]
+        valid, function, words, order, datsels, fields, netto = self.compiled(while_line).get_header()
+        if valid:
             # extract where clause for database access
-            clause = split_func[0][6:]
-            #print "AfpAusgabe.while_input split:", split_func, clause, "ORDER BY" in clause
-            if "ORDER BY" in clause:
-                split = clause.split("ORDER BY")
-                order = split[1].strip()
-                clause = split[0].strip()
-            if clause[:7] == "ROWS IN":
-                clause = clause[8:]
-                if "AS" in clause:
-                    split = clause.split("AS")
-                    datsels = split[0].strip()
+            if fields is None:
                 clause = ""
             else:
-                fields, netto = Afp_between(clause,"[","]")
                 clause = self.concat_line(fields, netto, True)
                 clause = clause.replace(":","and")
                 clause = clause.replace("!","or")
             clause = self.replace_html_tags(clause)
             #print "AfpAusgabe.while_input clause:", clause
             # get needed fieds from lines 
-            felder = []
-            if function: felder += Afp_getWords(function,".")
-            for line in self.line_stack[stack_index]:
-                fields, netto =  Afp_between(line,"[","]")
-                for field in fields: 
-                    split = field.split(",")
-                    if len(split) > 1:
-                        for sp in split:
-                            if not sp in felder: felder.append(sp)
-                    elif "(" in field:
-                        fld, netto =  Afp_between(line,"(",")")
-                        split = Afp_split(fld[0],["+","-"])
-                        for spl in split:
-                            if not spl in felder: felder.append(spl)
-                    elif "=" in field:
-                        split = field.split("=")
-                        if len(split) == 2:
-                            if not split[1] in felder: felder.append(split[1])
-                    else:
-                        if not field in felder: felder.append(field)
+            lines = self.line_stack[stack_index]
+            if self.template:
+                felder = self.template.get_block_fields(words, lines)
+            else:
+                felder = AfpAusgabe_resolveFields(words, lines)
             dats= []
             feldnamen = ""
-            for feld in felder:
-                split = feld.split(".")
-                if  len(split) > 1:
-                    spl = split[1].strip()
+            for feld, spl in felder:
+                if  not spl is None:
                     if clause and not spl in dats:
                         dats.append(spl)
                         datsels += ","+ spl
@@ -869,38 +1274,152 @@ class AfpAusgabe(object):
         if Afp_isString(wert): wert = Afp_fromString(wert)
         value = Afp_addDaysToDate(wert, int(vars[1]), sign)
         return value
+    ## open result file before inflating, \n
+    # inflated lines are directly written into a temporary file, the result is finished by write_resultfile
+    # or discarded by abort_resultfile (automatically done, if inflate fails)
+    # @param filename - name of file to be written
+    # @param template - name of empty template file to be used for writing in output format
+    def open_resultfile(self, filename, template = None):
+        if self.debug: print("AfpAusgabe.open_resultfile:", filename, template)
+        self.result = AfpAusgabeResult(filename, template)
+        if self.result.stream:
+            self.tempfile = self.result
+        else:
+            self.result = None
+    ## discard result file opened with open_resultfile, the temporary file is removed
+    def abort_resultfile(self):
+        if self.debug: print("AfpAusgabe.abort_resultfile:", self.result.filename)
+        self.result.abort()
+        self.result = None
+        self.tempfile = io.StringIO()
     ## write result to file \n
+    # if result file has been opened with open_resultfile, it is closed here \n
     # currently only .xml, .fodt and .odt files are implemented
     # @param filename - name of file to be written
     # @param template - name of empty template file to be used for writing in output format
     def write_resultfile(self, filename, template = None):
         if self.debug: print("AfpAusgabe.write_resultfile input:", filename, template)
+        if self.result:
+            # result has been written while inflating, close moves the temporary file to the result file
+            result = self.result
+            self.result = None
+            self.tempfile = io.StringIO()
+            result.close()
+            if not result.filename == filename:
+                shutil.copyfile(result.filename, filename)
+            return
         ext = None
         if filename[-5] == ".": 
             ext =  filename[-5:]
         elif filename[-4] == ".": 
             ext = filename[-4:]
-        if ext == ".fodt" or ext == ".xml":
-            # write plain file (fodt or xml)
-            #fout = open(filename, 'w') 
-            fout = open(filename, 'w', encoding='UTF-8') 
-            fout.write(self.tempfile.getvalue())
-            fout.close()
-        elif filename[-4:] == ".odt":
-            # write zipped odt file
-            if template and template[-4:] == ".odt":
-                #Afp_copyFile(template, filename) 
-                tmpl_file = zipfile.ZipFile(template,'r')
-                odt_file = zipfile.ZipFile(filename,'w')
-                # get zipinfo list from templatefile, look for "content.xml" entry to write and compress tempfile data into it
-                list = tmpl_file.infolist() 
-                for entry in list: 
-                    if entry.filename == 'content.xml': 
-                       odt_file.writestr(entry, self.tempfile.getvalue()) 
-                    else:
-                        odt_file.writestr(entry, tmpl_file.read(entry.filename))
-                odt_file.close()  
-                tmpl_file.close()  
+        if ext == ".fodt" or ext == ".xml" or filename[-4:] == ".odt":
+            # write plain file (fodt or xml) or zipped odt file, 
+            # template entries are copied, tempfile data is written and compressed into the "content.xml" entry
+            AfpAusgabe_writeResult(filename, self.tempfile, template)
+
+## generate a batch of documents from one flavoured file \n
+# the documents are inflated one after the other in this process, as the data needs the database connection,
+# packing and writing of the result files is done in a pool of worker processes. \n
+# The compiled flavoured file and the entries of the template package are shared by all documents.
+class AfpAusgabeBatch(object):
+    ## constructor
+    # @param debug - flag for debug information
+    # @param template - name of empty template package to be used for .odt output
+    # @param workers - number of worker processes for writing, None: number of cpus, 0 or 1: write in this process
+    # @param serial_tags - if given, tags to drive serialisation, see AfpAusgabe
+    def  __init__(self, debug = False, template = None, workers = None, serial_tags = None):
+        self.debug = debug
+        self.template = template
+        self.serial_tags = serial_tags
+        if workers is None: workers = os.cpu_count()
+        self.workers = workers
+        self.variables = None
+        self.progress = None
+        self.report = []
+        self.total = 0
+        if self.debug: print("AfpAusgabeBatch Konstruktor") 
+    ## Destruktor      
+    def __del__(self):
+        if self.debug: print("AfpAusgabeBatch Destruktor")
+    ## set variables used for all documents
+    # @param vars - dictionary holding variable values
+    def set_variables(self, vars):
+        self.variables = vars
+    ## set routine to be called when a document has been written \n
+    # called with: number of written documents, total number of documents, report entry of document
+    # @param progress - routine to be called
+    def set_progress(self, progress):
+        self.progress = progress
+    ## generate name of result file
+    # @param filename - path to flavoured file
+    # @param targetdir - directory where result is written to
+    # @param index - index of document
+    def gen_name(self, filename, targetdir, index):
+        base = os.path.splitext(os.path.basename(filename))[0]
+        if self.template and self.template[-4:] == ".odt": ext = ".odt"
+        else: ext = filename[filename.rfind("."):]
+        return Afp_addRootpath(targetdir, base + "_" + Afp_toString(index + 1) + ext)
+    ## inflate one document 
+    # @param data - AfpSelectionList or list of AfpSelectionLists (serial letters) 
+    # @param filename - path to flavoured file
+    # @param vars - if given, dictionary of variables for this document
+    def inflate(self, data, filename, vars = None):
+        out = AfpAusgabe(self.debug, data, self.serial_tags)
+        if self.variables: out.set_variables(self.variables)
+        if vars: out.set_variables(vars)
+        out.inflate(filename)
+        return out.tempfile.getvalue()
+    ## add report entry of written document
+    # @param entry - report entry [result file, inflate time, write time]
+    # @param future - if given, future delivering the write time
+    def add_report(self, entry, future = None):
+        if future: entry[2] = future.result()[1]
+        self.report.append(entry)
+        if self.debug: print("AfpAusgabeBatch.add_report:", len(self.report), entry)
+        if self.progress: self.progress(len(self.report), self.total, entry)
+    ## generate documents, \n
+    # returns list of report entries [result file, inflate time, write time] in order of completion
+    # @param datas - list of data for the documents, each entry an AfpSelectionList or a list of AfpSelectionLists (serial letters)
+    # @param filename - path to flavoured file
+    # @param targetdir - directory where results are written to
+    # @param names - if given, list of names of result files, otherwise names are generated from filename 
+    # @param vars - if given, list of dictionaries of variables for each document
+    def execute(self, datas, filename, targetdir, names = None, vars = None):
+        self.report = []
+        self.total = len(datas)
+        pool = None
+        pending = {}
+        size = 0
+        if self.workers and self.workers > 1 and self.total > 1:
+            size = min(self.workers, self.total)
+            try:
+                pool = concurrent.futures.ProcessPoolExecutor(size)
+            except Exception as e:
+                print("WARNING: AfpAusgabeBatch worker processes not available:", e)
+        try:
+            for i in range(self.total):
+                if names: result = Afp_addRootpath(targetdir, names[i])
+                else: result = self.gen_name(filename, targetdir, i)
+                var = None
+                if vars: var = vars[i]
+                start = time.time()
+                content = self.inflate(datas[i], filename, var)
+                entry = [result, time.time() - start, None]
+                if pool:
+                    pending[pool.submit(AfpAusgabe_writeResult, result, content, self.template)] = entry
+                    if len(pending) >= 2*size:
+                        done, rest = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                        for future in done:
+                            self.add_report(pending.pop(future), future)
+                else:
+                    entry[2] = AfpAusgabe_writeResult(result, content, self.template)[1]
+                    self.add_report(entry)
+            for future in concurrent.futures.as_completed(list(pending)):
+                self.add_report(pending.pop(future), future)
+        finally:
+            if pool: pool.shutdown()
+        return self.report
 
 ## Main  program to be called from the commandline \n
 # call: AfpAusgabe.py -v -d /home/daten/Afp/pyAfp/Vorlagen/AnmeldungMehrfach_3_data.txt -t /home/daten/Afp/pyAfp/Vorlagen/empty.odt /home/daten/Afp/pyAfp/Vorlagen/AnmeldungMehrfach_3.fodt /tmp/AfpResult.odt \n
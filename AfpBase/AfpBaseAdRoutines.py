@@ -34,7 +34,7 @@ from AfpBase.AfpDatabase.AfpSQL import AfpSQLTableSelection
 from AfpBase.AfpSelectionLists import AfpSelectionList
 from AfpBase.AfpBaseRoutines import Afp_getOrderlistOfTable, Afp_getIndividualAccount
 from AfpBase.AfpUtilities.AfpBaseUtilities import Afp_getMaxOfColumn
-from AfpBase.AfpUtilities.AfpStringUtilities import Afp_toString
+from AfpBase.AfpUtilities.AfpStringUtilities import Afp_toString, Afp_replaceUml
 
 ## return list of status string   
 def AfpAdresse_StatusStrings():
@@ -83,20 +83,20 @@ def AfpAdresse_getOrderlistOfTable(mysql, index, datei = "ADRESSE"):
 def AfpAdresse_getKNrFromSingleName(mysql, name):
     KNr = None
     if name:
-        rows = mysql.execute("SELECT KundenNr FROM ADRESSE WHERE CONCAT(Vorname,\" \",Name) = \"" + name + "\";")
+        rows = mysql.cached_execute("SELECT KundenNr FROM ADRESSE WHERE CONCAT(Vorname,\" \",Name) = \"" + name + "\";", "ADRESSE")
         #print "AfpAdresse_getKNrFromSingleName:", name, rows
         if rows and len(rows) == 1:
             KNr = rows[0][0]
         if KNr is None:
-            rows = mysql.execute("SELECT KundenNr FROM ADRESSE WHERE CONCAT(Name,\" \",Vorname) = \"" + name + "\";")
+            rows = mysql.cached_execute("SELECT KundenNr FROM ADRESSE WHERE CONCAT(Name,\" \",Vorname) = \"" + name + "\";", "ADRESSE")
             if rows and len(rows) == 1:
                 KNr = rows[0][0]
         if KNr is None:
-            rows = mysql.execute("SELECT KundenNr FROM ADRESSE WHERE CONCAT(Name,\", \",Vorname) = \"" + name + "\";")
+            rows = mysql.cached_execute("SELECT KundenNr FROM ADRESSE WHERE CONCAT(Name,\", \",Vorname) = \"" + name + "\";", "ADRESSE")
             if rows and len(rows) == 1:
                 KNr = rows[0][0]
         if KNr is None:
-            rows = mysql.execute("SELECT KundenNr FROM ADRESSE WHERE Name = \"" + name + "\";")
+            rows = mysql.cached_execute("SELECT KundenNr FROM ADRESSE WHERE Name = \"" + name + "\";", "ADRESSE")
             if rows and len(rows) == 1:
                 KNr = rows[0][0]
     return KNr
@@ -106,11 +106,106 @@ def AfpAdresse_getKNrFromSingleName(mysql, name):
 def AfpAdresse_getKNrFromAlias(mysql, alias):
     KNr = None
     if alias:
-        rows = mysql.execute("SELECT KundenNr FROM ADRESATT WHERE Attribut = \"Alias\" AND AttText = \"" + alias + "\";")
+        rows = mysql.cached_execute("SELECT KundenNr FROM ADRESATT WHERE Attribut = \"Alias\" AND AttText = \"" + alias + "\";", "ADRESATT")
         #print "AfpAdresse_getKNrFromSingleName:", name, rows
         if rows and len(rows) == 1:
             KNr = rows[0][0]
     return KNr
+## normalise a name for a fuzzy comparison: \n
+# german umlauts are replaced by expanded letters, case and trailing blanks are ignored
+# @param name - name to be normalised
+def AfpAdresse_normaliseName(name):
+    return Afp_replaceUml(Afp_toString(name)).lower().rstrip(" ")
+
+## index to retrieve address identifiers from names, \n
+# the names are resolved in batched queries by the database, so the collations of the columns decide which names are equal,
+# the rules of AfpAdresse_getKNrFromSingleName and AfpAdresse_getKNrFromAlias are followed, 
+# the address-identifier is only returned if a unique result is found!
+class AfpAdresseNameIndex(object):
+    ## initialize AfpAdresseNameIndex class
+    # @param mysql - connection to database
+    # @param debug - flag for debug information
+    # @param chunk - maximal number of names resolved in one query
+    def  __init__(self, mysql, debug = False, chunk = 500):
+        self.mysql = mysql
+        self.debug = debug
+        self.chunk = chunk
+        # name -> KundenNr, None if no unique address has been found
+        self.names = {}
+        self.aliases = {}
+        # expressions compared with the name, in the order of AfpAdresse_getKNrFromSingleName
+        self.expressions = ["CONCAT(Vorname,\" \",Name)", "CONCAT(Name,\" \",Vorname)", "CONCAT(Name,\", \",Vorname)", "Name"]
+        if self.debug: print("AfpAdresseNameIndex Konstruktor")
+    ## destructor
+    def __del__(self):
+        if self.debug: print("AfpAdresseNameIndex Destruktor")
+    ## select addresses where the expression equals one of the given values, \n
+    # returns dictionary value -> KundenNr for values matching exactly one row
+    # @param table - name of table
+    # @param expression - expression compared with the values
+    # @param values - values to be looked for
+    # @param filter - if given, additional filter for the rows
+    def select_unique(self, table, expression, values, filter = None):
+        found = {}
+        Befehl = "SELECT FIELD(" + expression + ",%s), KundenNr FROM " + self.mysql.get_dbname(table) + " WHERE " + expression + " IN (%s)"
+        if filter: Befehl += " AND " + filter
+        cursor = self.mysql.get_cursor()
+        pending = list(values)
+        # FIELD only delivers the first of several values being equal by the collation,
+        # the unmatched values of batches with matches are looked for again in the next pass
+        while pending:
+            next_round = []
+            for start in range(0, len(pending), self.chunk):
+                batch = pending[start:start + self.chunk]
+                marks = ",".join(["%s"]*len(batch))
+                cursor.execute(Befehl % (marks, marks), batch + batch)
+                rows = cursor.fetchall()
+                if self.debug: print("AfpAdresseNameIndex.select_unique:", table, expression, len(batch), len(rows))
+                matches = {}
+                for index, KNr in rows:
+                    matches.setdefault(index, []).append(KNr)
+                for index in matches:
+                    if len(matches[index]) == 1: found[batch[index - 1]] = matches[index][0]
+                if matches:
+                    matched = set([batch[index - 1] for index in matches])
+                    next_round += [value for value in batch if not value in matched]
+            pending = next_round
+        return found
+    ## resolve names in advance, with one query per expression and chunk of names
+    # @param names - names to be resolved, see get_KNr
+    def resolve_names(self, names):
+        wanted = []
+        for name in names:
+            if name and not name in self.names:
+                self.names[name] = None
+                wanted.append(name)
+        for expression in self.expressions:
+            if not wanted: break
+            found = self.select_unique("ADRESSE", expression, wanted)
+            self.names.update(found)
+            wanted = [name for name in wanted if not name in found]
+    ## resolve aliases in advance, with one query per chunk of aliases
+    # @param aliases - aliases to be resolved, see get_KNr_from_alias
+    def resolve_aliases(self, aliases):
+        wanted = []
+        for alias in aliases:
+            if alias and not alias in self.aliases:
+                self.aliases[alias] = None
+                wanted.append(alias)
+        if wanted:
+            self.aliases.update(self.select_unique("ADRESATT", "AttText", wanted, "Attribut = \"Alias\""))
+    ## try to retrieve unique address from name, same as AfpAdresse_getKNrFromSingleName
+    # @param name - name given in the format 'firstname' + " " + 'lastname', 'lastname' + " " + 'firstname' or 'lastname'
+    def get_KNr(self, name):
+        if not name: return None
+        if not name in self.names: self.resolve_names([name])
+        return self.names[name]
+    ## try to retrieve unique address from alias attribut of address, same as AfpAdresse_getKNrFromAlias
+    # @param alias - alias of name given for search
+    def get_KNr_from_alias(self, alias):
+        if not alias: return None
+        if not alias in self.aliases: self.resolve_aliases([alias])
+        return self.aliases[alias]
         
 ## get values of fields in given selection for an address with given identifier \n
 # additionally the name is given, as it is commonly needed in following dial    ogs
@@ -518,6 +613,252 @@ class AfpAdresse(AfpSelectionList):
         return res
 
 
+## return phonetic code of a name ('Kölner Phonetik'), names sounding alike in german get the same code
+# @param name - name to be encoded
+def AfpAdresse_phonetic(name):
+    name = Afp_toString(name).upper()
+    for uml, char in [["Ä","A"], ["Ö","O"], ["Ü","U"], ["ß","S"]]:
+        name = name.replace(uml, char)
+    name = "".join([char for char in name if "A" <= char <= "Z"])
+    codes = ""
+    lgh = len(name)
+    for i in range(lgh):
+        char = name[i]
+        before = ""
+        after = ""
+        if i > 0: before = name[i-1]
+        if i < lgh - 1: after = name[i+1]
+        if char in "AEIJOUY": code = "0"
+        elif char == "H": code = ""
+        elif char == "B": code = "1"
+        elif char == "P":
+            if after == "H": code = "3"
+            else: code = "1"
+        elif char in "DT":
+            if after in "CSZ" and after: code = "8"
+            else: code = "2"
+        elif char in "FVW": code = "3"
+        elif char in "GKQ": code = "4"
+        elif char == "C":
+            if i == 0:
+                if after in "AHKLOQRUX" and after: code = "4"
+                else: code = "8"
+            elif before in "SZ" or not after in "AHKOQUX" or not after: code = "8"
+            else: code = "4"
+        elif char == "X":
+            if before in "CKQ" and before: code = "8"
+            else: code = "48"
+        elif char == "L": code = "5"
+        elif char in "MN": code = "6"
+        elif char == "R": code = "7"
+        else: code = "8"
+        codes += code
+    phonetic = ""
+    for i in range(len(codes)):
+        if i and codes[i] == codes[i-1]: continue
+        if codes[i] == "0" and i: continue
+        phonetic += codes[i]
+    return phonetic
+
+## return the set of character bigrams of a string, used to compute the similarity of strings
+# @param string - string to be split
+def AfpAdresse_getBigrams(string):
+    string = " " + string + " "
+    return frozenset([string[i:i+2] for i in range(len(string) - 1)])
+## return the similarity (Dice coefficient) of two sets of bigrams, between 0.0 and 1.0
+# @param a - first set of bigrams
+# @param b - second set of bigrams
+def AfpAdresse_getSimilarity(a, b):
+    if not a or not b: return 0.0
+    return 2.0*len(a & b)/(len(a) + len(b))
+
+## class to find duplicate addresses, \n
+# the addresses are grouped into blocks by normalised postcode, phonetic code of the surname and birthday,
+# only the pairs of addresses in the same block are compared, in large blocks only neighbours in the order of the names. 
+# The pairs are scored by the similarity of the character bigrams of name, street and mail. \n
+# The resulting merge proposals may be handed to AfpAdresse.hostile_takeover by 'merge'.
+class AfpAdresseDuplicates(object):
+    ## initialize AfpAdresseDuplicates class
+    # @param globals - global values including the mysql connection
+    # @param threshold - minimal score of pairs delivered as proposals, between 0.0 and 1.0
+    # @param debug - flag for debug information
+    def  __init__(self, globals, threshold = 0.85, debug = False):
+        self.globals = globals
+        self.mysql = globals.get_mysql()
+        self.threshold = threshold
+        self.debug = debug
+        self.name_threshold = 0.7 # pairs with less similar names are not scored further
+        self.max_block = 100 # in larger blocks only addresses with neighboured names are compared
+        self.window = 10 # number of neighbours compared in large blocks
+        self.weights = {"Name": 0.5, "Strasse": 0.25, "Mail": 0.15, "Geburtstag": 0.1}
+        self.records = None
+        self.proposals = None
+        self.merged = {} # KundenNr of merged address -> KundenNr of address it has been merged into
+        if self.debug: print("AfpAdresseDuplicates Konstruktor")
+    ## destructor
+    def __del__(self):
+        if self.debug: print("AfpAdresseDuplicates Destruktor")
+    ## normalise a street for comparison
+    # @param street - street to be normalised
+    def normalise_street(self, street):
+        street = AfpAdresse_normaliseName(street)
+        street = street.replace("strasse", "str").replace("str.", "str")
+        return "".join([char for char in street if char.isalnum()])
+    ## load addresses from database and generate the values needed for comparison
+    def load(self):
+        self.records = []
+        rows = self.mysql.select("KundenNr,Vorname,Name,Strasse,Plz,Geburtstag,Mail", None, "ADRESSE")
+        # names recur often, their normalised values and phonetic codes are only computed once
+        normalised = {}
+        phonetics = {}
+        for KNr, vorname, name, strasse, plz, geb, mail in rows:
+            if not vorname in normalised: normalised[vorname] = AfpAdresse_normaliseName(vorname or "").strip()
+            if not name in normalised: normalised[name] = AfpAdresse_normaliseName(name or "").strip()
+            vorname = normalised[vorname]
+            name = normalised[name]
+            if not name in phonetics: phonetics[name] = AfpAdresse_phonetic(name)
+            # the order of first and last name is ignored
+            fullname = " ".join(sorted((vorname + " " + name).split()))
+            street = self.normalise_street(strasse or "")
+            plz = "".join([char for char in Afp_toString(plz) if char.isdigit()])
+            mail = Afp_toString(mail).strip().lower()
+            grams = [AfpAdresse_getBigrams(fullname), None, None]
+            if street: grams[1] = AfpAdresse_getBigrams(street)
+            if mail: grams[2] = AfpAdresse_getBigrams(mail)
+            # [KundenNr, sortname, bigrams of name, street and mail, postcode, birthday, phonetic code]
+            self.records.append([KNr, name + " " + vorname, grams, plz, geb, phonetics[name]])
+        if self.debug: print("AfpAdresseDuplicates.load:", len(self.records), "addresses")
+    ## group the addresses into blocks, returns a dictionary block key -> list of indices in self.records
+    def gen_blocks(self):
+        blocks = {}
+        for i, record in enumerate(self.records):
+            keys = []
+            if record[5]: keys.append("N" + record[5])
+            if record[3]: keys.append("P" + record[3])
+            if record[4]: keys.append("G" + Afp_toString(record[4]))
+            for key in keys:
+                if key in blocks: blocks[key].append(i)
+                else: blocks[key] = [i]
+        if self.debug: print("AfpAdresseDuplicates.gen_blocks:", len(blocks), "blocks")
+        return blocks
+    ## generate the pairs of indices to be compared in one block
+    # @param block - list of indices in self.records
+    def gen_pairs(self, block):
+        lgh = len(block)
+        if lgh <= self.max_block:
+            for j in range(1, lgh):
+                for i in range(j):
+                    yield block[i], block[j]
+        else:
+            # sorted neighbourhood: only addresses with neighboured names are compared
+            block = sorted(block, key = lambda i: self.records[i][1])
+            for j in range(1, lgh):
+                for i in range(max(0, j - self.window), j):
+                    if block[i] < block[j]: yield block[i], block[j]
+                    else: yield block[j], block[i]
+    ## score the similarity of two addresses, returns the score and the names of the matching fields,
+    # None is returned, if the names are not similar enough
+    # @param a - values of first address
+    # @param b - values of second address
+    def score(self, a, b):
+        name = AfpAdresse_getSimilarity(a[2][0], b[2][0])
+        if name < self.name_threshold: return None
+        scores = {"Name": name}
+        if a[2][1] and b[2][1]:
+            street = AfpAdresse_getSimilarity(a[2][1], b[2][1])
+            if a[3] and b[3]:
+                street = 0.7*street + 0.3*(a[3] == b[3])
+            scores["Strasse"] = street
+        if a[2][2] and b[2][2]:
+            scores["Mail"] = AfpAdresse_getSimilarity(a[2][2], b[2][2])
+        if a[4] and b[4]:
+            scores["Geburtstag"] = float(a[4] == b[4])
+        total = 0.0
+        weight = 0.0
+        for feld in scores:
+            total += self.weights[feld]*scores[feld]
+            weight += self.weights[feld]
+        matching = [feld for feld in scores if scores[feld] >= self.threshold]
+        return total/weight, matching
+    ## scan all addresses for duplicates, returns the list of merge proposals ranked by score: \n
+    # [score, KundenNr to be kept, KundenNr to be merged, names of matching fields], the older address (lower KundenNr) is kept
+    def scan(self):
+        if self.records is None: self.load()
+        blocks = self.gen_blocks()
+        seen = set()
+        self.proposals = []
+        compared = 0
+        for key in blocks:
+            for pair in self.gen_pairs(blocks[key]):
+                if pair in seen: continue
+                seen.add(pair)
+                compared += 1
+                a = self.records[pair[0]]
+                b = self.records[pair[1]]
+                result = self.score(a, b)
+                if result is None or result[0] < self.threshold: continue
+                if a[0] < b[0]:
+                    self.proposals.append([result[0], a[0], b[0], result[1]])
+                else:
+                    self.proposals.append([result[0], b[0], a[0], result[1]])
+        self.proposals.sort(key = lambda proposal: (-proposal[0], proposal[1], proposal[2]))
+        if self.debug: print("AfpAdresseDuplicates.scan:", compared, "pairs compared,", len(self.proposals), "proposals")
+        return self.proposals
+    ## return the merge proposals, the scan is executed if not yet done
+    def get_proposals(self):
+        if self.proposals is None: self.scan()
+        return self.proposals
+    ## return the KundenNr of the address a given address survives in, after the merges already done
+    # @param KNr - KundenNr of address
+    def get_survivor(self, KNr):
+        root = KNr
+        while root in self.merged:
+            root = self.merged[root]
+        while KNr != root:
+            self.merged[KNr], KNr = root, self.merged[KNr]
+        return root
+    ## check if address is present in database
+    # @param KNr - KundenNr of address
+    def exists(self, KNr):
+        return bool(self.mysql.select("KundenNr", "KundenNr = " + Afp_toString(KNr), "ADRESSE"))
+    ## merge the addresses of a proposal, the address with the higher KundenNr is taken over by the other one, \n
+    # addresses already merged by former proposals are replaced by the address they survive in. \n
+    # returns True, if the addresses have been merged
+    # @param proposal - merge proposal as delivered by 'scan'
+    def merge(self, proposal):
+        keep = self.get_survivor(proposal[1])
+        gone = self.get_survivor(proposal[2])
+        if keep == gone: return False
+        if gone < keep: keep, gone = gone, keep
+        if not (self.exists(keep) and self.exists(gone)):
+            print("WARNING: AfpAdresseDuplicates.merge: address not found, merge skipped:", keep, gone)
+            return False
+        adresse = AfpAdresse(self.globals, keep, None, self.debug)
+        victim = AfpAdresse(self.globals, gone, None, self.debug)
+        adresse.hostile_takeover(victim)
+        self.merged[gone] = keep
+        return True
+    ## merge the addresses of several proposals, 
+    # all addresses connected by proposals are merged into the one with the lowest KundenNr, returns the number of merged addresses
+    # @param proposals - list of merge proposals as delivered by 'scan', default: all proposals
+    def merge_all(self, proposals = None):
+        if proposals is None: proposals = self.get_proposals()
+        groups = {}
+        for proposal in proposals:
+            a = self.get_survivor(proposal[1])
+            b = self.get_survivor(proposal[2])
+            while a in groups: a = groups[a]
+            while b in groups: b = groups[b]
+            if a < b: groups[b] = a
+            elif b < a: groups[a] = b
+        count = 0
+        for KNr in sorted(groups):
+            root = groups[KNr]
+            while root in groups: root = groups[root]
+            if self.merge([None, root, KNr, None]): count += 1
+        if self.debug: print("AfpAdresseDuplicates.merge_all:", count, "addresses merged")
+        return count
+
 ## get dictionary with required database tables and mysql generation code
 # @param flavour - if given flavour of modul
 def AfpAdresse_getSqlTables(flavour = None):
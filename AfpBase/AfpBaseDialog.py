@@ -1146,6 +1146,10 @@ class AfpDialog_Auswahl(wx.Dialog):
         self.link = None  
         self.ident = [None]
         self.offset = 0
+        self.identname = None # name of ident column
+        self.keyset_feldlist = None # field list used for keyset paging, sort value is delivered in the last but one column
+        self.keyset = None # [sort value, ident] of first row of actuel page
+        self.edges = [] # [sort value, ident] of the rows of actuel page
         # for the result
         self.result_index = -1
         self.result = None
@@ -1299,6 +1303,7 @@ class AfpDialog_Auswahl(wx.Dialog):
                     ident = feld
         self.feldlist = self.feldlist[:-1]
         if ident: self.feldlist += "," + ident
+        self.identname = ident
         self.cols = len(self.col_percents) 
         #print "AfpDialog_Auswahl.extract_grid_column_values 2:", self.cols, self.sortname, self.feldlist, self.link
     ## adjust grid rows and columns for dynamic resize of window            
@@ -1360,6 +1365,11 @@ class AfpDialog_Auswahl(wx.Dialog):
             self.SetTitle(self.typ + " Sortierung: " + self.sortname)
         if text: self.label_Auswahl.SetLabel(text)
         self.select = self.selectname  + " >= \"" + value + "\""
+        self.keyset_feldlist = None
+        if "." in self.sortname and self.identname and "." in self.identname and not " " in self.sortname.strip():
+            split = self.feldlist.split(",")
+            split.insert(len(split) - 1, self.sortname)
+            self.keyset_feldlist = ",".join(split)
         self.set_size()
         self.adjust_grid_rows()
         if where:
@@ -1385,14 +1395,76 @@ class AfpDialog_Auswahl(wx.Dialog):
                 size = (560,281)
         if size: 
             self.SetSize(size)
+    ## keyset paging is used, if the sort column is a direct table column and an ident column is available, \n
+    # the rows are then ordered by (sort column, ident) and pages are selected directly behind resp. before 
+    # the (sort value, ident) of the page edges, instead of skipping rows with 'LIMIT offset,rows'
+    def keyset_possible(self):
+        return not self.keyset_feldlist is None
+    ## generate order clause for keyset paging
+    # @param desc - flag if order should be descending
+    def keyset_order(self, desc = False):
+        if desc: postfix = " DESC"
+        else: postfix = ""
+        return self.sortname + postfix + " , " + self.identname + postfix
+    ## generate value for a select clause for keyset paging, \n
+    # strings holding double quotes or backslashes are delivered as hex literals, so they are never interpreted
+    # @param value - value to be converted
+    def keyset_value(self, value):
+        if type(value) == int or type(value) == float: return str(value)
+        value = Afp_toInternDateString(value)
+        if "\"" in value or "\\" in value:
+            return "_utf8mb4 X'" + value.encode("UTF-8").hex() + "'"
+        return "\"" + value + "\""
+    ## generate select clause for keyset paging, \n
+    # rows with NULL as sort value are ordered in front of all other rows, as done by the database
+    # @param sign - comparison sign to be used, '>=' or '<'
+    # @param edge - [sort value, ident] to be compared with
+    def keyset_clause(self, sign, edge):
+        ident = self.identname + " " + sign + " " + self.keyset_value(edge[1])
+        if edge[0] is None:
+            clause = "( " + self.sortname + " IS NULL and " + ident + " )"
+            if sign[0] == ">": clause = "( " + clause + " or " + self.sortname + " IS NOT NULL )"
+        else:
+            clause = "( " + self.sortname + " , " + self.identname + " ) " + sign + " ( " + self.keyset_value(edge[0]) + " , " + self.keyset_value(edge[1]) + " )"
+            if sign[0] == "<": clause = "( " + clause + " or " + self.sortname + " IS NULL )"
+        return clause
+    ## retrieve rows for actuel page by keyset paging
+    def keyset_rows(self):
+        limit = "0," + str(self.rows)
+        if self.keyset:
+            select = self.keyset_clause(">=", self.keyset)
+        else:
+            select = self.select
+        rows = self.mysql.select(self.keyset_feldlist, select, self.dateien, self.keyset_order(), limit, self.where, self.link)
+        self.edges = [[row[-2], row[-1]] for row in rows]
+        if self.edges: self.keyset = self.edges[0]
+        return rows
+    ## step backwards on database table using keyset paging
+    # @param step - step length
+    # @param last - flag in new selection is necessary
+    def set_keyset_back(self, step, last = False):
+        if not last and self.keyset is None:
+            # no page edge available, stay on first page
+            return
+        if last:
+            rows = self.mysql.select(self.keyset_feldlist, self.select, self.dateien, self.keyset_order(True), "0," + str(step + 1), self.where, self.link)
+        else:
+            rows = self.mysql.select(self.keyset_feldlist, self.keyset_clause("<", self.keyset), self.dateien, self.keyset_order(True), "0," + str(step), self.where, self.link)
+        if rows:
+            self.keyset = [rows[-1][-2], rows[-1][-1]]
     ## populate selection grid
     def Pop_grid(self, dynamic = False):
         limit = str(self.offset) + ","+ str(self.rows)      
         #print ("AfpDialog_Auswahl.Pop_grid dynamic:", self.feldlist, self.select, self.dateien, self.sortname, limit, self.where, self.link, dynamic)
         if dynamic:
             if self.grid_data is None or len(self.grid_data) != self.rows:
-                self.grid_data = self.mysql.select(self.feldlist, self.select, self.dateien, self.sortname, limit, self.where, self.link)
+                if self.keyset_possible():
+                    self.grid_data = self.keyset_rows()
+                else:
+                    self.grid_data = self.mysql.select(self.feldlist, self.select, self.dateien, self.sortname, limit, self.where, self.link)
             rows = self.grid_data
+        elif self.keyset_possible():
+            rows = self.keyset_rows()
         else:
             rows = self.mysql.select(self.feldlist, self.select, self.dateien, self.sortname, limit, self.where, self.link)
         #print "AfpDialog_Auswahl.Pop_grid rows:", self.feldlist, self.select, self.dateien, self.sortname, limit, self.where, self.link, rows
@@ -1427,6 +1499,9 @@ class AfpDialog_Auswahl(wx.Dialog):
     # @param last - flag in new selection is necessary
     def set_step_back(self, step, last = False):
         #print "AfpDialog_Auswahl.set_step_back In:", step, last
+        if self.keyset_possible():
+            self.set_keyset_back(step, last)
+            return
         if self.offset >= step and not last:
             self.offset -= step
             return
@@ -1508,6 +1583,7 @@ class AfpDialog_Auswahl(wx.Dialog):
         ssplit = self.select.split()
         self.select = ssplit[0] + " " + ssplit[1] + " \"\""
         self.offset = 0
+        self.keyset = None
         self.Pop_grid()
         event.Skip()
     ## event handler for the Select Previous Page button
@@ -1526,14 +1602,16 @@ class AfpDialog_Auswahl(wx.Dialog):
     def On_Ausw_Next(self,event):
         if self.debug: print("AfpDialog_Auswahl Event handler `On_Ausw_Next'")
         if self.grid_is_complete():
-            self.offset += 1
+            if self.keyset_possible(): self.keyset = self.edges[1]
+            else: self.offset += 1
             self.Pop_grid()
         event.Skip()
     ## event handler for the Select Next Page button
     def On_Ausw_NPage(self,event):
         if self.debug: print("AfpDialog_Auswahl Event handler `On_Ausw_NPage'")
         if self.grid_is_complete():
-            self.offset += self.rows - 1
+            if self.keyset_possible(): self.keyset = self.edges[self.rows - 1]
+            else: self.offset += self.rows - 1
             self.Pop_grid()
         event.Skip()
     ## event handler for th Select Last button
@@ -1552,6 +1630,7 @@ class AfpDialog_Auswahl(wx.Dialog):
             self.search = text
             self.select = select[0] + " " + select[1] + " \"" + text + "\""
             self.offset = 0
+            self.keyset = None
             #print "Ok", text         
             self.Pop_grid()
         event.Skip()
@@ -492,6 +492,7 @@ class AfpDialog_DiReport(wx.Dialog):
                     if needed:
                         self.ask_for_variables(needed)
                         out.set_variables(self.variables)
+            out.open_resultfile(fresult, empty)
             out.inflate(fname)
             out.write_resultfile(fresult, empty)
         else:
@@ -1017,11 +1018,24 @@ class AfpProgressBar(object):
         if not self.actuel is None:
             self.actuel += 1
             if self.interval and self.actuel%self.interval == 0: 
-                step = int(self.actuel/self.interval)
-                pro = int(step*100/self.psteps)
-                msg = self.message + info + " " +  Afp_toIntString(self.actuel) + " von " + Afp_toIntString(self.complete) + ": " + Afp_toIntString(pro,2) + "%"
-                if step <= self.psteps:
-                    self.progress.Update(step, msg)
-                if self.debug: print("AfpProgressBar.plus_step:", step, msg)
+                self.update_step(info)
+    ## do a number of process steps at once, used for chunkwise processing
+    # @param count - number of items proceeded
+    # @param info - info text to these steps
+    def plus_steps(self, count, info = ""):
+        if not self.actuel is None and count > 0:
+            last = self.actuel
+            self.actuel += count
+            if self.interval and int(self.actuel/self.interval) > int(last/self.interval): 
+                self.update_step(info)
+    ## update displayed progress to actuel number of items
+    # @param info - info text to this step
+    def update_step(self, info = ""):
+        step = int(self.actuel/self.interval)
+        pro = int(step*100/self.psteps)
+        msg = self.message + info + " " +  Afp_toIntString(self.actuel) + " von " + Afp_toIntString(self.complete) + ": " + Afp_toIntString(pro,2) + "%"
+        if step <= self.psteps:
+            self.progress.Update(step, msg)
+        if self.debug: print("AfpProgressBar.update_step:", step, msg)
        
         
\ No newline at end of file
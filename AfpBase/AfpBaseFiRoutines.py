@@ -40,7 +40,7 @@ from AfpBase.AfpBaseRoutines import *
 # @param KNr - KundenNr, identifier of address
 # @param rev - rerverse flag, if true, lastname, firstname is retuned
 def AfpFinance_getNameFromKNr(mysql, KNr, rev=False):
-    rows = mysql.select("Vorname,Name", "KundenNr = " + Afp_toString(KNr), "ADRESSE")
+    rows = mysql.cached_select("Vorname,Name", "KundenNr = " + Afp_toString(KNr), "ADRESSE")
     if rows and len(rows[0]) > 1:
         row = rows[0]
         if rev:
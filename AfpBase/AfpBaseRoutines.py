@@ -39,6 +39,10 @@
 #
 
 import sys
+import gzip
+import json
+import time
+import threading
 from AfpBase.AfpDatabase.AfpSQL import AfpSQL, AfpSQLTableSelection
 from AfpBase.AfpUtilities import *
 from AfpBase.AfpUtilities.AfpStringUtilities import *
@@ -588,6 +592,36 @@ def Afp_selectSameValue(mysql, table, field, value, debug = False, felder = None
     #print "Afp_selectSameValue:", table, field, sel, "Filter:", filter
     selection.load_data(sel + filter)
     return selection.get_values(felder)
+##  retrieve all database entries of a table, where the given column holds one of the given values \n
+# the values are collected in 'IN (...)' clauses, one query is sent for each chunk of values, \n
+# returns a AfpSQLTableSelection holding all found rows
+# @param mysql - database where values are retrieved from
+# @param table  - name of database table where values are retrieved from
+# @param field  - name of tablecolumn to be compared
+# @param values  - list of values to be found, None values and duplicates are ignored
+# @param debug  - flag for debug messages
+# @param filter  - additional filter to be used
+# @param chunk  - maximal number of values in one query
+def Afp_selectValuesIn(mysql, table, field, values, debug = False, filter = None, chunk = 1000):
+    selection = AfpSQLTableSelection(mysql, table, debug)
+    wanted = []
+    found = set()
+    for value in values:
+        if value is None or value == "" or value in found: continue
+        found.add(value)
+        wanted.append(value)
+    data = []
+    for start in range(0, len(wanted), chunk):
+        quoted = []
+        for value in wanted[start:start + chunk]:
+            if Afp_isString(value): quoted.append(Afp_toQuotedString(value))
+            else: quoted.append(Afp_toQuotedString(value, None))
+        sel = field + " IN (" + ",".join(quoted) + ")"
+        if filter: sel += " AND " + filter
+        #print ("Afp_selectValuesIn:", table, sel)
+        data += list(map(list, mysql.select("*", sel, table)))
+    selection.set_data(data)
+    return selection
 ##  retrieve a list of database entries with same "KundenNr" from table
 # @param mysql - database where values are retrieved from
 # @param table  - name of database table where values are retrieved from
@@ -612,7 +646,7 @@ def Afp_selectSameKundenNr(mysql, table, KNr, debug = False, felder = None, filt
 # @param index  - index to be searched, default: 'KtName'
 # @param field  - field to be returned, default: 'KtNr'
 def Afp_getSpecialAccount(mysql, ident, index = "KtName", field = "KtNr"):
-    rows = mysql.select(field, index + " = \"" + ident + "\"","KTNR")
+    rows = mysql.cached_select(field, index + " = \"" + ident + "\"","KTNR")
     #print ("Afp_getSpecialAccount:", ident,  index, field, index + " = \"" + ident + "\"", rows)
     if rows: return rows[0][0]
     else: return 0
@@ -624,24 +658,24 @@ def Afp_getSpecialAccount(mysql, ident, index = "KtName", field = "KtNr"):
 def Afp_getIndividualAccount(mysql, KNr, typ = "Debitor"):
     # first step individual account
     KundenNr = Afp_toString(KNr)
-    rows = mysql.select("KtNr","KtName = \"" + KundenNr + "\" AND Bezeichnung = \"" + typ + "\"","KTNR")
+    rows = mysql.cached_select("KtNr","KtName = \"" + KundenNr + "\" AND Bezeichnung = \"" + typ + "\"","KTNR")
     if rows:
         return rows[0][0]
     if typ == "Debitor" or typ == "Kreditor":
         # extract name of Address
         name = None
-        rows = mysql.select("Name","KundenNr = " + KundenNr,"ADRESSE")
+        rows = mysql.cached_select("Name","KundenNr = " + KundenNr,"ADRESSE")
         if rows:
             name = rows[0][0]
         # second step, try sample account with max, first three letters of name
         if name:
             for i in range(3,0,-1):
                 search = "DIV." + name[:i].upper()
-                rows = mysql.select("KtNr","KtName = \"" + search + "\" AND Bezeichnung = \"" + typ + "\"","KTNR")
+                rows = mysql.cached_select("KtNr","KtName = \"" + search + "\" AND Bezeichnung = \"" + typ + "\"","KTNR")
                 if rows:
                     return rows[0][0]
         # third step, try global sample account
-        rows = mysql.select("KtNr","KtName = \"DIVER\" AND Bezeichnung = \"" + typ + "\"","KTNR")
+        rows = mysql.cached_select("KtNr","KtName = \"DIVER\" AND Bezeichnung = \"" + typ + "\"","KTNR")
         if rows:
             return rows[0][0]
     return 0
@@ -654,7 +688,7 @@ def Afp_getIndividualAccount(mysql, KNr, typ = "Debitor"):
 # @param value -  value of sort criterium to be searched
 def Afp_selectGetValue(mysql, table, column, index, value):
     string = Afp_toInternDateString(value)
-    rows = mysql.select(column, index + " >= " + string, table, index, "0,1")
+    rows = mysql.cached_select(column, index + " >= " + string, table, index, "0,1")
     if rows:
         if rows[0]:
             return rows[0][0]
@@ -810,6 +844,8 @@ class AfpImport(object):
         self.progress_bar = None
         self.progress_steps = globals.get_value("progress-steps")
         if not self.progress_steps: self.progress_steps = 100
+        self.csv_chunk = globals.get_value("import-csv-chunk")
+        if not self.csv_chunk: self.csv_chunk = 1000
         # values used for csv-import
         self.csv_delimiter = [","]
         self.csv_reverseflag = False
@@ -907,9 +943,12 @@ class AfpImport(object):
                 self.csv_reverseflag = rev
             self.csv_textbrackets = brackets
     ## set column indices due to parameter
-    # @param header - line with identifiers for columns
+    # @param header - line with identifiers for columns, or list of already splitted identifiers
     def set_column_map(self, header):
-        head = self.split_csv_line(header)
+        if Afp_isString(header):
+            head = self.split_csv_line(header)
+        else:
+            head = header
         self.column_map = {}
         #print ("AfpImport.set_column_map:", head)
         for entry in self.parameter:
@@ -993,52 +1032,82 @@ class AfpImport(object):
         else:
             return data
                 
-    ## read a csv file according to given parameters
+    ## generator delivering the columns of the csv file line by line, split by split_csv_line
+    # @param fin - opened csv file
+    def read_csv_rows(self, fin):
+        for line in fin:
+            yield self.split_csv_line(line)
+    ## read a csv file according to given parameters \n
+    # the file is read as a stream, for direct mysql storing the data is written in chunks of self.csv_chunk lines
     # @param data - AfpSelectionList where data has to be filled into the main selection
     # @param selname - if given, name of selection where data has to be filled
     def read_from_csv_file(self, data, selname = None):
-        fdata = Afp_importFileLines(self.filename)
-        if  self.csv_use_column_header:
-            self.set_column_map(fdata[0])
-            fdata = fdata[1:]
-        if self.csv_reverseflag: fdata.reverse()
+        if not Afp_existsFile(self.filename):
+            return self.import_csv_rows([], 0, data, selname)
+        with open(self.filename, 'r') as fin:
+            lines = 0
+            for line in fin: lines += 1
+            fin.seek(0)
+            return self.import_csv_rows(self.read_csv_rows(fin), lines, data, selname)
+    ## import the rows of a csv file
+    # @param rows - rows of filedata to be read, each row holding the list of columns
+    # @param lines - number of rows
+    # @param data - AfpSelectionList where data has to be filled into the main selection
+    # @param selname - if given, name of selection where data has to be filled
+    def import_csv_rows(self, rows, lines, data, selname = None):
+        if  self.csv_use_column_header and lines:
+            self.set_column_map(next(iter(rows)))
+            lines -= 1
+        if self.csv_reverseflag: 
+            rows = list(rows)
+            rows.reverse()
         if self.progress_bar:
-            self.progress_bar.set_complete(len(fdata))
-        if self.direct_mysql_storing or len(fdata) > 10000:
-            self.write_to_database(fdata, data, selname)
+            self.progress_bar.set_complete(lines)
+        if self.direct_mysql_storing or lines > 10000:
+            self.write_to_database(rows, data, selname)
             return None
         else:
-            data = self.write_to_data(fdata, data, selname)
+            data = self.write_to_data(rows, data, selname)
             return [data]
     ## fill file-data into the appropriate selection-list in data
-    # @param fdata - lines of filedata to be read
+    # @param rows - rows of filedata to be read, each row holding the list of columns
     # @param data - AfpSelectionList where data has to be filled into the main selection
     # @param selname - if given, name of selection where data has to be filled
-    def write_to_data(self, fdata, data, selname = None):
-        cnt = 0
-        for line in fdata:
-            list = self.split_csv_line(line)
+    def write_to_data(self, rows, data, selname = None):
+        for list in rows:
             new_data = self.read_column_data(list)
             if self.progress_bar:
                 self.progress_bar.plus_step()
             data.set_data_values(new_data, selname, -1)
         return data
-    ## write file-data directyl into the mysql database table
-    # @param fdata - lines of filedata to be read
+    ## write file-data directly into the mysql database table, 
+    # each chunk of self.csv_chunk rows is written in one bulk insert
+    # @param rows - rows of filedata to be read, each row holding the list of columns
     # @param data - AfpSelectionList where data has to be filled into the main selection
     # @param selname - if given, name of selection where data has to be filled
-    def write_to_database(self, fdata, data, selname = None):
+    def write_to_database(self, rows, data, selname = None):
         table = data.get_selection(selname).get_tablename()
         mysql = data.get_mysql()
         cols = []
         for col in self.column_map:
             cols.append(col)
-        for line in fdata:
-            list = self.split_csv_line(line)
-            new_data = self.read_column_data(list,  True)
-            if self.progress_bar:
-                self.progress_bar.plus_step()  
-            mysql.write_insert(table, cols, [new_data])
+        chunk = []
+        for list in rows:
+            chunk.append(self.read_column_data(list,  True))
+            if len(chunk) >= self.csv_chunk:
+                self.write_chunk_to_database(mysql, table, cols, chunk)
+                chunk = []
+        if chunk:
+            self.write_chunk_to_database(mysql, table, cols, chunk)
+    ## write one chunk of rows in one bulk insert into the mysql database table
+    # @param mysql - AfpSQL object for database access
+    # @param table - name of database table
+    # @param cols - names of columns to be written
+    # @param chunk - list of data rows
+    def write_chunk_to_database(self, mysql, table, cols, chunk):
+        mysql.write_insert(table, cols, chunk, len(chunk), False)
+        if self.progress_bar:
+            self.progress_bar.plus_steps(len(chunk))
     #
     # specific methods for xml import
     #
@@ -1195,6 +1264,7 @@ class AfpExport(object):
     #  - .csv - ASCII file, comma separated values \n
     #  - .xml - XML file according to namespace http://www.afptech.de/XML/AfpDocument \n
     #  - .dbf - DBF database file \n
+    #  an additional extension '.gz' leads to gzip compressed output (not for .dbf)
     # @param debug - flag for debug information
     def  __init__(self, globals, data, filename, debug = False):
         self.globals = globals
@@ -1207,10 +1277,17 @@ class AfpExport(object):
         self.information = None
         self.export_available = False
         self.module = None
+        self.chunk = 1000 # number of rows written at once
         self.debug = debug
         split = filename.split(".")
         self.type = split[-1].lower()
-        if self.type == "asc" or self.type == "csv" or self.type == "xml":
+        self.compress = False
+        if self.type == "gz" and len(split) > 2:
+            self.compress = True
+            self.type = split[-2].lower()
+        if self.compress and self.type == "dbf":
+            pass
+        elif self.type == "asc" or self.type == "csv" or self.type == "xml":
             self.export_available = True
         elif self.type == "dbf":
             if AfpPy_checkModule('dbfpy'):
@@ -1223,6 +1300,11 @@ class AfpExport(object):
     ## destructor
     def __del__(self):   
         if self.debug: print("AfpExport Destruktor") 
+    ## open the output file, gzip compressed if indicated by filename
+    def open_output(self):
+        if self.compress:
+            return gzip.open(self.filename, 'wt', compresslevel = 6)
+        return open(self.filename, 'w', buffering = 65536)
     ## assure utf-8 coding is used for xml-export
     def force_utf(self):
          self.xml_force_utf8 = True
@@ -1289,16 +1371,10 @@ class AfpExport(object):
     def write_ascii_field(self, data, fixed, separator, paranthesis):
         string = Afp_toString(data)
         if fixed:
-            lgh = len(string)
-            if lgh < fixed:
-                if Afp_isNumeric(data):
-                    num = True
-                else:
-                    num = False
-                for i in range(lgh,fixed):
-                    if num: string = " " + string
-                    else: string += " "
-            if lgh > fixed: string = string[:fixed]
+            if Afp_isNumeric(data):
+                string = string[:fixed].rjust(fixed)
+            else:
+                string = string[:fixed].ljust(fixed)
         else:
             if paranthesis:
                 string = paranthesis + string + paranthesis
@@ -1329,18 +1405,35 @@ class AfpExport(object):
         else:
             write = False
         if write:
-            fout = open(self.filename, 'w')
+            fout = self.open_output()
             felder = Afp_ArraytoLine(fieldlist,",")
-            daten = self.data.get_values(felder)
-            for row in daten:
-                line = ""
-                for entry in row: 
-                    string = self.write_ascii_field(entry, fix, sep, paras)
-                    line += string
-                if cut: line = line[:-1]
-                #print "exportline:",line
-                fout.write(line + '\n')
+            if fix:
+                formatter = lambda entry: Afp_toString(entry)[:fix].rjust(fix) if Afp_isNumeric(entry) else Afp_toString(entry)[:fix].ljust(fix)
+                delimiter = ""
+                end = '\n'
+            else:
+                if not paras: paras = ""
+                formatter = lambda entry: paras + Afp_toString(entry) + paras
+                delimiter = sep
+                end = sep[:-1] + '\n'
+            count = 0
+            for daten in self.get_row_chunks(felder):
+                lines = [delimiter.join([formatter(entry) for entry in row]) + end for row in daten]
+                #print "exportlines:",lines
+                fout.write("".join(lines))
+                count += len(lines)
             fout.close()
+            if self.debug: print("AfpExport.write_to_ascii_file:", count, "rows written to", self.filename)
+    ## deliver the rows to be exported in chunks
+    # @param felder - names of columns to be exported, separated by a colon (,)
+    def get_row_chunks(self, felder):
+        if isinstance(self.data, AfpSQLTableSelection):
+            index = self.data.get_feldspec(felder)
+            data = self.data.data
+            for start in range(0, len(data), self.chunk):
+                yield [Afp_extractPureValues(index, row) for row in data[start:start + self.chunk]]
+        else:
+            yield self.data.get_values(felder)
     ## writes field data to xml file
     # @param fields - array with names of values 
     # @param values - array with values 
@@ -1350,19 +1443,20 @@ class AfpExport(object):
     # @param count - number of row
     def write_xml_fields(self, fields, values, preind, indent, fout, count = -1): 
         if count >= 0:
-            fout.write(preind + "<AfpTableRow count=\""+ Afp_toString(count) + "\"> \n")
+            lines = [preind + "<AfpTableRow count=\""+ Afp_toString(count) + "\"> \n"]
         else:
-            fout.write(preind + "<AfpTableRow> \n")
+            lines = [preind + "<AfpTableRow> \n"]
         if len(values) < len(fields): 
             lgh = len(values)
         else:
             lgh = len(fields)
         for i in range(lgh):
             if  self.xml_force_utf8:
-                fout.write(preind + indent + "<AfpValue name=\"" + fields[i] + "\">" + Afp_toString(values[i]).encode("UTF-8").decode("UTF-8") + "</AfpValue> \n")
+                lines.append(preind + indent + "<AfpValue name=\"" + fields[i] + "\">" + Afp_toString(values[i]).encode("UTF-8").decode("UTF-8") + "</AfpValue> \n")
             else:
-                fout.write(preind + indent + "<AfpValue name=\"" + fields[i] + "\">" + Afp_toString(values[i]) + "</AfpValue> \n")
-        fout.write(preind + "</AfpTableRow> \n")
+                lines.append(preind + indent + "<AfpValue name=\"" + fields[i] + "\">" + Afp_toString(values[i]) + "</AfpValue> \n")
+        lines.append(preind + "</AfpTableRow> \n")
+        fout.write("".join(lines))
     ## writes field data to xml file
     # @param selection - given table selection
     # @param selname - name of table selection
@@ -1395,7 +1489,7 @@ class AfpExport(object):
     def write_to_xml_file(self, fieldlist, ilgh=4):
         indent = ilgh*" "
         if self.type == "xml":
-            fout = open(self.filename, 'w')
+            fout = self.open_output()
             fout.write("<?xml version=\"1.0\" encoding=\"UTF-8\" ?>" + "\n")
             fout.write("<AfpDocument xmlns=\"http://www.afptech.de/XML/AfpDocument\">" + "\n")
             self.write_xml_selection_list(self.data, indent, indent, fout, not self.xml_embedded_data)
@@ -1604,6 +1698,218 @@ class AfpMailSender(object):
         print("AfpMailSender message:", self.message)
         print("AfpMailSender htmltext:", self.htmltext)
         print("AfpMailSender attachments:", self.attachments, "\n")
+    ## add mail to a mail queue instead of sending it directly
+    # @param queue - AfpMailQueue where mail is added
+    def queue_mail(self, queue):
+        return queue.add_mail(self)
+
+## class to send a bulk of mails over a few reused smtp sessions \n
+# the mails are send by several threads, each holding its own authenticated smtp session,
+# the rate of sent mails may be limited, attachments shared by several mails are only read and encoded once. \n
+# Failed deliveries are retried with increasing delays, mails which finally failed are written to a file and may be requeued later.
+class AfpMailQueue(object):
+    ## initialize AfpMailQueue class
+    # @param globals - globals variables holding smtp-server data and the following optional queue settings:
+    # - smtp-sessions - number of smtp sessions used in parallel, default: 2
+    # - smtp-session-mails - number of mails send in one session before it is renewed, default: 100
+    # - smtp-rate - maximal number of mails send per minute, default: unlimited
+    # - smtp-retries - number of retries of a failed delivery, default: 3
+    # - smtp-backoff - delay in seconds before the first retry, doubled for each further retry, default: 2
+    # - mail-queue-file - file where failed mails are stored, default: 'AfpMailQueue.json' in tempdir
+    # @param debug - flag for debug information
+    def  __init__(self, globals, debug = False):
+        self.globals = globals
+        self.debug = debug
+        self.template = AfpMailSender(globals, debug)
+        self.sessions = self.get_setting("smtp-sessions", 2)
+        self.session_mails = self.get_setting("smtp-session-mails", 100)
+        self.rate = self.get_setting("smtp-rate", 0)
+        self.retries = self.get_setting("smtp-retries", 3)
+        self.backoff = self.get_setting("smtp-backoff", 2)
+        self.timeout = 60
+        self.filename = self.globals.get_value("mail-queue-file")
+        if not self.filename: self.filename = self.globals.get_value("tempdir") + "AfpMailQueue.json"
+        self.maildir = self.globals.get_value("maildir")
+        self.attachments = AfpMailAttachmentCache(debug)
+        # each entry: [sender, recipients, subject, message, htmltext, attachments, number of tries, last error]
+        self.entries = []
+        self.pending = None
+        self.sent = []
+        self.failed = self.load_failed()
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+        self.local = threading.local()
+        if self.debug: print("AfpMailQueue Konstruktor", self.sessions, self.rate, len(self.failed))
+    ## destructor
+    def __del__(self):
+        if self.debug: print("AfpMailQueue Destruktor")
+    ## return a numerical queue setting from globals
+    # @param name - name of setting
+    # @param default - value used if setting is not given
+    def get_setting(self, name, default):
+        value = self.globals.get_value(name)
+        if value is None or not Afp_isNumeric(value) or value < 0: value = default
+        return value
+    ## set connection information of smtp-server where mails have to be delivered
+    # @param host - string defining host[:port] to be connected
+    # @param user - if given, username to be used for login
+    # @param word - if given, password to be used for login (login will only be invoked if user and word are given)
+    # @param security - flag for smtp security, possible values:None, STARTTLS, SSL
+    def set_server(self, host, user = None, word = None, security = None):
+        self.template.set_server(host, user, word, security)
+    ## return number of mails waiting to be send
+    def get_length(self):
+        return len(self.entries)
+    ## return list of [recipients, filename of stored mail] of the mails successfully send
+    def get_sent(self):
+        return self.sent
+    ## return list of mail entries, which could not be delivered
+    def get_failed(self):
+        return self.failed
+    ## add mail to queue, the server data of the queue is taken from the mail, if the queue has none
+    # @param mail - AfpMailSender holding the mail data
+    def add_mail(self, mail):
+        if not mail.is_ready():
+            print("WARNING: AfpMailQueue.add_mail: mail not complete, not added!", mail.recipients, mail.subject)
+            return False
+        if not self.template.server and mail.server:
+            self.template.set_server(mail.server, mail.user, mail.word, mail.security)
+            self.template.serverport = mail.serverport
+        if mail.dry_run: self.template.dry_run = True
+        sender = mail.sender
+        if sender is None: sender = self.template.sender
+        self.entries.append([sender, list(mail.recipients), Afp_decodeMailText(mail.subject), Afp_decodeMailText(mail.message), Afp_decodeMailText(mail.htmltext), list(mail.attachments), 0, None])
+        return True
+    ## load the mails which failed to be delivered from file
+    def load_failed(self):
+        failed = []
+        if Afp_existsFile(self.filename):
+            try:
+                fin = open(self.filename, "r")
+                failed = json.load(fin)
+                fin.close()
+            except ValueError:
+                print("WARNING: AfpMailQueue.load_failed: file", self.filename, "not readable!")
+        return failed
+    ## write the mails which failed to be delivered to file
+    def save_failed(self):
+        if self.failed:
+            tmpname = self.filename + ".tmp"
+            fout = open(tmpname, "w")
+            json.dump(self.failed, fout)
+            fout.close()
+            os.replace(tmpname, self.filename)
+        elif Afp_existsFile(self.filename):
+            Afp_deleteFile(self.filename)
+    ## put the mails which failed to be delivered back into the queue
+    def requeue_failed(self):
+        for entry in self.failed:
+            entry[6] = 0
+            entry[7] = None
+            self.entries.append(entry)
+        self.failed = []
+        self.save_failed()
+    ## send all mails in queue, returns the number of sent and failed mails
+    def send(self):
+        if not self.entries: return 0, 0
+        if self.template.dry_run:
+            print ("AfpMailQueue: --- DRY RUN!! ---")
+            self.template.view()
+            for entry in self.entries:
+                print("AfpMailQueue entry:", entry)
+            self.entries = []
+            return 0, 0
+        self.pending = self.entries
+        self.entries = []
+        sent = len(self.sent)
+        failed = len(self.failed)
+        workers = max(1, min(self.sessions, len(self.pending)))
+        if self.debug: print("AfpMailQueue.send:", len(self.pending), "mails,", workers, "sessions")
+        threads = [threading.Thread(target = self.work) for i in range(workers)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.pending = None
+        self.save_failed()
+        return len(self.sent) - sent, len(self.failed) - failed
+    ## thread routine, send the pending mails until none is left
+    def work(self):
+        self.local.server = None
+        self.local.count = 0
+        while True:
+            with self.lock:
+                if not self.pending: break
+                entry = self.pending.pop(0)
+            self.deliver(entry)
+        self.close_session()
+    ## wait until the next mail may be send, due to the rate limit
+    def wait_for_rate(self):
+        if not self.rate: return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + 60.0/self.rate
+        if start > now: time.sleep(start - now)
+    ## return the smtp session of the current thread, it is opened if necessary
+    def get_session(self):
+        if self.local.server and self.local.count >= self.session_mails:
+            self.close_session()
+        if self.local.server is None:
+            tmp = self.template
+            self.local.server = Afp_openSMTP(tmp.server, tmp.user, tmp.word, self.debug, tmp.security, tmp.serverport, self.timeout)
+            self.local.count = 0
+        return self.local.server
+    ## close the smtp session of the current thread
+    def close_session(self):
+        if self.local.server:
+            try:
+                self.local.server.quit()
+            except (smtplib.SMTPException, OSError):
+                self.local.server.close()
+            self.local.server = None
+    ## send one mail, retried on temporary failures
+    # @param entry - mail entry to be send
+    def deliver(self, entry):
+        sender, recipients, subject = entry[:3]
+        try:
+            msg = Afp_genMailMessage(sender, recipients, subject, entry[3], entry[4], entry[5], self.debug, self.attachments)
+        except OSError as error:
+            self.set_failed(entry, error)
+            return
+        text = msg.as_string()
+        while True:
+            entry[6] += 1
+            self.wait_for_rate()
+            try:
+                server = self.get_session()
+                server.sendmail(sender, recipients + [sender], text)
+                self.local.count += 1
+                break
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPAuthenticationError) as error:
+                self.close_session()
+                self.set_failed(entry, error)
+                return
+            except (smtplib.SMTPException, OSError) as error:
+                self.close_session()
+                permanent = isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+                if permanent or entry[6] > self.retries:
+                    self.set_failed(entry, error)
+                    return
+                delay = self.backoff * 2**(entry[6] - 1)
+                if self.debug: print("AfpMailQueue.deliver: retry", entry[6], "in", delay, "seconds:", recipients, error)
+                time.sleep(delay)
+        fname = None
+        if self.maildir: fname = Afp_storeMail(msg, recipients, subject, self.maildir)
+        with self.lock:
+            self.sent.append([recipients, fname])
+        if self.debug: print("AfpMailQueue.deliver: sent", recipients, entry[6], fname)
+    ## record mail which could not be delivered
+    # @param entry - mail entry
+    # @param error - exception raised by last try
+    def set_failed(self, entry, error):
+        entry[7] = str(error)
+        print("WARNING: AfpMailQueue: mail to", entry[1], "not delivered:", entry[7])
+        with self.lock:
+            self.failed.append(entry)
 
 # database tables
 ## get dictionary with required database tables and mysql generation code
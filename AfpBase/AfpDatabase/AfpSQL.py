@@ -38,13 +38,135 @@
 #
 
 import sys
+import re
+import time
 import MySQLdb
 import datetime
+import decimal
 import base64
 
 from AfpBase.AfpUtilities.AfpBaseUtilities import *
 from AfpBase.AfpUtilities.AfpStringUtilities import *
 
+## literal values in select clauses, which are bound as parameters
+AfpSQL_numeric = re.compile(r"^-?[0-9]+(\.[0-9]+)?$")
+
+## process-wide cache for results of repeated lookups, \n
+# entries are held with a limited lifetime and a limited number per table, the least recently used entries of a table are dropped,
+# so a burst of lookups on one table (p.e. ADRESSE during an import) does not displace the entries of other tables.
+# Each entry is counted for the first of its tables (the table queried), but registered for all tables
+# the result depends on and dropped when one of them is invalidated. \n
+# Only changes written by this process invalidate entries, changes written by other processes or workstations
+# are not seen until the lifetime of the entry has expired. Therefore only lookups which may be stale for this time
+# (p.e. account numbers or names of addresses) should be routed through this cache. Empty results are not cached,
+# so newly created entries are found immediately.
+class AfpSQLResultCache(object):
+    ## constructor
+    # @param size - maximal number of entries per table
+    # @param ttl - lifetime of entries in seconds
+    def  __init__(self, size = 1000, ttl = 60):
+        self.size = size
+        self.ttl = ttl
+        self.entries = {} # key -> [time, rows, tables, owner]
+        self.lru = {} # owner table -> keys of entries counted for this table, ordered from least to most recently used
+        self.index = {} # table -> set of keys of entries depending on this table
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.listeners = None
+    ## add listener to be informed when entries are dropped due to changes in the database
+    # @param listener - method called with the name of the changed table, None if all tables may have changed
+    def add_listener(self, listener):
+        if self.listeners is None: self.listeners = []
+        self.listeners.append(listener)
+    ## set size and lifetime of entries, existing entries are dropped
+    # @param size - maximal number of entries per table, 0: no caching
+    # @param ttl - lifetime of entries in seconds
+    def configure(self, size, ttl = None):
+        self.size = size
+        if not ttl is None: self.ttl = ttl
+        self.invalidate()
+    ## normalise table name for cache lookup
+    # @param table - name of table, possibly with database prefix
+    def get_table(self, table):
+        return table.strip().split(" ")[0].split(".")[-1].upper()
+    ## remove entry from cache and from the index of its tables
+    # @param key - key of the query
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry:
+            for table in entry[2]:
+                keys = self.index.get(table)
+                if keys:
+                    keys.discard(key)
+                    if not keys: del self.index[table]
+            lru = self.lru.get(entry[3])
+            if lru:
+                lru.pop(key, None)
+                if not lru: del self.lru[entry[3]]
+    ## return cached result or None if not available
+    # @param tables - names of tables the result depends on
+    # @param key - key of the query
+    def get(self, tables, key):
+        entry = self.entries.get(key)
+        if entry:
+            if time.monotonic() - entry[0] < self.ttl:
+                lru = self.lru[entry[3]]
+                lru[key] = lru.pop(key)
+                self.hits += 1
+                return entry[1]
+            self.remove(key)
+        self.misses += 1
+        return None
+    ## store result in cache
+    # @param tables - names of tables the result depends on
+    # @param key - key of the query
+    # @param rows - result to be stored
+    def put(self, tables, key, rows):
+        if not self.size or not rows: return
+        self.remove(key)
+        owner = self.get_table(tables[0])
+        lru = self.lru.setdefault(owner, {})
+        while len(lru) >= self.size:
+            self.remove(next(iter(lru)))
+            self.evictions += 1
+        tables = set([self.get_table(table) for table in tables])
+        tables.add(owner)
+        self.entries[key] = [time.monotonic(), rows, tables, owner]
+        self.lru.setdefault(owner, {})[key] = None
+        for table in tables:
+            self.index.setdefault(table, set()).add(key)
+    ## drop cached entries
+    # @param table - if given, only entries depending on this table are dropped
+    def invalidate(self, table = None):
+        if self.listeners:
+            for listener in self.listeners:
+                listener(table)
+        if table is None:
+            if self.entries: self.invalidations += 1
+            self.entries = {}
+            self.lru = {}
+            self.index = {}
+        else:
+            keys = self.index.get(self.get_table(table))
+            if keys:
+                self.invalidations += 1
+                for key in list(keys):
+                    self.remove(key)
+    ## return statistics of cache usage as dictionary
+    def get_stats(self):
+        total = self.hits + self.misses
+        ratio = 0.0
+        if total: ratio = float(self.hits)/total
+        entries = {}
+        for table in self.index:
+            entries[table] = len(self.index[table])
+        return {"hits": self.hits, "misses": self.misses, "ratio": ratio, "evictions": self.evictions, "invalidations": self.invalidations, "entries": entries}
+
+## result cache shared by all AfpSQL connections of this process
+AfpSQL_resultcache = AfpSQLResultCache()
+
 ##   provides a low level interface to MySql \n
 # mostly not used directly, interaction takes place through the AfpSQLTableSelection objects
 class AfpSQL(object):
@@ -72,7 +194,17 @@ class AfpSQL(object):
         self.db_roflags = None # optional: readonly flags
         self.tableto_db = None # optional: table to database mapping
         self.lastrowid = 0
+        self.lastrowids = []
+        self.insert_chunk = 500 # number of rows written in one bulk insert statement
+        self.insert_increment = None # step of ids generated by one bulk insert, 0: ids not consecutive, None: not yet retrieved
+        self.transaction = 0 # depth of open transactions, COMMIT is deferred while > 0
+        self.transaction_failed = False
         self.select_clause= None
+        self.query_cache = {} # query shape -> statement with placeholders
+        self.query_cache_size = 500
+        self.query_stats = {} # query shape -> number of hits
+        self.query_hits = 0
+        self.query_misses = 0
         self.connections = None
         self.tablecons = None
         self.version = self.get_version()
@@ -128,6 +260,7 @@ class AfpSQL(object):
         split = tables.split(",")
         for sp in split:
             self.tableto_db[sp] = dbname
+        self.clear_query_cache()
     ##set readoly flag for datanase
     # @param dbname - if given name od database to be set to readonly
     def set_readonly(self, dbname = None):
@@ -335,6 +468,145 @@ class AfpSQL(object):
         if not link is None: 
             where_clause += " and (" + Afp_SbToDbName(link, dateien, self.db_lower) + ")"
         return [feld_clause, dat_clause, where_clause, order_clause, limit_clause]
+    ## split literal values from a select clause, \n
+    # returns the clause with placeholders, the values to be bound and the literal representation of the values \n
+    # or None, if the clause cannot be parametrised (single quoted or escaped literals are left to the literal statement) \n
+    # decimal numbers are bound as Decimal, so they are delivered to the database exactly as written
+    # @param clause - select, where or link clause as delivered to 'select'
+    def parametrise_clause(self, clause):
+        if clause.count("\"") % 2 or "\\" in clause or "'" in clause: return None
+        unmasked, masked = Afp_maskedText(clause)
+        words = []
+        params = []
+        literals = []
+        for i in range(len(unmasked)):
+            for word in unmasked[i].split():
+                if AfpSQL_numeric.match(word):
+                    words.append("%s")
+                    if "." in word: params.append(decimal.Decimal(word))
+                    else: params.append(int(word))
+                    literals.append(word)
+                else:
+                    words.append(word.replace("%","%%"))
+            if i < len(masked):
+                words.append("%s")
+                params.append(masked[i])
+                literals.append("\"" + masked[i] + "\"")
+        return " ".join(words), params, literals
+    ## build complete select statement
+    # @param escape - flag if '%' signs have to be escaped, the select, where and link clauses are delivered escaped
+    # further parameters see 'select'
+    def build_statement(self, feldnamen, select, dateinamen, order = None, limit = None, where=None, link=None, escape = False):
+        clauses = self.extract_clauses(feldnamen, select, dateinamen, order, limit, where, link)
+        if escape:
+            for i in [0, 1, 3, 4]:
+                clauses[i] = clauses[i].replace("%","%%")
+        Befehl = "SELECT "+ clauses[0] + " FROM " + clauses[1]  # feld_clause, dat_clause
+        if not clauses[2] == "": Befehl += " WHERE "+ clauses[2]# where_clause 
+        if not clauses[3] == "": Befehl += " ORDER BY "+ clauses[3] # order_clause 
+        if not clauses[4] == "": Befehl += " LIMIT "+ clauses[4] # limit_clause 
+        return Befehl
+    ## return statement for the shape of the given query from the query cache, \n
+    # literal values are replaced by placeholders, the statement is only build if this shape is not yet cached,
+    # the least recently used shapes are dropped when the cache is full. \n
+    # MySQLdb fills the bound values into the statement on the client side, so the database receives plain statements
+    # and no server side plan is reused; the cache only saves the translation of table and column names 
+    # for repeated shapes and lets the driver quote the values. \n
+    # returns the statement with placeholders, the values to be bound and the complete statement as literal text
+    # parameters see 'select'
+    def get_statement(self, feldnamen, select, dateinamen, order = None, limit = None, where=None, link=None):
+        templates = []
+        params = []
+        literals = []
+        if self.query_cache_size:
+            for clause in [select, where, link]:
+                if clause is None:
+                    templates.append(None)
+                else:
+                    result = self.parametrise_clause(clause)
+                    if result is None: break
+                    templates.append(result[0])
+                    params += result[1]
+                    literals += result[2]
+        if len(templates) < 3:
+            Befehl = self.build_statement(feldnamen, select, dateinamen, order, limit, where, link)
+            return Befehl, None, Befehl
+        key = (feldnamen, templates[0], dateinamen, order, limit, templates[1], templates[2])
+        Befehl = self.query_cache.get(key)
+        if Befehl is None:
+            self.query_misses += 1
+            Befehl = self.build_statement(feldnamen, templates[0], dateinamen, order, limit, templates[1], templates[2], True)
+            if len(self.query_cache) >= self.query_cache_size:
+                oldest = next(iter(self.query_cache))
+                del self.query_cache[oldest]
+                del self.query_stats[oldest]
+            self.query_cache[key] = Befehl
+            self.query_stats[key] = 0
+        else:
+            self.query_hits += 1
+            self.query_stats[key] += 1
+            # move shape to the end, it is dropped last
+            del self.query_cache[key]
+            self.query_cache[key] = Befehl
+        return Befehl, params, Befehl % tuple(literals)
+    ## set maximal number of query shapes held in the query cache
+    # @param size - number of shapes, 0: no caching
+    def set_query_cache_size(self, size):
+        self.query_cache_size = size
+        self.clear_query_cache()
+    ## clear query cache and reset counters
+    def clear_query_cache(self):
+        self.query_cache = {}
+        self.query_stats = {}
+        self.query_hits = 0
+        self.query_misses = 0
+    ## return statistics of the query cache \n
+    # [hits, misses, list of [hits, statement] for the most frequent shapes]
+    # @param number - number of shapes to be delivered
+    def get_query_cache_stats(self, number = 10):
+        shapes = [[self.query_stats[key], self.query_cache[key]] for key in self.query_stats]
+        shapes.sort(key=lambda x: x[0], reverse=True)
+        return [self.query_hits, self.query_misses, shapes[:number]]
+    ## return names of tables used in a select, as needed for the result cache
+    # @param dateinamen - "table[,...]" 
+    def get_cache_tables(self, dateinamen):
+        if " " in dateinamen.strip():
+            dateien = dateinamen.split()
+        else:
+            dateien = dateinamen.split(",")
+        return [self.get_dbname(datei.strip().upper()) for datei in dateien]
+    ## selects entries from the database via the process-wide result cache, \n
+    # for repeated lookups, the result is delivered from cache if available, 
+    # changes of other workstations may be seen only after the lifetime of the cache entries (see AfpSQLResultCache) \n
+    # parameters see 'select'
+    def cached_select(self, feldnamen, select, dateinamen, order = None, limit = None, where=None, link=None):
+        tables = self.get_cache_tables(dateinamen)
+        key = ("select", tables[0], feldnamen, select, dateinamen, order, limit, where, link)
+        rows = AfpSQL_resultcache.get(tables, key)
+        if rows is None:
+            rows = self.select(feldnamen, select, dateinamen, order, limit, where, link)
+            AfpSQL_resultcache.put(tables, key, rows)
+        return rows
+    ## direct execution of a given mysql select command via the process-wide result cache
+    # @param command - select command to be executed
+    # @param tables - comma separated list of tables used in the command
+    def cached_execute(self, command, tables):
+        tables = self.get_cache_tables(tables)
+        key = ("execute", tables[0], command)
+        rows = AfpSQL_resultcache.get(tables, key)
+        if rows is None:
+            rows = self.execute(command)
+            AfpSQL_resultcache.put(tables, key, rows)
+        return rows
+    ## configure process-wide result cache
+    # @param size - maximal number of entries per table, 0: no caching
+    # @param ttl - if given, lifetime of entries in seconds
+    def set_result_cache(self, size, ttl = None):
+        AfpSQL_resultcache.configure(size, ttl)
+    ## return statistics of process-wide result cache \n
+    # dictionary with entries 'hits', 'misses', 'ratio', 'evictions', 'invalidations' and 'entries' (number of entries depending on each table)
+    def get_result_cache_stats(self):
+        return AfpSQL_resultcache.get_stats()
     ## selects entries from the database \n
     # returns the selected value rows converted in strings
     # @param feldnamen -  "*" for all fields or "field.table[.alias][, ...]" alias - of the concatination of fields
@@ -359,18 +631,16 @@ class AfpSQL(object):
     # @param link            - "[field1.table1 == field2.table2 [and ...]]"
     def select(self, feldnamen, select, dateinamen, order = None, limit = None, where=None, link=None):      
         if self.debug: print ("AfpSQL.select:", feldnamen, select, dateinamen, order, limit, where, link)
-        clauses = self.extract_clauses(feldnamen, select, dateinamen, order, limit, where, link)
-        #print ("AfpSQL.select clauses:", clauses)
-        Befehl = "SELECT "+ clauses[0] + " FROM " + clauses[1]  # feld_clause, dat_clause
-        if not clauses[2] == "": Befehl += " WHERE "+ clauses[2]# where_clause 
-        if not clauses[3] == "": Befehl += " ORDER BY "+ clauses[3] # order_clause 
-        if not clauses[4] == "": Befehl += " LIMIT "+ clauses[4] # limit_clause 
-        if self.debug: print("AfpSQL.select:",Befehl)
+        Befehl, params, literal = self.get_statement(feldnamen, select, dateinamen, order, limit, where, link)
+        if self.debug: print("AfpSQL.select:", Befehl, params)
         cursor = self.get_cursor()
-        cursor.execute (Befehl)     
+        if params:
+            cursor.execute (Befehl, params)
+        else:
+            cursor.execute (literal)     
         rows = cursor.fetchall ()
         if self.debug: print("AfpSQL.select result:",rows)
-        self.select_clause= Befehl
+        self.select_clause= literal
         return rows
     ## set a lock on the database table
     # @param datei - name of the table
@@ -387,6 +657,32 @@ class AfpSQL(object):
         if self.connections:
             for con in self.connections:
                 self.connections[con][1].execute(Befehl)
+    ## start a transaction, all following write routines are committed together by end_transaction \n
+    # transactions may be nested, only the outermost end_transaction finishes the transaction
+    def begin_transaction(self):
+        self.transaction += 1
+        if self.debug: print("AfpSQL.begin_transaction:", self.transaction)
+    ## finish a transaction started with begin_transaction
+    # @param ok - flag if the written data should be committed, otherwise the transaction is rolled back
+    def end_transaction(self, ok = True):
+        if self.transaction <= 0: return
+        self.transaction -= 1
+        if not ok: self.transaction_failed = True
+        if self.transaction: return
+        if self.transaction_failed:
+            if self.debug: print("AfpSQL.end_transaction: ROLLBACK")
+            self.db_cursor.execute("ROLLBACK;")
+            AfpSQL_resultcache.invalidate()
+        else:
+            if self.debug: print("AfpSQL.end_transaction: COMMIT")
+            self.db_cursor.execute("COMMIT;")
+        self.transaction_failed = False
+    ## commit the written data, if no transaction is open
+    # @param cursor - if given, cursor to be used, default: self.db_cursor
+    def commit(self, cursor = None):
+        if self.transaction: return
+        if cursor is None: cursor = self.db_cursor
+        cursor.execute("COMMIT;")
     ## return the last inserted database id
     def get_last_inserted_id(self):
         return self.lastrowid
@@ -415,7 +711,69 @@ class AfpSQL(object):
             datei = dateien[0].split(" ")[0]
             if self.get_readonly(datei): return
             self.write_delete(select_clause)
-            self.write_insert(datei, felder, data)
+            self.write_insert(datei, felder, data, None, False)
+    ## generate clause identifying a row by its complete original content, \n
+    # float values are matched with a relative tolerance, as FLOAT columns are delivered rounded \n
+    # returns the clause and the values to be bound
+    # @param felder - list of column names in table
+    # @param row - original content of row
+    def get_match_clause(self, felder, row):
+        clauses = []
+        params = []
+        for feld, value in zip(felder, row):
+            if type(value) == float:
+                clauses.append("ABS(`" + feld + "` - %s) <= %s")
+                params += [value, abs(value) * 1e-5]
+            else:
+                clauses.append("`" + feld + "` <=> %s")
+                params.append(value)
+        return " AND ".join(clauses), params
+    ## write only the differences of data to database, \n
+    # for tables without a primary key, rows are identified by the select clause and the complete original row content \n
+    # returns False if not all rows could be identified, in this case only the changes of this routine are rolled back,
+    # previous changes and locks of the open database transaction are kept
+    # @param select_clause - select clause the data has been loaded with \n
+    # "SELECT * FROM database.table WHERE ..."
+    # @param felder - list of column names in table
+    # @param deleted - list of original rows to be deleted
+    # @param updated - list of [original row, new row] pairs to be updated
+    # @param inserted - list of new rows to be inserted
+    def write_differences(self, select_clause, felder, deleted, updated, inserted):
+        split_clause = select_clause.split(" FROM ")
+        if len(split_clause) != 2: return False
+        split_dat = split_clause[1].split(" WHERE ")
+        datei = split_dat[0].split(",")[0].split(" ")[0]
+        if len(split_dat[0].split(",")) > 1 or self.get_readonly(datei): return False
+        AfpSQL_resultcache.invalidate(datei)
+        where = ""
+        if len(split_dat) > 1:
+            where = split_dat[1].split(" ORDER BY ")[0].split(" LIMIT ")[0]
+            if where: where = "(" + where + ") AND "
+        # only the changes of this routine are rolled back on failure
+        self.db_cursor.execute("SAVEPOINT afp_differences;")
+        ok = True
+        for row in deleted:
+            match, params = self.get_match_clause(felder, row)
+            Befehl = "DELETE FROM " + datei + " WHERE " + where + match + " LIMIT 1;"
+            if self.debug: print("AfpSQL.write_differences:", Befehl, "DATA:", params)
+            if self.db_cursor.execute(Befehl, params) != 1: ok = False
+        for orig, row in updated:
+            changed = [i for i in range(len(felder)) if orig[i] != row[i]]
+            match, params = self.get_match_clause(felder, orig)
+            Befehl = "UPDATE " + datei + " SET " + ",".join(["`" + felder[i] + "`=%s" for i in changed]) + " WHERE " + where + match + " LIMIT 1;"
+            if self.debug: print("AfpSQL.write_differences:", Befehl, "DATA:", row, params)
+            if self.db_cursor.execute(Befehl, [row[i] for i in changed] + params) != 1: ok = False
+        if ok and inserted:
+            Befehl = "INSERT INTO " + datei + " ( " + ",".join(felder) + " ) VALUES ( " + ",".join(["%s"]*len(felder)) + " );"
+            if self.debug: print("AfpSQL.write_differences:", Befehl, "DATA:", inserted)
+            if self.db_cursor.executemany(Befehl, inserted) != len(inserted): ok = False
+        if ok:
+            self.db_cursor.execute("RELEASE SAVEPOINT afp_differences;")
+            self.commit()
+        else:
+            if self.debug: print("AfpSQL.write_differences: rows could not be identified, rollback to savepoint")
+            self.db_cursor.execute("ROLLBACK TO SAVEPOINT afp_differences;")
+        return ok
     ## delete data from database
     # @param select_clause - select clause for database entries to be deleted \n
     # "SELECT * FROM database.table WHERE ..."
@@ -423,11 +781,12 @@ class AfpSQL(object):
         split_clause = select_clause.split(" FROM ")
         if len(split_clause) == 2:
             # delete data from database
+            AfpSQL_resultcache.invalidate(split_clause[1].split(" WHERE ")[0].split(",")[0])
             Befehl = "DELETE FROM " + split_clause[1]
             if self.debug:  print("AfpSQL.write_delete Command:", Befehl)
             cursor = self.get_cursor()
             res = cursor.execute (Befehl)     
-            cursor.execute("COMMIT;")
+            self.commit(cursor)
             if self.debug: print("AfpSQL.write_delete Deleted Rows:",res)
     ## update data in database, \n
     # for tables with a primary key
@@ -438,6 +797,7 @@ class AfpSQL(object):
     # @param no_commit - omit COMMIT statement at the end of this routine (if more database interactions should be done in one step)
     def write_update(self, datei, felder, data, select, no_commit= False):
         if self.get_readonly(datei): return
+        AfpSQL_resultcache.invalidate(datei)
         Befehl = None
         flen = len(felder)
         if len(data) == flen:
@@ -448,28 +808,78 @@ class AfpSQL(object):
         if not Befehl is None:
             if self.debug: print("AfpSQL.write_update:", Befehl, "DATA:", data)
             self.db_cursor.execute (Befehl, data)
-            if not no_commit: self.db_cursor.execute("COMMIT;")      
-    ## insert data in database, 
+            if not no_commit: self.commit()      
+    ## set number of rows written in one statement and one transaction by write_insert
+    # @param chunk - number of rows per chunk, chunk <= 1: each row is written in a single statement
+    def set_insert_chunk(self, chunk):
+        self.insert_chunk = chunk
+    ## return the database ids generated by the last call of write_insert in the order of the delivered rows
+    def get_last_inserted_ids(self):
+        return self.lastrowids
+    ## return the step between the ids generated by one multi-row insert statement, \n
+    # 0 if the ids may not be consecutive (innodb_autoinc_lock_mode = 2 allows interleaved ids of concurrent inserts)
+    def get_insert_increment(self):
+        if self.insert_increment is None:
+            try:
+                self.db_cursor.execute("SELECT @@auto_increment_increment, @@innodb_autoinc_lock_mode;")
+                increment, mode = self.db_cursor.fetchone()
+                if int(mode) < 2: self.insert_increment = int(increment)
+                else: self.insert_increment = 0
+            except MySQLdb.Error as e:
+                print("WARNING: AfpSQL.get_insert_increment: id generation cannot be retrieved:", e)
+                self.insert_increment = 0
+            if self.debug: print("AfpSQL.get_insert_increment:", self.insert_increment)
+        return self.insert_increment
+    ## insert data in database, \n
+    # rows are written in chunks, each chunk in one multi-row statement followed by one COMMIT, \n
+    # if the generated ids are needed and the database does not generate consecutive ids for one statement,
+    # the rows of a chunk are written in single statements \n
+    # returns the list of generated ids in the order of the written data rows, if wanted
     # @param datei - name of table
     # @param felder - list of column names in table, where data is written to 
     # @param data - list of data rows, each written to the columns indicated above
-    def write_insert(self, datei, felder, data):
-        if self.get_readonly(datei): return
+    # @param chunk - if given, number of rows written in one chunk, default: self.insert_chunk
+    # @param ids - flag if the generated ids are needed
+    def write_insert(self, datei, felder, data, chunk = None, ids = True):
+        if self.get_readonly(datei): return []
+        AfpSQL_resultcache.invalidate(datei)
         Befehl = None      
         flen = len(felder)   
         if not "." in datei: datei = self.get_dbname(datei)
+        if chunk is None: chunk = self.insert_chunk
+        if not chunk or chunk < 1: chunk = 1
+        rows = []
         for datarow in data:
             if len(datarow) == flen:
-                value_clause =  (" ( %(items)s ) VALUES ( %(values)s );") %  {"items" : ",".join(felder), "values" : ",".join( ["%s"]*flen ) }
-                Befehl = "INSERT INTO "  +  datei + value_clause 
-                if self.debug: print("AfpSQL.write_insert:", Befehl, datarow)
-                #print("AfpSQL.write_insert:", Befehl, datarow)
-                self.db_cursor.execute (Befehl, datarow)
-                self.lastrowid = self.db_cursor.lastrowid
+                rows.append(datarow)
             else:
                 print("WARNING: AfpSQL.write_insert: length data does not match number of fields (", flen, ",", len(datarow), ")") 
-        if not Befehl is None:
-            self.db_cursor.execute("COMMIT;")
+        self.lastrowids = []
+        if rows:
+            value_clause =  (" ( %(items)s ) VALUES ( %(values)s );") %  {"items" : ",".join(felder), "values" : ",".join( ["%s"]*flen ) }
+            Befehl = "INSERT INTO "  +  datei + value_clause 
+            increment = 1
+            if ids and chunk > 1: increment = self.get_insert_increment()
+            for start in range(0, len(rows), chunk):
+                part = rows[start:start + chunk]
+                if self.debug: print("AfpSQL.write_insert:", Befehl, len(part), part)
+                if len(part) == 1 or not increment:
+                    for row in part:
+                        self.db_cursor.execute (Befehl, row)
+                        self.lastrowids.append(self.db_cursor.lastrowid)
+                else:
+                    # MySQLdb combines the rows to one multi-row INSERT statement
+                    self.db_cursor.executemany (Befehl, part)
+                    # the server reports the id generated for the first row, the following ids are generated with the increment
+                    first = self.db_cursor.lastrowid
+                    if first:
+                        self.lastrowids += list(range(first, first + len(part)*increment, increment))
+                    else:
+                        self.lastrowids += [first]*len(part)
+                self.commit()
+            self.lastrowid = self.lastrowids[-1]
+            if not ids: self.lastrowids = []
+        return self.lastrowids
     ## direct execution of given mysql commands, retuns the returnvalue of the last command
     # @ param commands - given commands
     def execute(self, commands):
@@ -478,6 +888,9 @@ class AfpSQL(object):
             befehle = commands.split(";")
             for befehl in befehle:
                 if befehl:
+                    if not befehl.strip().upper().startswith(("SELECT", "SHOW")):
+                        # the tables changed by free commands are not known
+                        AfpSQL_resultcache.invalidate()
                     if "FROM" in befehl: 
                         split = befehl.split("FROM")
                         split[1] = split[1] .strip()
@@ -524,6 +937,20 @@ class AfpSQLTableSelection(object):
         self.manipulation = []
         self.data = []
         self.afterburner = None
+        self.watchers = None
+        self.feldindex = None # map column name -> column index
+        self.feldindex_names = None
+        self.feldindex_length = 0
+        self.feldspecs = None # cache of parsed column specifications
+        self.mani_index = None # map (row, action) -> entry of manipulation list
+        self.mani_source = None
+        self.mani_length = 0
+        self.dirty_rows = 0 # bitmap of changed rows
+        self.dirty_cols = 0 # bitmap of changed columns, -1: all columns
+        self.dirty_data = None # data the dirty row bitmap refers to, None: changes are not tracked
+        self.dirty_length = 0 # expected number of rows of tracked data
+        self.origin = None # original content of changed rows as loaded, False for unchanged rows, None for new rows (only tables without unique column)
+        self.origin_deleted = None # original content of deleted rows
         if self.debug: print("AfpSQLTableSelection Konstruktor", self, self.tablename)
         if self.feldnamen is None:
             self.feldnamen = []
@@ -572,11 +999,17 @@ class AfpSQLTableSelection(object):
     def has_changed(self, feld = None, last = False):
         changed = False
         if last:
-            manipulation = self.last_manipulation
-        else:
-            manipulation = self.manipulation
-        if manipulation:
-            changed = self.mani_has_changed(manipulation, feld)
+            if self.last_manipulation:
+                changed = self.mani_has_changed(self.last_manipulation, feld)
+            elif self.new: changed = True
+        elif self.manipulation:
+            self.mani_check_index()
+            index = None
+            if not feld is None: index = self.get_column_index(feld)
+            if index is None:
+                changed = self.mani_has_changed(self.manipulation, feld)
+            else:
+                changed = bool((self.dirty_cols >> index) & 1)
         elif self.new: changed = True
         return changed
     ## returns if table selection holds no data
@@ -593,8 +1026,8 @@ class AfpSQLTableSelection(object):
     # @param feldname - name of column
     def is_last_inserted_id(self, feldname):
         flag = False
-        if feldname in self.feldnamen:
-            index = self.feldnamen.index(feldname)
+        index = self.get_column_index(feldname)
+        if not index is None:
             if self.last_inserted_id and self.data[0][index] == self.last_inserted_id:
                 flag = True
         return flag
@@ -602,8 +1035,8 @@ class AfpSQLTableSelection(object):
     # @param feldname - name of column
     # @param row - index of row in this TableSelection
     def set_last_inserted_id(self, feldname, row = 0):
-        if self.last_inserted_id and feldname in self.feldnamen:
-            index = self.feldnamen.index(feldname)
+        index = self.get_column_index(feldname)
+        if self.last_inserted_id and not index is None:
             self.data[row][index] = self.last_inserted_id
             if self.dbg: print("AfpSQLTableSelection.set_last_inserted_id:", self.last_inserted_id, self.data[row][index], self.data)
     ## sets the data column in last row to indicated select criteria
@@ -647,7 +1080,7 @@ class AfpSQLTableSelection(object):
         if self.dbg: print("AfpSQLTableSelection.load_data:", self.select, self.tablename, order, self.data)
         self.select_clause = self.mysql.get_select_clause()
         self.new = False
-        self.manipulation = []  
+        self.mani_reset(True)
     ## reload data from database according to last load
     # @param order - if given desired order of output rows
     def reload_data(self, order = None):
@@ -664,7 +1097,7 @@ class AfpSQLTableSelection(object):
             self.data = list(map(list, [datei.get_values()]))
         else:
             self.data = [values]
-        self.manipulation = []    
+        self.mani_reset(True)
     ## attach input to data property
     # @param data - data to be attached
     # @param select - select clause for this  data
@@ -676,12 +1109,14 @@ class AfpSQLTableSelection(object):
         else:
             #self.data = map(list, data) # py2
             self.data = list(map(list, data)) 
+        self.dirty_data = None
     ## attach empty data
     # @param empty - flag if data should be comletely empty (true) or if one empty row should be inserted (false)
     # @param no_criteria - flag if selection criteria should be spread into new row (false) or not (true)
     def new_data(self, empty = False, no_criteria = False):
         self.new = True
         self.data = []
+        self.dirty_data = None
         if not empty: self.add_data_row(no_criteria)
     ## insert empy data row into data at given index
     # @param index - index where row should be inserted, if == None data will be added at the end
@@ -719,6 +1154,20 @@ class AfpSQLTableSelection(object):
         if row >= 0 and row < self.get_data_length():
             mani = [row, None]
             self.manipulate_data([mani])
+    ## add watcher object to be informed about rows added to or removed from data \n
+    # the watcher has to supply the methods 'row_added(row)' and 'row_removed(row)', 
+    # a changed value is reported as removal of the old and addition of the new row
+    # @param watcher - object to be informed
+    def add_watcher(self, watcher):
+        if self.watchers is None: self.watchers = []
+        self.watchers.append(watcher)
+    ## inform watchers about row added to or removed from data
+    # @param row - row which has been added or removed
+    # @param added - flag if row has been added or removed
+    def notify_watchers(self, row, added):
+        for watcher in self.watchers:
+            if added: watcher.row_added(row)
+            else: watcher.row_removed(row)
     ## log manipulation of data
     # @param changes - indicator of changes made \n
     # \n
@@ -749,24 +1198,137 @@ class AfpSQLTableSelection(object):
             if action == "delete":  # fill row into values to allow postprocessing, delete data row
                 originals = self.data[index]
                 del self.data[index]
+                if self.watchers: self.notify_watchers(originals, False)
                 #print("AfpSQLTableSelection.manipulate_data deleted:", index, originals)
             elif action == "replace" and typ == "dict":
                 originals = {}
                 for key in values:
-                    originals[key] = self.get_value(key, index)
+                    originals[key] = self.get_cell(key, index)
                     self.set_value(key, values[key], index)
             elif action == "replace" and typ == "list" and len(values) == len(self.feldnamen):
                 originals = self.data[index]
                 self.data[index] = values
+                if self.watchers: 
+                    self.notify_watchers(originals, False)
+                    self.notify_watchers(values, True)
             elif action == "append"  and typ == "list" and len(values) == len(self.feldnamen):
                     self.data.append(values)
+                    if self.watchers: self.notify_watchers(values, True)
                     self.set_select_criteria()
             elif action == "insert"  and typ == "list" and len(values) == len(self.feldnamen):
                     self.data.insert(index, values)
+                    if self.watchers: self.notify_watchers(values, True)
                     self.set_select_criteria()
             else:
                 print("ERROR: AfpSQLTableSelection.manipulate_data incorrect values:", action, typ)
-            self.manipulation.append([action, index, originals, values])
+            if action == "append": 
+                row = self.get_data_length() - 1
+            else:
+                row = index
+            self.mani_append([action, index, originals, values], row)
+    ## clear manipulation data
+    # @param track - flag if data is in sync with the database and following changes should be tracked rowwise
+    def mani_reset(self, track = False):
+        self.manipulation = []
+        self.mani_index = {}
+        self.mani_source = self.manipulation
+        self.mani_length = 0
+        self.dirty_rows = 0
+        self.dirty_cols = 0
+        if track: self.dirty_data = self.data
+        else: self.dirty_data = None
+        if self.data is None: self.dirty_length = 0
+        else: self.dirty_length = len(self.data)
+        self.origin = None
+        self.origin_deleted = None
+        if track and not self.unique_feldname and not self.data is None:
+            # original content is only copied when a row is changed
+            self.origin = [False if row else None for row in self.data]
+            self.origin_deleted = []
+    ## rebuild lookup index and column bitmap if manipulation list has been replaced or extended from outside, 
+    # in that case changed rows cannot be tracked anymore
+    def mani_check_index(self):
+        if self.mani_source is self.manipulation and self.mani_length == len(self.manipulation): return
+        if self.manipulation: self.dirty_data = None
+        self.mani_index = {}
+        self.mani_source = self.manipulation
+        self.mani_length = 0
+        self.dirty_cols = 0
+        for entry in self.manipulation:
+            self.mani_log(entry)
+    ## add manipulation entry to lookup index and column bitmap
+    # @param entry - manipulation entry [action, index, originals, values]
+    def mani_log(self, entry):
+        if entry[0] == "replace" and type(entry[3]) == dict:
+            self.mani_index.setdefault((entry[1], entry[0]), entry)
+            for feld in entry[3]:
+                index = self.get_column_index(feld)
+                if not index is None: self.dirty_cols |= 1 << index
+        else:
+            self.dirty_cols = -1
+        self.mani_length += 1
+    ## append manipulation entry to manipulation list
+    # @param entry - manipulation entry [action, index, originals, values]
+    # @param row - index of affected row in actuel data
+    def mani_append(self, entry, row):
+        self.mani_check_index()
+        self.manipulation.append(entry)
+        self.mani_log(entry)
+        self.mani_mark_row(row, entry[0], entry[2])
+    ## mark row as changed in dirty row bitmap, 
+    # for insertions and deletions the following rows are shifted accordingly
+    # @param row - index of row in actuel data
+    # @param action - manipulation action
+    # @param original - original row, if the row has already been replaced or deleted, otherwise the actuel row is the original one
+    def mani_mark_row(self, row, action = "replace", original = None):
+        if self.dirty_data is None or row is None: return
+        if not self.dirty_data is self.data:
+            self.dirty_data = None
+            return
+        bit = 1 << row
+        if action == "delete":
+            self.dirty_rows = (self.dirty_rows & (bit - 1)) | ((self.dirty_rows >> (row + 1)) << row)
+            self.dirty_length -= 1
+        elif action == "insert":
+            self.dirty_rows = (self.dirty_rows & (bit - 1)) | ((self.dirty_rows >> row) << (row + 1)) | bit
+            self.dirty_length += 1
+        else:
+            self.dirty_rows |= bit
+            if action == "append": self.dirty_length += 1
+        if not self.origin is None:
+            if not type(original) == list and not type(original) == tuple: original = None
+            if action == "delete":
+                orig = self.origin.pop(row)
+                if orig is False:
+                    if not original:
+                        # original content not available, row cannot be identified in database
+                        self.mani_invalidate()
+                        return
+                    orig = tuple(original)
+                if orig: self.origin_deleted.append(orig)
+            elif action == "insert":
+                self.origin.insert(row, None)
+            elif action == "append":
+                self.origin.append(None)
+            elif self.origin[row] is False:
+                if original is None: original = self.data[row]
+                self.origin[row] = tuple(original)
+    ## stop tracking changed rows, has to be called if data has been modified directly and not by the setters,
+    # all rows are written on the next store
+    def mani_invalidate(self):
+        self.dirty_data = None
+        self.origin = None
+        self.origin_deleted = None
+    ## return bitmap of rows changed since last load or write, 
+    # None if changes could not be tracked
+    def mani_get_dirty_rows(self):
+        self.mani_check_index()
+        if self.dirty_data is None or not self.dirty_data is self.data: return None
+        if len(self.data) != self.dirty_length:
+            # rows have been added or removed directly, positions in bitmap are not reliable
+            self.mani_invalidate()
+            return None
+        return self.dirty_rows
     ## returns the original or the new value of the column in the actuel manipulation data, 
     # if no actuel manipulation data is present, the last manipulation data is schecked 
     # @param feld - it will be checked if this column has been changed
@@ -812,9 +1374,7 @@ class AfpSQLTableSelection(object):
     # @param feld - it will be checked if this column has been changed
     # @param row - index of row from where values should be extracted
     def mani_get_from_row(self, manipulation, feld, row):
-        index = None
-        if feld in self.feldnamen:
-            index = self.feldnamen.index(feld)
+        index = self.get_column_index(feld)
         entry = manipulation[row]
         original, value = self.mani_get_value_from_entry(entry, feld, index) 
         return original, value
@@ -825,9 +1385,7 @@ class AfpSQLTableSelection(object):
     def mani_get_values(self, manipulation, feld):
         value = None
         original = None
-        index = None
-        if feld in self.feldnamen:
-            index = self.feldnamen.index(feld)
+        index = self.get_column_index(feld)
         for entry in manipulation: 
             orig, value = self.mani_get_value_from_entry(entry, feld, index) 
             if original is None: original = orig
@@ -881,17 +1439,34 @@ class AfpSQLTableSelection(object):
     ## return list of column names
     def get_feldnamen(self):
         return self.feldnamen  
+    ## return dictionary mapping the column names to their indices, 
+    # the dictionary is regenerated if the list of column names has been replaced or extended
+    def get_feldindex(self):
+        if self.feldindex is None or not self.feldindex_names is self.feldnamen or self.feldindex_length != len(self.feldnamen):
+            self.feldindex = {}
+            for i in range(len(self.feldnamen)-1, -1, -1):
+                self.feldindex[self.feldnamen[i]] = i
+            self.feldindex_names = self.feldnamen
+            self.feldindex_length = len(self.feldnamen)
+            self.feldspecs = {}
+        return self.feldindex
+    ## return index of given column name, None if column does not exist
+    # @param feld - column name
+    def get_column_index(self, feld):
+        return self.get_feldindex().get(feld)
+    ## return the indices of a comma separated list of column names as used in get_values, 
+    # the parsed lists are cached
+    # @param felder - column names separated by a colon (,), surrounding spaces are ignored
+    def get_feldspec(self, felder):
+        feldindex = self.get_feldindex()
+        if not felder in self.feldspecs:
+            self.feldspecs[felder] = [feldindex.get(feld.strip()) for feld in felder.split(",")]
+        return self.feldspecs[felder]
     ## return indices of given entries in the column name list
     # @param felder - column names separates by a colon (,)
     def get_feldindices(self, felder):
-        split = felder.split(",")
-        indices = []
-        for feld in split:
-            if feld in self.feldnamen:
-                indices.append(self.feldnamen.index(feld))
-            else:
-                indices.append(None)
-        return indices
+        feldindex = self.get_feldindex()
+        return [feldindex.get(feld) for feld in felder.split(",")]
     ## retrieve values of indicated columns
     # @param felder - if a colon separated list is given, the appropriate values are returned. None - all values are returned
     # @param row - index of row where values are extracted from. row < 0 values are extract from all rows
@@ -906,11 +1481,7 @@ class AfpSQLTableSelection(object):
                 elif row < len(self.data):
                     result.append(self.data[row])
             else:
-                split = felder.split(",")
-                index = []
-                for feld in split:
-                    if feld.strip() in self.feldnamen: index.append(self.feldnamen.index(feld.strip()))
-                    else: index.append(None)
+                index = self.get_feldspec(felder)
                 if self.data:
                     #print "AfpSQLTableSelection.get_values:",felder, split, index
                     #print "AfpSQLTableSelection.get_values:",self.data, self.feldnamen
@@ -925,19 +1496,15 @@ class AfpSQLTableSelection(object):
     ## retrieve value of indicated column
     # @param feld - column name of indicated column
     def get_value(self, feld):
-        wert = None
-        rows = self.get_values(feld)
-        #print "get_value", rows, type(rows)      
-        if type(rows) == list:
-            if len(rows) > 0 :
-                row = rows[0] 
-                if type(row) == list:
-                    if len(row) > 0 : wert = row[0]
-                else:
-                    wert = row
-        else:
-            wert = rows
-        return wert
+        return self.get_cell(feld)
+    ## retrieve value of indicated column in indicated row directly from data
+    # @param feld - column name of indicated column, if a colon separated list is given, the first column is used
+    # @param row - index of row
+    def get_cell(self, feld, row = 0):
+        if not self.data or row >= len(self.data) or not self.data[row]: return None
+        index = self.get_feldspec(feld)[0]
+        if index is None: return None
+        return self.data[row][index]
     ## retrieve string representation of value of indicated column
     # @param feld - column name of indicated column
     def get_string_value(self, feld):
@@ -962,12 +1529,12 @@ class AfpSQLTableSelection(object):
         cache = {}
         #print ("AfpSQLTableSelection.spread_collection_indcators input:", feldname, indicator, lgh)
         for row in range(0,lgh):
-            ind = self.get_values(indicator, row)[0][0] 
+            ind = self.get_cell(indicator, row)
             if ind:
                 if ind in cache:
                     value = cache[ind]
                 else:
-                    value = self.get_values(feldname, row)[0][0] 
+                    value = self.get_cell(feldname, row)
                     cache[ind] = value
                 #print ("AfpSQLTableSelection.spread_collection_indcators:", row, ind, value, cache)
                 if ind != value:
@@ -982,7 +1549,7 @@ class AfpSQLTableSelection(object):
         #print ("AfpSQLTableSelection.spread_value:", self.tablename, feldname, value, lgh)
         for row in range(0,lgh):
             #print ("AfpSQLTableSelection.spread_value row:", feldname, row, self.get_values(feldname, row))
-            if keep and self.get_values(feldname, row)[0][0]: continue
+            if keep and self.get_cell(feldname, row): continue
             #print ("AfpSQLTableSelection.spread_value set:", feldname, row, "->", value)
             self.set_value(feldname, value, row)
         if self.select is None:
@@ -996,7 +1563,7 @@ class AfpSQLTableSelection(object):
         index = None
         rows = []
         feld = feldname.strip()
-        if feld in self.feldnamen:  index = self.feldnamen.index(feld) 
+        index = self.get_column_index(feld)
         #print("AfpSQLTableSelection.find_value_row:", value, feldname, feld, index)
         if not index is None:
             for row in self.data: 
@@ -1019,10 +1586,12 @@ class AfpSQLTableSelection(object):
         if self.dbg: print("AfpSQLTableSelection.set_value:", feldname, value, type(value))#, self.feldnamen
         if row >= self.get_data_length() or (row == 0 and self.data[0] is None):
             row = self.add_data_row()
-        if feldname in self.feldnamen:
-            index = self.feldnamen.index(feldname)
+        index = self.get_column_index(feldname)
+        if not index is None:
             self.set_manipulation(feldname, row, value)
+            if self.watchers: self.notify_watchers(self.data[row], False)
             self.data[row][index] = value
+            if self.watchers: self.notify_watchers(self.data[row], True)
     ## set data values from given dictionary
     # @param changed_data - dictionary holding appropriate value in entry [column name]
     # @param row -  index of row where values have to be inserted 
@@ -1040,19 +1609,18 @@ class AfpSQLTableSelection(object):
     # @param row - index of row
     # @param value - value to be set
     def set_manipulation(self, feldname, row, value):
-        add = True
-        for mani in self.manipulation:
-            if mani[0] == "replace" and mani[1] == row:
-                mani[3][feldname] = value
-                add = False
-                break
-        if add:
-            original = self.get_values(feldname, row) 
-            if original[0]:
-                original = original[0][0]
+        self.mani_check_index()
+        mani = self.mani_index.get((row, "replace"))
+        if mani:
+            mani[3][feldname] = value
+            self.dirty_cols |= 1 << self.get_column_index(feldname)
+            self.mani_mark_row(row)
+        else:
+            if self.data[row]:
+                original = self.data[row][self.get_column_index(feldname)]
             else:
                 original = ""
-            self.manipulation.append(["replace", row, {feldname: original}, {feldname: value}])
+            self.mani_append(["replace", row, {feldname: original}, {feldname: value}], row)
     ## set a lock on database table according to actuel select clause
     def lock_data(self):
         self.mysql.lock(self.tablename,  self.select)
@@ -1081,7 +1649,7 @@ class AfpSQLTableSelection(object):
                     for row in range(self.get_data_length()):
                         for i in range(len(vars)):
                             if not Afp_hasNumericValue(vars[i]):
-                                vals[i] = Afp_toString(self.get_values(vars[i], row)[0][0])
+                                vals[i] = Afp_toString(self.get_cell(vars[i], row))
                         #print "execute_afterburner vals:", vals, signs
                         formula = ""
                         for i in range(len(vals)-1):
@@ -1100,20 +1668,46 @@ class AfpSQLTableSelection(object):
                     exec(pyBefehl)
                     if self.dbg: print("AfpSQLTableSelection.execute_afterburner:", pyBefehl)
             self.afterburner = None
+    ## write only changed, inserted and deleted rows of a table without unique column to database, \n
+    # data is only reloaded if rows have been inserted or the select criteria changed \n
+    # returns False if changes have not been tracked or could not be written, the complete data has to be rewritten in this case
+    def store_differences(self):
+        dirty = self.mani_get_dirty_rows()
+        if dirty is None or self.origin is None or len(self.origin) != len(self.data): return False
+        updated = []
+        inserted = []
+        for row in range(len(self.data)):
+            if not (dirty >> row) & 1: continue
+            if not self.data[row] or len(self.data[row]) != len(self.feldnamen): return False
+            if self.origin[row] is None:
+                inserted.append(self.data[row])
+            elif self.origin[row] is False:
+                return False
+            elif tuple(self.data[row]) != self.origin[row]:
+                updated.append([self.origin[row], self.data[row]])
+        if self.dbg: print("AfpSQLTableSelection.store_differences:", self.origin_deleted, updated, inserted)
+        if not (self.origin_deleted or updated or inserted): return True
+        if not self.mysql.write_differences(self.select_clause, self.feldnamen, self.origin_deleted, updated, inserted): return False
+        select = self.select
+        self.reset_select()
+        if inserted or select != self.select: self.reload_data()
+        return True
     ## write attached data to database
     def store(self):
         # writes data hold directly in this SelectionTable
         if self.dbg: print("AfpSQLTableSelection.store:",self.tablename, self.unique_feldname)
         if self.unique_feldname:
+            new_rows = []
+            # only rows changed since last load are written, if changes have been tracked
+            dirty = None
+            if not self.new: dirty = self.mani_get_dirty_rows()
             for row in range(self.get_data_length()):
-                unique_value = self.get_values(self.unique_feldname, row)[0][0]
+                unique_value = self.get_cell(self.unique_feldname, row)
                 if not unique_value:
                     if self.dbg: print("AfpSQLTableSelection.store unique new value:", self.last_inserted_id, self.get_values(None, row)[0])
-                    #print "AfpSQLTableSelection.store unique new value:", self.last_inserted_id, self.get_values(None, row)[0]
-                    self.mysql.write_insert( self.tablename, self.feldnamen, self.get_values(None, row))
-                    self.last_inserted_id = self.mysql.get_last_inserted_id() 
-                    if self.dbg: print("AfpSQLTableSelection.store unique last_inserted_id:",  self.last_inserted_id)
-                    self.set_last_inserted_id(self.unique_feldname, row)
+                    new_rows.append(row)
+                elif not dirty is None and not (dirty >> row) & 1:
+                    continue
                 else:
                     if self.new: 
                         select = None
@@ -1121,6 +1715,13 @@ class AfpSQLTableSelection(object):
                         select = self.unique_feldname + " = " + Afp_toQuotedString(unique_value)
                     if self.dbg: print("AfpSQLTableSelection.store unique value already set:", select, self.get_values(None, row)[0])
                     self.mysql.write_unique( self.tablename,  self.feldnamen, self.get_values(None, row)[0], select)  
+            if new_rows:
+                # new rows are written in one bulk insert, generated ids are delivered in order of the rows
+                ids = self.mysql.write_insert( self.tablename, self.feldnamen, [self.data[row] for row in new_rows])
+                for row, new_id in zip(new_rows, ids):
+                    self.last_inserted_id = new_id
+                    self.set_last_inserted_id(self.unique_feldname, row)
+                if self.dbg: print("AfpSQLTableSelection.store unique last_inserted_id:",  self.last_inserted_id)
             if self.get_data_length() == 0:
                 # check if data has been deleted
                 if self.has_been_deleted():
@@ -1140,15 +1741,17 @@ class AfpSQLTableSelection(object):
             if self.dbg: print("AfpSQLTableSelection.store new:", new, self.new)
             if new or self.new:
                 if self.dbg: print("AfpSQLTableSelection.store insert:", self.get_values())
-                self.mysql.write_insert( self.tablename, self.feldnamen, self.get_values())
-            else:
+                self.mysql.write_insert( self.tablename, self.feldnamen, self.get_values(), None, False)
+                self.reset_select()
+                self.reload_data()
+            elif not self.store_differences():
                 if self.dbg: print("AfpSQLTableSelection.store no_unique:", self.select_clause, self.get_values())            
                 self.mysql.write_no_unique(self.select_clause, self.feldnamen, self.get_values())
-            self.reset_select()
-            self.reload_data()
+                self.reset_select()
+                self.reload_data()
         self.new = False
         self.last_manipulation = self.manipulation
-        self.manipulation = []
+        self.mani_reset(True)
         if self.afterburner: 
             self.execute_afterburner()
             if self.select_clause is None and self.select:
@@ -44,6 +44,7 @@
 #
 
 import MySQLdb
+import time
 
 from AfpBase.AfpDatabase.AfpSQL import *
 from AfpBase.AfpUtilities.AfpStringUtilities import *
@@ -120,6 +121,85 @@ def AfpSb_countDuplicates(rows, direct, ind, ref = 0):
     #print "AfpSb_countDuplicates:", all, complete, direct, len(rows), count, ref_ind, prev 
     return count,ref_ind
 
+## cache for windows of rows read while stepping through an index, \n
+# windows are identified by table, database, index, filter and index clause (direction and start value), \n
+# the least recently used windows are dropped if the maximal number is reached, 
+# windows of a table are dropped when this table is written
+class AfpSbWindowCache(object):
+    ## constructor
+    # @param size - maximal number of windows held
+    # @param lifetime - lifetime of a window in seconds
+    def  __init__(self, size = 50, lifetime = 10):
+        self.size = size
+        self.lifetime = lifetime
+        self.windows = {} # key -> [birth, rows], ordered from least to most recently used
+        self.hits = 0
+        self.misses = 0
+        self.extensions = 0
+        self.evictions = 0
+        self.invalidations = 0
+    ## set size and lifetime of windows, existing windows are dropped
+    # @param size - if given, maximal number of windows, 0: no caching
+    # @param lifetime - if given, lifetime of a window in seconds
+    def configure(self, size = None, lifetime = None):
+        if not size is None: self.size = size
+        if not lifetime is None: self.lifetime = lifetime
+        self.windows = {}
+    ## normalise table name 
+    # @param table - name of table, possibly with database prefix
+    def get_table(self, table):
+        return table.strip().split(" ")[0].split(".")[-1].upper()
+    ## return cached window or None if not available
+    # @param key - identifier of window
+    def get(self, key):
+        entry = self.windows.pop(key, None)
+        if entry and time.monotonic() - entry[0] < self.lifetime:
+            self.windows[key] = entry
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+    ## store window in cache
+    # @param key - identifier of window
+    # @param rows - rows of window
+    def put(self, key, rows):
+        if not self.size: return
+        self.windows.pop(key, None)
+        if len(self.windows) >= self.size:
+            del self.windows[next(iter(self.windows))]
+            self.evictions += 1
+        self.windows[key] = [time.monotonic(), list(rows)]
+    ## add rows at the end of a cached window, returns the extended window
+    # @param key - identifier of window
+    # @param rows - rows to be added
+    def extend(self, key, rows):
+        entry = self.windows.get(key)
+        if entry is None: return list(rows)
+        entry[1] += rows
+        self.extensions += 1
+        return entry[1]
+    ## drop cached windows
+    # @param table - if given, only windows of this table are dropped
+    def invalidate(self, table = None):
+        if table is None:
+            keys = list(self.windows.keys())
+        else:
+            table = self.get_table(table)
+            keys = [key for key in self.windows if key[0] == table]
+        for key in keys:
+            del self.windows[key]
+        if keys: self.invalidations += 1
+    ## return statistics of cache usage as dictionary
+    def get_stats(self):
+        total = self.hits + self.misses
+        ratio = 0.0
+        if total: ratio = float(self.hits)/total
+        return {"hits": self.hits, "misses": self.misses, "ratio": ratio, "extensions": self.extensions, "evictions": self.evictions, "invalidations": self.invalidations, "windows": len(self.windows)}
+
+## window cache shared by all indices, dropped on writes to the tables via AfpSQL
+AfpSb_windowcache = AfpSbWindowCache()
+AfpSQL_resultcache.add_listener(AfpSb_windowcache.invalidate)
+
 ## Index class to hold all values of current record (current row) of one table retrieved form database. \n
 # This class provides a unique order which works symmertic moving forward and backward through the tables. \n
 # This is problematic, as mysql does not provide such a thing especially on multiple identic index entries. \n
@@ -152,6 +232,9 @@ class AfpSbIndex(object):
         self.indexdups = None      # for identic entries: number of identic entries
         self.uind_ind = None          # if unique index exsists in 'Datei': index of field building the unique index
         self.uindexwert = None     # if unique index exsists in 'Datei': value of unique index field
+        self.uind_name = None       # if unique index exsists in 'Datei': name of unique index field
+        self.keyset = None            # [index value, unique value] of actuel dataset for keyset navigation
+        self.use_keyset = True       # flag if keyset navigation should be used where possible
         self.where = None            # filter clause to be implied on  this index
         self.felder = None            # values of actuel dataset
         self.modified = False        # flag, if values have been modified
@@ -220,6 +303,7 @@ class AfpSbIndex(object):
             self.indexwert = self.get_indexwert()
             self.indexoffset = None
             self.indexdups = None
+            self.keyset = None
             self.endoffile = False
     def clear_values(self):
         if not self.felder is None:
@@ -233,6 +317,7 @@ class AfpSbIndex(object):
             #print FNr
             self.indexoffset = None
             self.indexdups = None
+            self.keyset = None
             indexwert = Afp_extractStringValues(self.index_ind, index.felder, True)
             #print "AfpSbIndex.sync_to_index:", indexwert, type(indexwert)
             self.indexwert = indexwert
@@ -267,9 +352,78 @@ class AfpSbIndex(object):
         return equal
     def set_uind(self):
         self.uindexwert = self.get_indexwert(True)
-    def set_uind_ind(self, ind):
+    def set_uind_ind(self, ind, name = None):
         self.uind_ind = ind
+        self.uind_name = name
         self.set_uind()
+    ## keyset navigation is possible for single column indices, if a unique index exists in 'Datei'. \n
+    # The rows are ordered by (index, unique index), each step seeks directly behind resp. before 
+    # the (index, unique index) values of the actuel dataset, so no rows have to be skipped on the server.
+    def keyset_possible(self):
+        return self.use_keyset and self.index_bez is None and bool(self.index_ind) and bool(self.uind_ind) and not self.uind_name is None
+    ## remember (index, unique index) values of the actuel dataset 
+    def set_keyset(self):
+        if self.keyset_possible() and self.felder:
+            self.keyset = [self.felder[self.index_ind[0]], self.felder[self.uind_ind[0]]]
+        else:
+            self.keyset = None
+    ## generate keyset order clause
+    # @param desc - flag if order should be descending
+    def gen_keyset_order(self, desc):
+        if desc: postfix = " DESC"
+        else: postfix = ""
+        if self.name == self.uind_name:
+            return " ORDER BY " + self.name + postfix
+        return " ORDER BY " + self.name + postfix + ", " + self.uind_name + postfix
+    ## generate keyset seek clause and its parameters \n
+    # NULL index values sort first in ascending order and are never matched by a row comparison,
+    # they are handled explicitly
+    # @param sign - comparison operator used to seek from the actuel dataset
+    def gen_keyset_clause(self, sign):
+        if self.name == self.uind_name:
+            return self.name + " " + sign + " %s", [self.keyset[1]]
+        if self.keyset[0] is None:
+            clause = "(" + self.name + " IS NULL and " + self.uind_name + " " + sign + " %s)"
+            if sign[0] == ">": clause = "(" + clause + " or " + self.name + " IS NOT NULL)"
+            return clause, [self.keyset[1]]
+        clause = "(" + self.name + ", " + self.uind_name + ") " + sign + " (%s, %s)"
+        if sign[0] == "<": clause = "(" + clause + " or " + self.name + " IS NULL)"
+        return clause, list(self.keyset)
+    ## select dataset relative to the actuel dataset using keyset navigation \n
+    # the symmetric behaviour of 'select_plus_step' at the end of the index is kept
+    # @param in_step - number of datasets to step, negative values step backwards, 0 reselects actuel dataset
+    def select_keyset_step(self, in_step):
+        desc = in_step < 0
+        step = abs(in_step)
+        # step zero or reversal of direction at end of index: select actuel dataset
+        inclusive = step == 0 or (self.endoffile and self.eofrev != desc)
+        if desc: sign = "<"
+        else: sign = ">"
+        if inclusive:
+            sign += "="
+            offset = 0
+        else:
+            offset = step - 1
+        where_clause = ""
+        if not self.where is None: where_clause = "(" + self.where.replace("%","%%") + ") and "
+        key_clause, params = self.gen_keyset_clause(sign)
+        Befehl = "SELECT * FROM " + self.db + "." + self.datei + " WHERE " + where_clause + key_clause + self.gen_keyset_order(desc) + (" LIMIT %d,1") % offset
+        if self.debug: print("AfpSbIndex.select_keyset_step:", Befehl, params)
+        self.db_cursor.execute(Befehl, params)
+        rows = self.db_cursor.fetchall()
+        if rows:
+            self.felder = list(rows[0])   
+            self.modified = False        
+            self.indexwert = self.get_indexwert()
+            self.indexoffset = None
+            self.indexdups = None
+            self.set_uind()
+            self.set_keyset()
+            self.endoffile = False
+        else:
+            self.endoffile = True
+            self.eofrev = desc
+        if self.debug: print("AfpSbIndex.select_keyset_step:", self.indexwert, self.uindexwert, self.endoffile)
     def set_indexoffset(self, rows, offset, dup, ref, reverse):
         if offset > dup:
             self.indexoffset = None
@@ -433,37 +587,51 @@ class AfpSbIndex(object):
         if self.debug: print("AfpSbIndex,gen_next_indexwert:", self.indexwert)
     def cached_select(self, Befehl):
         rows = None
-        use_cache = False
+        key = None
         ident = Afp_getToLastChar(Befehl, ",")
         anz = int(Befehl[len(ident):])
         #print "AfpSbIndex.cached_select:", self.imaxident, anz, self.cache_threshold
         #print "AfpSbIndex.cached_select ident:", ident
         if anz > self.cache_threshold:
-            use_cache = True
-            if self.cache:
-                if self.cache.is_valid(ident):
-                    lgh = self.cache.get_length()
-                    if lgh < anz-1:
-                        Add = ident[:-2] + str(lgh) + "," + str(anz) 
-                        if self.debug: print("AfpSbIndex.cached_select add:", Add)
-                        self.db_cursor.execute (Add)     
-                        added = self.db_cursor.fetchall ()
-                        self.cache.add_array(ident, added)
-                    rows = self.cache.read_array(ident)  
-        else:
-            use_cache = False
-            self.cache = None
+            key = (AfpSb_windowcache.get_table(self.datei), self.db, self.name, self.where, ident)
+            rows = AfpSb_windowcache.get(key)
+            if not rows is None:
+                lgh = len(rows)
+                if lgh < anz-1:
+                    Add = ident[:-2] + str(lgh) + "," + str(anz) 
+                    if self.debug: print("AfpSbIndex.cached_select add:", Add)
+                    self.db_cursor.execute (Add)     
+                    added = self.db_cursor.fetchall ()
+                    rows = AfpSb_windowcache.extend(key, added)
         if rows is None:
             if self.debug: print("AfpSbIndex.cached_select:", Befehl)
             self.db_cursor.execute (Befehl)     
             rows = self.db_cursor.fetchall ()
-            if use_cache:
-                self.cache = AfpArrayCache(ident, rows, self.debug)
+            if key: AfpSb_windowcache.put(key, rows)
         return rows
     def select_first_last(self, order):
         where_clause = ""
         if not self.where is None: 
             where_clause = " WHERE ("+ self.where + ")"
+        if self.keyset_possible():
+            Befehl = "SELECT * FROM " + self.db + "." + self.datei + where_clause + self.gen_keyset_order(order == "DESC") + " LIMIT 0,1"
+            if self.debug: print("AfpSbIndex.select_first_last:", Befehl)
+            self.db_cursor.execute (Befehl)
+            rows = self.db_cursor.fetchall ()
+            if rows:
+                self.felder = list(rows[0])    
+                self.modified = False
+                self.indexwert = self.get_indexwert()
+                self.indexoffset = None
+                self.indexdups = None
+                self.set_uind()
+                self.set_keyset()
+                self.endoffile = False
+            else:
+                self.endoffile = True
+                self.eofrev = (order == "DESC")
+            if self.debug: print("AfpSbIndex.select_first_last:", self.indexwert, self.endoffile, self.eofrev)
+            return
         if  not self.index_bez is None: 
             self.gen_first_indexwert(order, where_clause)
             if where_clause != "": where_clause += " and" 
@@ -522,6 +690,9 @@ class AfpSbIndex(object):
                 self.select_plus_step(0)
     def select_plus_step(self, in_step):
         if self.debug: print("AfpSbIndex.select_plus_step input:", in_step)
+        if self.keyset and self.keyset_possible():
+            self.select_keyset_step(in_step)
+            return
         step = in_step
         if in_step < 0:
             step *= -1
@@ -578,6 +749,7 @@ class AfpSbIndex(object):
             self.indexwert = self.get_indexwert()
             self.set_indexoffset(rows, offset, dup, ref,  in_step < 0)
             self.set_uind()
+            self.set_keyset()
             self.endoffile = False
         else:
             self.endoffile = True
@@ -627,6 +799,7 @@ class AfpSbIndex(object):
             self.indexoffset = None
             self.indexdups = None
             self.set_uind()
+            self.set_keyset()
             self.endoffile = False
         else:
             self.endoffile = True
@@ -707,7 +880,7 @@ class AfpSbDatei(object):
                     self.indexname.append(feldname)
                 if feldindex == "PRI":
                     self.UniqueIndex = self.index[-1]
-                    self.UniqueIndex.set_uind_ind([count])
+                    self.UniqueIndex.set_uind_ind([count], feldname)
             count += 1
         db_cursor.execute ("SHOW INDEX FROM " + name)
         rows = db_cursor.fetchall ()
@@ -735,7 +908,7 @@ class AfpSbDatei(object):
         else:
             self.CurrentIndex = self.UniqueIndex
             for index in self.index:
-                index.set_uind_ind(self.UniqueIndex.uind_ind)
+                index.set_uind_ind(self.UniqueIndex.uind_ind, self.UniqueIndex.name)
     def set_debug(self):
         self.debug = True
         for ind in self.index:
@@ -807,6 +980,7 @@ class AfpSbDatei(object):
         # mysql statement will be executed here
         if self.debug: print("AfpSbDatei.set_lock ",typ, pure, commit, ": ",Befehl)
         res = 0
+        if commit: AfpSQL_resultcache.invalidate(self.name)
         if pure:
             res = self.db_cursor.execute(Befehl)
         else:
@@ -887,6 +1061,10 @@ class AfpSuperbase(object):
         self.dats = 0 
         self.CurrentFile = None
         self.selections = None
+        size = self.globals.get_value("index-cache-size")
+        lifetime = self.globals.get_value("index-cache-lifetime")
+        if not size is None or not lifetime is None:
+            AfpSb_windowcache.configure(size, lifetime)
         if self.debug: print("AfpSuperbase Konstruktor")
     ## destructor
     def __del__(self):
@@ -910,6 +1088,10 @@ class AfpSuperbase(object):
     ## hand over the used mysql database connection
     def get_mysql(self):
         return self.globals.get_mysql()
+    ## return statistics of the window cache used for stepping through the indices \n
+    # dictionary with entries 'hits', 'misses', 'ratio', 'extensions', 'evictions', 'invalidations' and 'windows'
+    def get_cache_stats(self):
+        return AfpSb_windowcache.get_stats()
     ## open connection to a certain table (Datei) and retrieve data for the different indices
     # @param Dateiname - name of the table
     def open_datei(self, Dateiname):
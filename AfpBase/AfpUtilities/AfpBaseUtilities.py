@@ -39,6 +39,8 @@ import platform
 import getpass
 import datetime
 import base64
+import socket
+import threading
 import tzlocal
 #import logging
 import shutil
@@ -707,6 +709,100 @@ def Afp_startProgramFile(programname, debug, filename, parameter = None):
 #def Afp_getLogger(name):
 #    return logging.getLogger(name)
 
+## generate the mime message of an email
+# @param sender - string giving sender mailaddress
+# @param recipients - list of target mailadresses
+# @param subject - subject of mail
+# @param message - plain text message body
+# @param html_message - html text message body
+# @param attachments - list of filepathes of files to be attached
+# @param debug - flag for debug information DEFAULT: False
+# @param cache - if given, AfpMailAttachmentCache where the encoded attachments are taken from
+def Afp_genMailMessage(sender, recipients, subject, message, html_message, attachments, debug = False, cache = None):
+    #decoder = 'us-ascii'
+    decoder = 'latin-1'
+    msg = MIMEMultipart()
+    msg['Date'] = formatdate(localtime=True)
+    msg['Subject'] = Afp_decodeMailText(subject, decoder)
+    msg['From'] = sender
+    msg['To'] = ', '.join(recipients)
+    if message:
+        part = MIMEText(Afp_decodeMailText(message, decoder), 'plain')
+        msg.attach(part)
+    if html_message:
+        part = MIMEText(Afp_decodeMailText(html_message, decoder), 'html')
+        msg.attach(part)
+    if debug: print("Afp_genMailMessage attachments:", attachments)
+    if attachments:
+        for attach in attachments:
+            if cache:
+                part = cache.get_part(attach)
+            else:
+                part = MIMEBase('application', "octet-stream")
+                part.set_payload(open(attach, "rb").read())
+                email.encoders.encode_base64(part)
+                #part.add_header('Content-Disposition', 'attachment; filename=' + attach)
+                part.add_header('Content-Disposition', 'attachment; filename=' + Afp_extractBase(attach))
+            msg.attach(part)
+    return msg
+## decode mail text given as bytes
+# @param text - text to be decoded
+# @param decoder - codec used for decoding
+def Afp_decodeMailText(text, decoder = 'latin-1'):
+    if isinstance(text, bytes): text = text.decode(decoder)
+    return text
+## open an authenticated connection to a SMTP-server, returns the smtplib server object
+# @param smtphost - string defining host to be connected
+# @param user - if given, username to be used for login
+# @param word - if given, password to be used for login (login will only be invoked if user and word are given)
+# @param debug - flag for debug information DEFAULT: False
+# @param security - flag for smtp secutity, possible values:None, STARTTLS, SSL, if not given explicit in 'smtpport' DEFAULT: None
+# @param smtpport - if given, integer defining the port of server, if not given, port 25 will be used
+# @param timeout - if given, timeout in seconds for blocking operations
+def Afp_openSMTP(smtphost, user = None, word = None, debug = False, security = None, smtpport = None, timeout = None):
+    port = 25
+    tls = False
+    if smtpport:
+        port = smtpport
+    elif security == "SSL":
+        port = 465
+    elif security == "STARTTLS":
+        tls = True
+        port = 587
+    if timeout is None: timeout = socket._GLOBAL_DEFAULT_TIMEOUT
+    if debug: print("Afp_openSMTP Server:",smtphost + ":" + str(port), security)
+    if security == "SSL":
+        server = smtplib.SMTP_SSL(smtphost, port, timeout = timeout)
+        if debug: server.set_debuglevel(1)
+    else:
+        server = smtplib.SMTP(smtphost, port, timeout = timeout)
+        if debug: server.set_debuglevel(1)
+        if tls: 
+            if debug: print("Afp_openSMTP: STARTTLS")
+            server.starttls()
+    if user and word:
+        if debug: print("Afp_openSMTP: LOGIN:",user, word)
+        server.login(user,  base64.b64decode(word).decode("UTF-8"))
+    return server
+## store a sent mail in a directory, returns the name of the written file
+# @param msg - mime message of mail
+# @param recipients - list of target mailadresses
+# @param subject - subject of mail
+# @param dir - directory, where sent mails should be stored
+def Afp_storeMail(msg, recipients, subject, dir):
+    fname = None
+    if Afp_existsFile(dir):
+        monat = {"Jan":"01", "Feb":"02", "Mar":"03", "Apr":"04", "May":"05", "Jun":"06", "Jul":"07", "Aug":"08", "Sep":"09", "Oct":"10", "Nov":"11", "Dec":"12"}
+        split = msg['Date'].split()
+        date = split[3][2:] + monat[split[2]] + split[1] + "_" + split[4].replace(":","")
+        fname = "Mail_" + date + "_" + recipients[0]  + "__" +  Afp_decodeMailText(subject).replace(" ", "_").replace(":","")   + ".eml"
+        fpath = dir + fname
+        file = open(fpath, 'w')
+        file.write(str(msg))
+        file.close()
+    else:
+        print("WARNING: Afp_storeMail maildir '" + dir + "' does not exists, mail not stored!")
+    return fname
 ## send an email over a SMTP-server \n
 # sender, recipient, smtphost and message or html_message have to be given.
 # @param sender - string giving sender mailaddress
@@ -725,66 +821,14 @@ def Afp_startProgramFile(programname, debug, filename, parameter = None):
 #def Afp_sendOverSMTP(sender, recipients, subject, message, html_message, attachments, smtphost, smtpport = None, debug = False, tls = False, security = None, user = None, word = None, dir = None):
 def Afp_sendOverSMTP(sender, recipients, subject, message, html_message, attachments, smtphost, user = None, word = None, debug = False, security = None, smtpport = None, dir = None):
     fname = None
-    #decoder = 'us-ascii'
-    decoder = 'latin-1'
     if sender and recipients and smtphost and (message or html_message):
-        port = 25
-        tls = False
-        if smtpport:
-            port = smtpport
-        elif security == "SSL":
-            port = 465
-        elif tls or security == "STARTTLS":
-            tls = True
-            port = 587
-        msg = MIMEMultipart()
-        msg['Date'] = formatdate(localtime=True)
-        msg['Subject'] = subject.decode(decoder)
-        msg['From'] = sender
-        msg['To'] = ', '.join(recipients)
-        if message:
-            part = MIMEText(message.decode(decoder), 'plain')
-            msg.attach(part)
-        if html_message:
-            part = MIMEText(html_message.decode(decoder), 'html')
-            msg.attach(part)
-        if debug: print("Afp_sendOverSMTP attachments:", attachments)
-        if attachments:
-            for attach in attachments:
-                part = MIMEBase('application', "octet-stream")
-                part.set_payload(open(attach, "rb").read())
-                email.encoders.encode_base64(part)
-                #part.add_header('Content-Disposition', 'attachment; filename=' + attach)
-                part.add_header('Content-Disposition', 'attachment; filename=' + Afp_extractBase(attach))
-                msg.attach(part)
-        if debug: print("Afp_sendOverSMTP Server:",smtphost + ":" + str(port), security)
-        if security == "SSL":
-            server = smtplib.SMTP_SSL(smtphost, port)
-            if debug: server.set_debuglevel(1)
-        else:
-            server = smtplib.SMTP(smtphost, port)
-            if debug: server.set_debuglevel(1)
-            if tls: 
-                if debug: print("Afp_sendOverSMTP: STARTTLS")
-                server.starttls()
-        if user and word:
-            if debug: print("Afp_sendOverSMTP: LOGIN:",user, word)
-            server.login(user,  base64.b64decode(word).decode("UTF-8"))
+        msg = Afp_genMailMessage(sender, recipients, subject, message, html_message, attachments, debug)
+        server = Afp_openSMTP(smtphost, user, word, debug, security, smtpport)
         if debug: print("Afp_sendOverSMTP: send mail:", msg)
         server.sendmail(sender, recipients + [sender], msg.as_string())
         server.quit()
         if dir:
-            if Afp_existsFile(dir):
-                monat = {"Jan":"01", "Feb":"02", "Mar":"03", "Apr":"04", "May":"05", "Jun":"06", "Jul":"07", "Aug":"08", "Sep":"09", "Oct":"10", "Nov":"11", "Dec":"12"}
-                split = msg['Date'].split()
-                date = split[3][2:] + monat[split[2]] + split[1] + "_" + split[4].replace(":","")
-                fname = "Mail_" + date + "_" + recipients[0]  + "__" +  subject.decode(decoder).replace(" ", "_").replace(":","")   + ".eml"
-                fpath = dir + fname
-                file = open(fpath, 'w')
-                file.write(str(msg))
-                file.close()
-            else:
-                print("WARNING: Afp_sendOverSMTP maildir '" + dir + "' does not exists, mail not stored!")
+            fname = Afp_storeMail(msg, recipients, subject, dir)
     else:
         text = "No"
         if  not sender: text += " originator address,"
@@ -799,78 +843,45 @@ def Afp_sendOverSMTP(sender, recipients, subject, message, html_message, attachm
         text += " delivered!"
         print("WARNING: Afp_sendOverSMTP Mail not send due to the lack of input!", text)
     return fname
-        
-##   class to hold cached database requests for multiple use
-class AfpArrayCache(object):
-    ## initialize AfpArrayCache class
-    # @param identifier - if given, identifier string for cached array
-    # @param array - if given, data of array to be cached
+
+##   class to hold base64 encoded mail attachments, which are shared by several mails \n
+# an attachment is read and encoded again, if size or modification time of the file changed.
+class AfpMailAttachmentCache(object):
+    ## initialize AfpMailAttachmentCache class
     # @param debug - flag for debug information
-    def  __init__(self, identifier = None, array = None, debug = False):
-        self.lifetime  = 10
-        self.step = 1
-        self.debug = debug        
-        self.identifier = None
-        self.cache = None
-        self.birth = None
-        self.death = None
-        self.last_use = None
-        self.looks = 0
-        if identifier and array:
-            self.set_array(identifier, array)
-        if self.debug: print("AfpArrayCache Konstruktor",identifier)
+    def  __init__(self, debug = False):
+        self.debug = debug
+        self.cache = {}
+        self.lock = threading.Lock()
+        if self.debug: print("AfpMailAttachmentCache Konstruktor")
     ## destructor
     def __del__(self):   
-        if self.debug: print("AfpArrayCache Destruktor" , Afp_getNow(), "Looks:", self.looks)
-    ## get length of cached array
-    def get_length(self):
-        if self.cache:
-            return len(self.cache)
-        else:
-            return None
-    ## check if cache still is valid
-    # @param identifier - identifier string for array looked for
-    def is_valid(self, identifier):
-        valid = False
-        now = Afp_getNow()
-        if self.identifier and self.identifier == identifier:
-            if now < self.death: valid = True
-            elif now < self.last_use + self.interval: valid = True
-        if valid:
-            self.last_use = now
-            self.looks += 1
-            #print "AfpArrayCache use:", now, self.identifier, "Birth:", self.birth, "Death:", self.death, "Looks:", self.looks, self.get_length()
-        else:
-            if self.debug: print("AfpArrayCache clear:", now, self.identifier, "Birth:", self.birth, "Death:", self.death, "Looks:", self.looks)
-            self.identifier = None
-            self.cache = None
-            self.looks = 0
-        return valid
-    ## fill cache
-    # @param identifier - identifier string for cached array
-    # @param array - data of array to be cached
-    def set_array(self, identifier, array):
-        self.identifier = identifier
-        self.cache = array
-        self.birth = Afp_getNow()
-        self.death = self.birth + datetime.timedelta(seconds=self.lifetime)
-        self.interval = datetime.timedelta(seconds=self.step)
-        self.last_use = self.birth
-        self.looks = 0
-        if self.debug: print("AfpArrayCache create:", self.birth, self.identifier, "Birth:", self.birth, "Death:", self.death)
-    ## retrieve array from cache if possible
-    # @param identifier - identifier for array intended to be read
-    def read_array(self, identifier):
-        if self.is_valid(identifier):
-            return self.cache
-        return None
-    ## add array to current cache
-    # @param identifier - if identifier string for given array
-    # @param array - data of array to be cached
-    def add_array(self, identifier, array):
-        if self.is_valid(identifier):
-            if self.cache:
-                self.cache += array
-        else:
-            self.set_array(identifier, array)
-        
+        if self.debug: print("AfpMailAttachmentCache Destruktor")
+    ## return the encoded content of a file
+    # @param filename - path of file to be attached
+    def get_payload(self, filename):
+        stat = os.stat(filename)
+        stamp = [stat.st_size, stat.st_mtime]
+        with self.lock:
+            entry = self.cache.get(filename)
+        if entry is None or entry[0] != stamp:
+            fin = open(filename, "rb")
+            payload = base64.encodebytes(fin.read()).decode("ascii")
+            fin.close()
+            entry = [stamp, payload]
+            with self.lock:
+                self.cache[filename] = entry
+            if self.debug: print("AfpMailAttachmentCache.get_payload: encoded", filename, stamp)
+        return entry[1]
+    ## return a new mime part holding the encoded file
+    # @param filename - path of file to be attached
+    def get_part(self, filename):
+        part = MIMEBase('application', "octet-stream")
+        part.set_payload(self.get_payload(filename))
+        part['Content-Transfer-Encoding'] = 'base64'
+        part.add_header('Content-Disposition', 'attachment; filename=' + Afp_extractBase(filename))
+        return part
+    ## clear cache
+    def clear(self):
+        with self.lock:
+            self.cache = {}
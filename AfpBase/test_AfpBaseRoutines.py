@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+## @package AfpBase.test_AfpBaseRoutines
+# test of the bulk mail delivery of AfpMailQueue against a local aiosmtpd server
+#
+#
+# This file is part of the  'Open Source' project "BusAfp" by
+#  AfpTechnologies (afptech.de)
+#
+#    BusAfp is a software to manage coach and travel acivities
+#    Copyright (C) 1989 - 2025 afptech.de (Andreas Knoblauch)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#    This program is distributed in the hope that it will be useful, but
+#    WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#    See the GNU General Public License for more details.
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import sys
+import socket
+import tempfile
+import shutil
+import unittest
+import importlib.util
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+available = bool(importlib.util.find_spec("aiosmtpd") and importlib.util.find_spec("MySQLdb") and importlib.util.find_spec("tzlocal"))
+if available:
+    from aiosmtpd.controller import Controller
+    from AfpBase.AfpBaseRoutines import AfpMailSender, AfpMailQueue
+
+## smtp handler recording the delivered mails and the sessions used, \n
+# mails with 'temporary' in their text are answered once with 451, mails with 'permanent' always with 554
+class AfpTest_MailHandler(object):
+    def __init__(self):
+        self.delivered = []
+        self.sessions = set()
+        self.attempts = 0
+        self.temporary = set()
+    async def handle_DATA(self, server, session, envelope):
+        self.attempts += 1
+        self.sessions.add(id(session))
+        if b"permanent" in envelope.content:
+            return "554 Transaction failed"
+        if b"temporary" in envelope.content and not envelope.rcpt_tos[0] in self.temporary:
+            self.temporary.add(envelope.rcpt_tos[0])
+            return "451 Temporary failure"
+        self.delivered.append(envelope.rcpt_tos[0])
+        return "250 OK"
+
+## globals holding the smtp settings for the test
+class AfpTest_Globals(object):
+    def __init__(self, values):
+        self.values = values
+    def get_value(self, name, modul = None):
+        return self.values.get(name)
+
+## test delivery of AfpMailQueue
+@unittest.skipUnless(available, "aiosmtpd, MySQLdb or tzlocal not available")
+class AfpTest_MailQueue(unittest.TestCase):
+    ## start local smtp server
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        sock = socket.socket()
+        sock.bind(("localhost", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        self.handler = AfpTest_MailHandler()
+        self.controller = Controller(self.handler, hostname = "localhost", port = port)
+        self.controller.start()
+        self.values = {"smtp-host": "localhost:" + str(port), "mail-sender": "sender@afptech.de", "tempdir": self.root + os.sep, "smtp-sessions": 2, "smtp-backoff": 0}
+    ## stop local smtp server
+    def tearDown(self):
+        self.controller.stop()
+        shutil.rmtree(self.root)
+    ## return a new queue holding the given mails
+    # @param texts - list of mail texts, one mail is added for each text
+    def queue(self, texts):
+        globals = AfpTest_Globals(self.values)
+        queue = AfpMailQueue(globals)
+        for i, text in enumerate(texts):
+            mail = AfpMailSender(globals)
+            mail.add_recipient("client" + str(i) + "@afptech.de")
+            mail.set_message("Test " + str(i), text)
+            queue.add_mail(mail)
+        return queue
+    ## mails are delivered over few reused sessions, which are renewed after the given number of mails
+    def test_session_reuse(self):
+        self.assertEqual(self.queue(["text"]*10).send(), (10, 0))
+        self.assertEqual(len(self.handler.delivered), 10)
+        self.assertLessEqual(len(self.handler.sessions), 2)
+        self.handler.sessions = set()
+        self.values["smtp-sessions"] = 1
+        self.values["smtp-session-mails"] = 3
+        self.assertEqual(self.queue(["text"]*10).send(), (10, 0))
+        self.assertEqual(len(self.handler.sessions), 4)
+    ## a temporary failure is retried
+    def test_retry_temporary(self):
+        queue = self.queue(["text", "temporary", "text"])
+        self.assertEqual(queue.send(), (3, 0))
+        self.assertEqual(self.handler.attempts, 4)
+        self.assertEqual(sorted(self.handler.delivered), ["client0@afptech.de", "client1@afptech.de", "client2@afptech.de"])
+        self.assertFalse(queue.get_failed())
+    ## a permanent failure is not retried, the mail is stored and may be requeued
+    def test_permanent_requeue(self):
+        queue = self.queue(["text", "permanent"])
+        self.assertEqual(queue.send(), (1, 1))
+        self.assertEqual(self.handler.attempts, 2)
+        failed = queue.get_failed()
+        self.assertEqual(failed[0][1], ["client1@afptech.de"])
+        self.assertEqual(failed[0][6], 1)
+        self.assertTrue(failed[0][7].startswith("(554"))
+        # failed mails are read by a new queue and delivered after requeueing
+        queue = AfpMailQueue(AfpTest_Globals(self.values))
+        self.assertEqual(len(queue.get_failed()), 1)
+        queue.get_failed()[0][3] = "text"
+        queue.requeue_failed()
+        self.assertFalse(queue.get_failed())
+        self.assertEqual(queue.get_length(), 1)
+        self.assertEqual(queue.send(), (1, 0))
+        self.assertIn("client1@afptech.de", self.handler.delivered)
+        self.assertFalse(os.path.exists(os.path.join(self.root, "AfpMailQueue.json")))
+
+if __name__ == "__main__":
+    unittest.main()
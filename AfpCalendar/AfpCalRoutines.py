@@ -155,6 +155,7 @@ class AfpCalMailConnector (AfpCalConnector):
     def  __init__(self, globals, recipient, name, version, debug = False):
         AfpCalConnector.__init__(self, globals, recipient, name, version, debug)
         self.send = True
+        self.queue = None
         self.mailsender = None
         mailsender = AfpMailSender(globals, debug)
         if mailsender.is_possible():
@@ -164,6 +165,10 @@ class AfpCalMailConnector (AfpCalConnector):
     # @param flag - flag to switch 'keep mail' on and off
     def set_send_mail(self, flag = True):
         self.send = flag
+    ## add mails to a mail queue instead of sending them directly
+    # @param queue - AfpMailQueue where mails are added, None: send directly
+    def set_mail_queue(self, queue):
+        self.queue = queue
     ## perform check on destination string, return 'None' if check is not passed,  
     # overwrittenfrom AfpCalConnector 
     def check_destination(self, destination):
@@ -200,7 +205,9 @@ class AfpCalMailConnector (AfpCalConnector):
     # overwritten from AfpCalConnector 
     def perform_action(self):
         self.prepare_action()
-        if self.send: self.mailsender.send_mail()
+        if self.send: 
+            if self.queue: self.mailsender.queue_mail(self.queue)
+            else: self.mailsender.send_mail()
     ## retrieve mailsender, used for manuel mail-sending dialog
     def get_mailsender(self):
         return self.mailsender
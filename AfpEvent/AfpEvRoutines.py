@@ -176,6 +176,7 @@ class AfpEvent(AfpSelectionList):
         self.selects["Ort"] = [ "ADRESSE","KundenNr = Route.EVENT"] 
         self.selects["ARCHIV"] = [ "ARCHIV","TabNr = EventNr.EVENT AND Tab = \"EVENT\""] 
         self.set_maxPreisNr()
+        self.client_prototype = None # empty client, used by the bulk loader to retrieve the client definitions
         self.finance = None
         if complete: self.create_selections()
         if self.debug: print("AfpEvent Konstruktor, EventNr:", self.mainvalue)
@@ -323,9 +324,7 @@ class AfpEvent(AfpSelectionList):
     # @param sortdef - if given, default value of field sorttyp to be set instead of 'None' values
     def get_clients(self, check_preis = True, is_cancel = False, sorttyp = None, sortdef = None):
         clients = []
-        rows = self.get_value_rows("ANMELD","AnmeldNr")
-        for row in rows:
-            client = self.get_client(row[0])
+        for client in self.get_client_views():
             #print "AfpEvent.get_clients:", client.get_name(), client.is_canceled(), is_cancel, client.get_value("Zustand") 
             if (not check_preis or client.get_value("Preis")) and (is_cancel is None or is_cancel == client.is_canceled()): 
                 #print "AfpEvent.get_clients:", client.get_name(), client.is_canceled(), is_cancel, client.get_value("Zustand"), client.get_value("Preis") 
@@ -333,6 +332,98 @@ class AfpEvent(AfpSelectionList):
         if sorttyp:
             clients = Afp_orderSelectionLists(clients, sorttyp, sortdef)
         return clients
+    ## bulk loader for all clients of the ANMELD selection \n
+    # the rows of the depending selections are retrieved for all clients at once in a few 'IN (...)' queries, \n
+    # returns a list of AfpEvClientView objects in the order of the ANMELD selection
+    def get_client_views(self):
+        views = []
+        anmeld = self.get_selection("ANMELD")
+        if anmeld is None or not anmeld.get_data_length(): return views
+        if self.client_prototype is None: self.client_prototype = self.get_client()
+        prototype = self.client_prototype
+        # selections which may be retrieved from the data of the event or in one step for all clients
+        prefetch = {}
+        prefetch["ADRESSE"] = [ "ADRESSE","KundenNr = KundenNr.ANMELD"] 
+        prefetch["Agent"] = [ "ADRESSE","KundenNr = AgentNr.ANMELD"] 
+        prefetch["EVENT"] = [ "EVENT","EventNr = EventNr.ANMELD"] 
+        prefetch["Veranstalter"] = [ "ADRESSE","KundenNr = AgentNr.EVENT"] 
+        prefetch["PREISE"] = [ "PREISE","EventNr = EventNr.ANMELD"] 
+        prefetch["Preis"] = [ "PREISE","EventNr = EventNr.ANMELD AND PreisNr = PreisNr.ANMELD"] 
+        prefetch["RECHNG"] = [ "RECHNG","RechNr = RechNr.ANMELD","RechNr"]
+        for selname in list(prefetch.keys()):
+            table = prefetch[selname][0]
+            if self.lowercase: table = table.lower()
+            if not selname in prototype.selects or prototype.selects[selname] != prefetch[selname] or not table in self.tables:
+                del prefetch[selname]
+        feldnamen = {"ANMELD": anmeld.get_feldnamen()}
+        indices = anmeld.get_feldindices("AnmeldNr,KundenNr,AgentNr,RechNr,PreisNr,EventNr")
+        ENrs = Afp_extractColumns(5, [Afp_extractPureValues(indices, row) for row in anmeld.get_values()])
+        # rows of the event dependent selections for each EventNr of the clients,
+        # clients of other events (p.e. collected by spezial_selection) get the rows of their own event
+        event_rows = {}
+        if "EVENT" in prefetch or "Veranstalter" in prefetch or "PREISE" in prefetch or "Preis" in prefetch:
+            own = self.get_value("EventNr")
+            feldnamen["EVENT"] = self.get_selection("EVENT").get_feldnamen()
+            feldnamen["Veranstalter"] = self.get_selection("ADRESSE").get_feldnamen()
+            feldnamen["PREISE"] = self.get_selection("PREISE").get_feldnamen()
+            feldnamen["Preis"] = feldnamen["PREISE"]
+            if own: 
+                event_rows[own] = {"EVENT": self.get_selection("EVENT").get_values(), "Veranstalter": self.get_selection("ADRESSE").get_values(), "PREISE": self.get_selection("PREISE").get_values()}
+            others = [ENr for ENr in ENrs if ENr and not ENr in event_rows]
+            if others:
+                events = Afp_selectValuesIn(self.mysql, "EVENT", "EventNr", others, self.debug)
+                agents = Afp_selectValuesIn(self.mysql, "ADRESSE", "KundenNr", Afp_extractColumns(0, events.get_values("AgentNr")), self.debug)
+                preise = Afp_selectValuesIn(self.mysql, "PREISE", "EventNr", others, self.debug)
+                event_groups = self.group_rows(events, "EventNr", ",".join(feldnamen["EVENT"]))
+                agent_groups = self.group_rows(agents, "KundenNr", ",".join(feldnamen["Veranstalter"]))
+                preis_groups = self.group_rows(preise, "EventNr", ",".join(feldnamen["PREISE"]))
+                aindex = feldnamen["EVENT"].index("AgentNr")
+                for ENr in others:
+                    rows = event_groups.get(ENr, [])
+                    agent = []
+                    if rows: agent = agent_groups.get(rows[0][aindex], [])
+                    event_rows[ENr] = {"EVENT": rows, "Veranstalter": agent, "PREISE": preis_groups.get(ENr, [])}
+            pindex = feldnamen["PREISE"].index("PreisNr")
+        keyed_rows = {}
+        if "ADRESSE" in prefetch or "Agent" in prefetch:
+            KNrs = Afp_extractColumns(0, anmeld.get_values("KundenNr")) + Afp_extractColumns(0, anmeld.get_values("AgentNr"))
+            adresse = Afp_selectValuesIn(self.mysql, "ADRESSE", "KundenNr", KNrs, self.debug)
+            feldnamen["ADRESSE"] = adresse.get_feldnamen()
+            feldnamen["Agent"] = feldnamen["ADRESSE"]
+            keyed_rows["ADRESSE"] = self.group_rows(adresse, "KundenNr")
+        if "RECHNG" in prefetch:
+            rechng = Afp_selectValuesIn(self.mysql, "RECHNG", "RechNr", Afp_extractColumns(0, anmeld.get_values("RechNr")), self.debug)
+            feldnamen["RECHNG"] = rechng.get_feldnamen()
+            keyed_rows["RECHNG"] = self.group_rows(rechng, "RechNr")
+        for row in anmeld.get_values():
+            ANr, KNr, AgNr, RNr, PNr, ENr = Afp_extractPureValues(indices, row)
+            rows = {"ANMELD": [row]}
+            event = event_rows.get(ENr, {"EVENT": [], "Veranstalter": [], "PREISE": []})
+            for selname in ["EVENT", "Veranstalter", "PREISE"]:
+                if selname in prefetch: rows[selname] = event[selname]
+            if "ADRESSE" in prefetch: rows["ADRESSE"] = keyed_rows["ADRESSE"].get(KNr, [])
+            if "Agent" in prefetch: rows["Agent"] = keyed_rows["ADRESSE"].get(AgNr, [])
+            if "RECHNG" in prefetch: rows["RECHNG"] = keyed_rows["RECHNG"].get(RNr, [])
+            if "Preis" in prefetch: 
+                rows["Preis"] = [preis for preis in event["PREISE"] if preis[pindex] == PNr]
+            views.append(AfpEvClientView(self, ANr, rows, feldnamen, prototype))
+        return views
+    ## group the rows of a TableSelection by the values of one column
+    # @param selection - AfpSQLTableSelection holding the rows
+    # @param feldname - name of column to be used as key
+    # @param felder - if given, names of columns delivered in the rows, separated by a colon (,)
+    def group_rows(self, selection, feldname, felder = None):
+        groups = {}
+        if felder:
+            index = felder.split(",").index(feldname)
+        else:
+            index = selection.get_feldindices(feldname)[0]
+        for row in selection.get_values(felder):
+            if row[index] in groups:
+                groups[row[index]].append(row)
+            else:
+                groups[row[index]] = [row]
+        return groups
         
     # may be overwritten in devired class
             
@@ -393,6 +484,76 @@ class AfpEvent(AfpSelectionList):
         self.add_client_count()
         return data
 
+## lightweight readonly view of one client, handed out by the bulk loader AfpEvent.get_client_views \n
+# values are delivered from the prefetched rows, as soon as anything else is requested 
+# (p.e. set_value or store, or values of not prefetched selections)
+# the full client object is created by the get_client method of the event and all further calls are passed to it
+class AfpEvClientView(object):
+    ## initialize AfpEvClientView class
+    # @param event - AfpEvent object this client belongs to
+    # @param AnmeldNr - identifier of this client
+    # @param rows - dictionary holding the prefetched rows for each selection name
+    # @param feldnamen - dictionary holding the column names for each prefetched selection name
+    # @param prototype - empty client object of the class delivered by the event, 
+    # its selects are used to identify selections which will not deliver data
+    def  __init__(self, event, AnmeldNr, rows, feldnamen, prototype):
+        self.event = event
+        self.anmeldnr = AnmeldNr
+        self.mainvalue = Afp_toString(AnmeldNr)
+        self.mainselection = "ANMELD"
+        self.rows = rows
+        self.feldnamen = feldnamen
+        self.client_selects = prototype.selects
+        self.cancel_field = prototype.cancel_field
+        self.cancel_value = prototype.cancel_value
+        self.client = None
+    ## return the full client object, create it if not yet done
+    def get_full_client(self):
+        if self.client is None:
+            self.client = self.event.get_client(self.anmeldnr)
+            self.rows = None
+        return self.client
+    ## all attributes not delivered by this view are retrieved from the full client object
+    # @param name - name of attribute
+    def __getattr__(self, name):
+        if name == "client": raise AttributeError(name)
+        return getattr(self.get_full_client(), name)
+    ## extract one value from the prefetched rows, 
+    # if the selection has not been prefetched, the value is retrieved from the full client object
+    # @param DateiFeld - column.selection name where data has to be retrieved from
+    def get_value(self, DateiFeld = None):
+        if self.client: return self.client.get_value(DateiFeld)
+        if DateiFeld is None:
+            return self.mainvalue
+        split = DateiFeld.split(".")
+        feld = split[0]
+        selname = self.mainselection
+        if len(split) > 1: selname = split[1]
+        if selname in self.rows:
+            rows = self.rows[selname]
+            if rows and feld in self.feldnamen[selname]:
+                return rows[0][self.feldnamen[selname].index(feld)]
+            return None
+        elif not selname in self.client_selects and not selname.upper() in self.client_selects and not selname == "_tmp":
+            return None
+        return self.get_full_client().get_value(DateiFeld)
+    ## return the name of involved persons
+    # @param rev - reverse, first name, followed by surname
+    # @param selname - name of TableSelection where to retrieve names
+    def get_name(self, rev = False, selname = "ADRESSE"):
+        if self.client or not selname in self.rows: 
+            return self.get_full_client().get_name(rev, selname)
+        if rev:
+            return self.get_string_value("Name." + selname) + " " + self.get_string_value("Vorname." + selname)
+        else:
+            return self.get_string_value("Vorname." + selname) + " " + self.get_string_value("Name." + selname)
+    ## extract values from different TableSelections, see AfpSelectionList
+    get_values = AfpSelectionList.get_values
+    ## extract one value, return it as a string, see AfpSelectionList
+    get_string_value = AfpSelectionList.get_string_value
+    ## return flag, if this client has been canceled, see AfpPaymentList
+    is_canceled = AfpPaymentList.is_canceled
+
 ## baseclass for client handling         
 class AfpEvClient(AfpPaymentList):
     ## initialize AfpEvClient class
@@ -40,7 +40,7 @@ from AfpBase.AfpBaseRoutines import *
 from AfpBase.AfpUtilities.AfpStringUtilities import Afp_getEndNumber, Afp_intString, Afp_toInternDateString
 from AfpBase.AfpUtilities.AfpBaseUtilities import Afp_isEps
 from AfpBase.AfpAusgabe import AfpAusgabe
-from AfpBase.AfpBaseAdRoutines import AfpAdresse, AfpAdresse_getKNrFromSingleName, AfpAdresse_getKNrFromAlias
+from AfpBase.AfpBaseAdRoutines import AfpAdresse, AfpAdresse_getKNrFromSingleName, AfpAdresse_getKNrFromAlias, AfpAdresseNameIndex
  
 ## interprete tags of a SEPA direct debit file and create the appropriate data
 # @param globals - global values include mysql connection
@@ -484,6 +484,7 @@ class AfpSEPAct(AfpSelectionList):
         out = AfpAusgabe(self.debug, datalist, serial_tags)
         out.set_variables(vars)
         out.set_datas_variables(dvars)
+        out.open_resultfile(target)
         out.inflate(source)
         out.write_resultfile(target)
         # write receipt file
@@ -495,6 +496,7 @@ class AfpSEPAct(AfpSelectionList):
         rcpt = AfpAusgabe(self.debug, datalist, serial_tags)
         rcpt.set_variables(vars)
         rcpt.set_datas_variables(dvars)
+        rcpt.open_resultfile(target, self.sourcedir + "empty.odt")
         rcpt.inflate(source)
         rcpt.write_resultfile(target, self.sourcedir + "empty.odt")
         return vars["MessageId"]
@@ -665,6 +667,30 @@ class AfpSEPAdd(AfpSelectionList):
             elif row[0] > datum: datum = row[0]
         self.lastrun = datum 
         
+    ## retrieve the values needed to evaluate the direct debit amounts for all clients in one step \n
+    # returns a dictionary: client id -> [value of clientid, "Zahlung", total, regular], 
+    # None if the values cannot be read directly from the main table of the clients
+    # @param clientid - name of the column holding the identifier of the master
+    # @param ids - ids of the clients to be retrieved
+    def get_client_values(self, clientid, ids):
+        felder = [clientid, "Zahlung", self.datafields["total"], self.datafields["regular"]]
+        for feld in felder:
+            if "." in feld: return None
+        client = self.data.get_client()
+        table = client.get_mainselection()
+        index = client.get_mainindex()
+        if not table or not index: return None
+        selection = Afp_selectValuesIn(self.mysql, table, index, ids, self.debug)
+        feldnamen = selection.get_feldnamen()
+        for feld in [index] + felder:
+            if not feld in feldnamen: return None
+        indices = [feldnamen.index(feld) for feld in felder]
+        ind = feldnamen.index(index)
+        values = {}
+        for row in selection.get_values():
+            values[row[ind]] = [row[i] for i in indices]
+        if self.debug: print("AfpSEPAdd.get_client_values:", len(ids), len(values))
+        return values
     ## get SEPA Direct Debit mandates or files from designated table
     def gen_mandat_data(self):
         where = self.data.selects[self.ctable][1]
@@ -685,26 +711,34 @@ class AfpSEPAdd(AfpSelectionList):
         self.client_iban = {}
         self.sum = 0
         self.newsum = 0
+        # values needed for the evaluation are retrieved for all clients at once, 
+        # complete client objects are only created for clients with a direct debit amount
+        values = self.get_client_values(clientid, Afp_extractColumns(2, rows))
         for row in rows:
-            client = self.data.get_client(row[2])
-            payed = client.get_value("Zahlung") 
+            client = None
+            if values is None:
+                client = self.data.get_client(row[2])
+                client_value, zahlung, preis, value = [client.get_value(feld) for feld in [clientid, "Zahlung", self.datafields["total"], self.datafields["regular"]]]
+            elif row[2] in values:
+                client_value, zahlung, preis, value = values[row[2]]
+            else:
+                continue
+            payed = zahlung 
             if payed is None: payed = 0.0
-            #print ("AfpSEPAdd.gen_mandat_data client:", client.get_name(), client.get_value())
-            #print ("AfpSEPAdd.gen_mandat_data client:", client.get_value(clientid), IdNr, client.get_value(clientid) == IdNr, payed, client.get_value(self.datafields["total"]), payed < client.get_value(self.datafields["total"]) )
-            if client.get_value(clientid) == IdNr and payed < client.get_value(self.datafields["total"]):
+            #print ("AfpSEPAdd.gen_mandat_data client:", row[2], client_value, IdNr, client_value == IdNr, payed, preis, payed < preis)
+            if client_value == IdNr and payed < preis:
                 self.client_bic[row[0]] = row[3]
                 self.client_iban[row[0]] = row[4]
-                #print "AfpSEPAdd.gen_mandat_data amount:", row[2], row[3], row[4], client.get_value(self.datafields["regular"]), self.dd_interval, self.datafields["regular"]
-                value = client.get_value(self.datafields["regular"])
+                #print "AfpSEPAdd.gen_mandat_data amount:", row[2], row[3], row[4], value, self.dd_interval, self.datafields["regular"]
                 if not value: 
                     value = 0.0
+                    if client is None: client = self.data.get_client(row[2])
                     print("AfpSEPAdd.gen_mandat_data ProvPreis not set for:", row[2], client.get_name())
                 amount = value/self.dd_interval
-                zahlung = client.get_value("Zahlung")
-                preis = client.get_value(self.datafields["total"])
-                #print ("AfpSEPAdd.gen_mandat_data amount:", preis, zahlung, self.dd_interval, self.dd_actuel, amount, preis - zahlung - (self.dd_interval - self.dd_actuel)*amount, client.get_name())
+                #print ("AfpSEPAdd.gen_mandat_data amount:", preis, zahlung, self.dd_interval, self.dd_actuel, amount, preis - zahlung - (self.dd_interval - self.dd_actuel)*amount)
                 amount = preis - zahlung - (self.dd_interval - self.dd_actuel)*amount
                 if amount > 0.0:
+                    if client is None: client = self.data.get_client(row[2])
                     first = not (self.lastrun and row[1] <=  self.lastrun)
                     client.set_value(self.datafields["actuel"], amount)
                     if first:
@@ -798,6 +832,7 @@ class AfpSEPAdd(AfpSelectionList):
         if self.debug: print("AfpSEPAdd.gen_SEPA_xml:", self.serial, vars, source, target)
         out = AfpAusgabe(self.debug, datalist, serial_tags)
         out.set_variables(vars)
+        out.open_resultfile(target)
         out.inflate(source)
         out.write_resultfile(target)
         # write receipt file
@@ -809,6 +844,7 @@ class AfpSEPAdd(AfpSelectionList):
         if self.debug: print("AfpSEPAdd.gen_SEPA_xml Receipt:", self.serial, vars["Typ"], source, target)
         rcpt = AfpAusgabe(self.debug, datalist, serial_tags)
         rcpt.set_variables(vars)
+        rcpt.open_resultfile(target, self.sourcedir + "empty.odt")
         rcpt.inflate(source)
         rcpt.write_resultfile(target, self.sourcedir + "empty.odt")
         return vars["MessageId"]
@@ -958,17 +994,24 @@ class AfpSEPAdd(AfpSelectionList):
             pathes += self.targetdir + self.clients_file + ".xml"
         return pathes
             
-    ## store all data
+    ## store all data, the data of all clients is written in one database transaction
     def store(self):
-        if self.has_changed():
-            super(AfpSEPAdd, self).store()
-        self.data.store()
-        if self.newclients:
-            for client in self.newclients:
-                client.store()
-        if self.clients:
-            for client in self.clients:
-                client.store()
+        mysql = self.get_mysql()
+        mysql.begin_transaction()
+        ok = False
+        try:
+            if self.has_changed():
+                super(AfpSEPAdd, self).store()
+            self.data.store()
+            if self.newclients:
+                for client in self.newclients:
+                    client.store()
+            if self.clients:
+                for client in self.clients:
+                    client.store()
+            ok = True
+        finally:
+            mysql.end_transaction(ok)
     
 ## return financial transaction class, if possible
 def AfpFi_getFinanceTransactions(globals):
@@ -977,6 +1020,109 @@ def AfpFi_getFinanceTransactions(globals):
         return AfpFinanceTransactions(globals)
     else:
         return None
+## index of the account sums of the bookings held in a TableSelection \n
+# the debit (Konto) and credit (Gegenkonto) totals of all accounts are collected in one pass over the booking rows, 
+# afterwards the index is updated incrementally by the manipulations of the watched TableSelection. \n
+# If the data of the selection has been replaced or extended without manipulation logging, the index is rebuilt.
+class AfpFinanceLedger(object):
+    ## initialize class
+    # @param selection - AfpSQLTableSelection holding the bookings
+    # @param upto - if given, date up to which bookings are respected
+    # @param watch - flag if index should be updated by manipulations of the selection, default: True
+    def  __init__(self, selection, upto = None, watch = True):
+        self.selection = selection
+        self.upto = upto
+        self.indices = selection.get_feldindices("Datum,Konto,Gegenkonto,Betrag")
+        self.data = None
+        self.count = 0
+        self.exact = False
+        self.debit = {}
+        self.credit = {}
+        self.same = {}
+        self.first = {}
+        self.last = {}
+        if watch: selection.add_watcher(self)
+        self.build()
+    ## collect the sums of all booking rows
+    def build(self):
+        self.data = self.selection.data
+        self.count = 0
+        self.debit = {}
+        self.credit = {}
+        self.same = {}
+        self.first = {}
+        self.last = {}
+        if self.data:
+            for row in self.data:
+                self.row_added(row)
+        self.exact = True
+    ## rebuild index, if data of selection has been changed without notification
+    def check(self):
+        if not self.data is self.selection.data or self.count != len(self.data or []):
+            self.build()
+    ## extract values needed for accounting from booking row, 
+    # returns None if the row has no impact on the sums
+    # @param row - booking row
+    def extract(self, row):
+        if row is None: return None
+        datum, konto, gkonto, betrag = Afp_extractPureValues(self.indices, row)
+        betrag = Afp_fromString(betrag)
+        if not betrag or (self.upto and datum and datum > self.upto): return None
+        return datum, konto, gkonto, betrag
+    ## add booking row to sums, called by the watched TableSelection
+    # @param row - booking row which has been added
+    def row_added(self, row):
+        self.count += 1
+        values = self.extract(row)
+        if values is None: return
+        datum, konto, gkonto, betrag = values
+        for ktnr in [konto, gkonto]:
+            if not ktnr in self.first:
+                self.first[ktnr] = datum
+                self.debit[ktnr] = 0.0
+                self.credit[ktnr] = 0.0
+        self.debit[konto] += betrag
+        self.credit[gkonto] += betrag
+        if konto == gkonto:
+            self.same[konto] = self.same.get(konto, 0.0) + betrag
+        if datum and (self.last.get(konto) is None or datum > self.last[konto]):
+            self.last[konto] = datum
+    ## remove booking row from sums, called by the watched TableSelection
+    # @param row - booking row which has been removed
+    def row_removed(self, row):
+        self.count -= 1
+        values = self.extract(row)
+        if values is None: return
+        datum, konto, gkonto, betrag = values
+        if konto in self.debit: self.debit[konto] -= betrag
+        if gkonto in self.credit: self.credit[gkonto] -= betrag
+        if konto == gkonto and konto in self.same: 
+            self.same[konto] -= betrag
+        # dates and order of accounts can not be reconstructed incrementally
+        self.exact = False
+    ## return all accounts touched by bookings, in order of their first appearance
+    def get_accounts(self):
+        self.check()
+        if not self.exact: self.build()
+        return list(self.first.keys())
+    ## return date of first booking and date of last booking as debit account
+    # @param ktnr - account number
+    def get_dates(self, ktnr):
+        self.check()
+        if not self.exact: self.build()
+        return self.first.get(ktnr), self.last.get(ktnr)
+    ## return account sum as used for account statements, 
+    # bookings with identical debit and credit account are only counted as debit
+    # @param ktnr - account number
+    def get_sum(self, ktnr):
+        self.check()
+        return self.credit.get(ktnr, 0.0) - self.debit.get(ktnr, 0.0) - self.same.get(ktnr, 0.0)
+    ## return account balance, all bookings are counted on both sides
+    # @param ktnr - account number
+    def get_balance(self, ktnr):
+        self.check()
+        return self.credit.get(ktnr, 0.0) - self.debit.get(ktnr, 0.0)
+
 ## class to sample all financial transaction entries needed for one action. \n
 # central class for financial transactions of all kinds. \n
 # this centralisation is considered to be more usefull then following the object oriented approach.
@@ -1504,6 +1650,8 @@ class AfpFinance(AfpFinanceTransactions):
         self.import_index = None
         self.beleg_prefix = None
         self.addressdata = []
+        self.ledgers = None
+        self.konto_typen = None
         period = AfpFinance_setPeriod(period_input, globals, None, mandant)
         if parlist:
             if "BuchungsNr" in parlist:
@@ -1738,6 +1886,12 @@ class AfpFinance(AfpFinanceTransactions):
         imp_data = imp.read_from_file(data)[0] 
         sel = imp_data.get_selection()
         #print ("AfpFinance.import_from_file data:", sel.data)
+        # names are resolved in batched queries before the rows are completed
+        names = AfpAdresseNameIndex(self.get_mysql(), self.debug)
+        if mark and "Name" in mark:
+            wanted = [row[0] for row in sel.get_values(mark["Name"])]
+            names.resolve_names(wanted)
+            names.resolve_aliases([name for name in wanted if not names.get_KNr(name)])
         for i in range(sel.get_data_length()-1, -1, -1):
             date = sel.get_values("Datum", i)[0][0]
             if (fromdat and date <= fromdat) or (todat and date > todat):
@@ -1748,9 +1902,9 @@ class AfpFinance(AfpFinanceTransactions):
                 if mark and "Name" in mark:
                     name = sel.get_values(mark["Name"], i)[0][0]
                     #print ("AfpFinance.import_from_file complete:", i, sel.data[i][5], sel.data[i][7], sel.data[i][9], name) 
-                    KNr = AfpAdresse_getKNrFromSingleName(self.get_mysql(), name)
+                    KNr = names.get_KNr(name)
                     if not KNr:
-                        KNr = AfpAdresse_getKNrFromAlias(self.get_mysql(), name)
+                        KNr = names.get_KNr_from_alias(name)
                     if KNr: 
                         change["KundenNr"] = KNr
                     #print ("AfpFinance.import_from_file complete:", i, name, change) 
@@ -2051,13 +2205,22 @@ class AfpFinance(AfpFinanceTransactions):
     ## get typ of bank account from TableSelection 'KTNR'
     # @param ktnr - accountnumber to be checked
     def get_konto_typ(self, ktnr):
-        typ = None
-        rows = self.get_value_rows("KTNR","KtNr,Typ")
-        for row in rows:
-            if row[0] == ktnr:
-                typ = row[1]
-                break
-        return typ
+        selection = self.get_selection("KTNR", False)
+        if selection is None: return None
+        if self.konto_typen is None or not self.konto_typen[0] is selection.data:
+            typen = {}
+            for row in selection.get_values("KtNr,Typ"):
+                if not row[0] in typen: typen[row[0]] = row[1]
+            self.konto_typen = [selection.data, typen]
+        return self.konto_typen[1].get(ktnr)
+    ## return account sum index of the bookings in the indicated selection
+    # @param selname - name of selection holding the bookings
+    def get_ledger(self, selname = "BUCHUNG"):
+        if self.ledgers is None: self.ledgers = {}
+        selection = self.get_selection(selname)
+        if not selname in self.ledgers or not self.ledgers[selname].selection is selection:
+            self.ledgers[selname] = AfpFinanceLedger(selection)
+        return self.ledgers[selname]
     ## generate bank-account sum
     def gen_bank_sum(self):
         start = 0.0
@@ -2074,24 +2237,10 @@ class AfpFinance(AfpFinanceTransactions):
     ## generate account sum
     # @param konto - accountnumber to be summerized
     def gen_sum(self, konto):
-        #print "AfpFinance.gen_sum:", self.view()
-        sum = 0.0
-        rows = self.get_value_rows("BUCHUNG","Konto,Gegenkonto,Betrag")   
-        for row in rows:
-            betrag = Afp_fromString(row[2])
-            if betrag and (row[0] == konto or row[1] == konto):
-                if row[0] == konto: sum -= betrag
-                else: sum += betrag
-                #print "AfpFinance.gen_sum added:", betrag, sum
+        sum = self.get_ledger("BUCHUNG").get_sum(konto)
         #print "AfpFinance.gen_sum Buchung:", konto, sum, self.mainindex, self.mainvalue, Afp_fromString(self.mainvalue) == konto
         if not (self.mainindex == "Period" or self.mainindex == "Reference" or (self.mainindex == "Konto" and Afp_fromString(self.mainvalue) == konto)):
-            rows = self.get_value_rows("Journal","Konto,Gegenkonto,Betrag")   
-            for row in rows:
-                betrag = Afp_fromString(row[2])
-                if betrag and (row[0] == konto or row[1] == konto):
-                    if row[0] == konto: sum -= betrag
-                    else: sum += betrag
-                    #print "AfpFinance.gen_sum Journal added:", betrag, sum
+            sum += self.get_ledger("Journal").get_sum(konto)
             #print "AfpFinance.gen_sum Journal:", sum
         if self.is_cash(konto) and sum:
             sum*= -1 
@@ -2110,28 +2259,32 @@ class AfpFinance(AfpFinanceTransactions):
         #self.view()
         if saldi:
             konten = []
+            found = set()
             rows = self.get_value_rows("BUCHUNG", "Konto,Gegenkonto")
             if rows:
                 for row in rows:
-                    if not row[0]  in konten:
-                        konten.append(row[0])
-                    if not row[1]  in konten:
-                        konten.append(row[1])
+                    for ktnr in row:
+                        if not ktnr in found:
+                            found.add(ktnr)
+                            konten.append(ktnr)
+            indices = {}
+            for i in range(len(saldi)-1, -1, -1):
+                indices[saldi[i]] = i
         print ("AfpFinance.update_sums Konten:", konten)
         if konten:
             for ktnr in konten:
-                if ktnr in saldi:
+                if ktnr in indices:
                     sum = self.gen_sum(ktnr)
                     if sum is None: sum = 0.0
-                    ind = saldi.index(ktnr)
+                    ind = indices[ktnr]
                     start = self.get_value_rows("Salden", "StartSaldo", ind)[0][0]
                     if not start: start= 0.0
                     self.set_data_values({"EndSaldo": start + sum}, "Salden", ind)
                     print ("AfpFinance.update_sums set data:", ktnr, sum, start + sum)
             salden = self.gen_balance_salden()
             for sald in salden:
-                if sald in saldi:
-                    self.set_data_values({"EndSaldo": salden[sald]}, "Salden", saldi.index(sald))
+                if sald in indices:
+                    self.set_data_values({"EndSaldo": salden[sald]}, "Salden", indices[sald])
                     print ("AfpFinance.update_sums set balance:", sald, salden[sald ])
     ## generate balance account sums
     # @param only_typ - if given, only the sum of this typ of accounts is created
@@ -2199,6 +2352,8 @@ class AfpFinance(AfpFinanceTransactions):
             if object.get_value_length("BUCHUNG"):
                 odata = object.get_selection("BUCHUNG").data
                 sdata = self.get_selection("BUCHUNG").data
+                # data is changed directly, all rows have to be written on storage
+                self.get_selection("BUCHUNG").mani_invalidate()
                 if avoid_double:
                     pop = []
                     #print ("AfpFinance.booking_absorber:", sdata, "\n",  odata)
@@ -2231,6 +2386,7 @@ class AfpFinance(AfpFinanceTransactions):
                 add += 1
         if add:
             data = self.get_selection("BUCHUNG").data
+            self.get_selection("BUCHUNG").mani_invalidate()
             dlen = len(data)
             data += [None]*add 
             index = len(split_values)-1
@@ -2270,6 +2426,7 @@ class AfpFinanceBalances(AfpSelectionList):
         self.typen = None
         self.namen = None
         self.typs = None
+        self.ledger = None
         self.mainselection = "BUCHUNG"
         self.mainindex = "Period"
         self.mainvalue = AfpFinance_setPeriod(period, globals, None, self.mandant)
@@ -2379,34 +2536,31 @@ class AfpFinanceBalances(AfpSelectionList):
             #print ("AfpFinanceBalances.store_salden modified:", salden.data)
             salden.store()
         
+    ## return account sum index of the bookings of the period
+    # @param upto - if given, date to which the bookings should be respected
+    def get_ledger(self, upto = None):
+        selection = self.get_selection("BUCHUNG")
+        if upto:
+            return AfpFinanceLedger(selection, upto, False)
+        if self.ledger is None or not self.ledger.selection is selection:
+            self.ledger = AfpFinanceLedger(selection)
+        return self.ledger
     ## generate sums of all accounts which have been touched by the bookings of the period
     # @param upto - if given, date to which the bookings should be respected
     def gen_balances(self, upto=None):
-        rows = self.get_value_rows("BUCHUNG","Datum,Konto,Gegenkonto,Betrag")   
-        for row in rows:
-            if not upto or row[0] <= upto:
-                betrag = Afp_fromString(row[3])
-                if betrag:
-                    if self.is_cash(row[1]):
-                        bet1 = -betrag
-                    else:
-                        bet1 = betrag
-                    if self.is_cash(row[2]):
-                        bet2 = -betrag
-                    else:
-                        bet2 = betrag
-                    if row[1] in self.salden:
-                        self.salden[row[1]][4] -=bet1
-                        if row[0] > self.salden[row[1]][2]:
-                            self.salden[row[1]][2] = row[0]
-                    else:
-                        self.salden[row[1]] = ["SALDO", row[0], row[0], 0.0, -bet1, self.period, row[1]]
-                    if row[2] in self.salden:
-                        self.salden[row[2]][4] +=bet2
-                        if row[0] > self.salden[row[1]][2]:
-                            self.salden[row[1]][2] = row[0] 
-                    else:
-                        self.salden[row[2]] = ["SALDO", row[0], row[0], 0.0, bet2, self.period, row[2]]                        
+        ledger = self.get_ledger(upto)
+        for ktnr in ledger.get_accounts():
+            first, last = ledger.get_dates(ktnr)
+            betrag = ledger.get_balance(ktnr)
+            if self.is_cash(ktnr): betrag = -betrag
+            if ktnr in self.salden:
+                self.salden[ktnr][4] += betrag
+                if last and last > self.salden[ktnr][2]:
+                    self.salden[ktnr][2] = last
+            else:
+                end = first
+                if last and last > first: end = last
+                self.salden[ktnr] = ["SALDO", first, end, 0.0, betrag, self.period, ktnr]
     ## generate sums of all accounts which have been touched by the bookings of the period
     def gen_sums(self):
         rows = self.get_value_rows("Saldo","KtNr,Bezeichnung,Typ")
@@ -2463,6 +2617,8 @@ class AfpFinanceExchange(AfpFinance):
         self.imp_obj = None # AfpFinance object to be imported
         self.imp_refs = None # references of imported accounts
         self.imp_checks = None # list of indices, which transactions may be already in the journal
+        self.imp_unmatched = None # list of indices of checked transactions, which have not been found in the journal
+        self.imp_ambiguous = None # list of indices of checked transactions, which match more than one booking in the journal
         if self.debug: print("AfpFinanceExport Konstruktor")
     ## destructor
     def __del__(self):    
@@ -2484,9 +2640,8 @@ class AfpFinanceExchange(AfpFinance):
         today = self.get_globals().today()
         data = self.get_selection("BUCHUNG")
         lgh = data.get_data_length()
-        inds = data.get_feldindices("Expo")
         for i in range(lgh):
-            data.data[i][inds[0]] = today
+            data.set_value("Expo", today, i)
     ## perform export
     # @param fname - name of  file for export
     # @param date - if given, all transactions up to the given date exported
@@ -2542,22 +2697,77 @@ class AfpFinanceExchange(AfpFinance):
     # @param row - list holding [Datum,Konto,Gegenkonto,Betrag] of the transaction
     def booking_found(self, row):
         sel = "SELECT BuchungsNr,VorgangsNr FROM BUCHUNG WHERE Datum = '" + Afp_toInternDateString(row[0]) + "' AND Konto = " + Afp_toString(row[1]) + " AND Gegenkonto = " + Afp_toString(row[2])  + " AND Betrag = " + Afp_toString(row[3])
-        res = self.get_mysql().execute(sel)[0]
+        res = self.get_mysql().execute(sel)
         if self.debug:  print ("AfpFinance.booking_found:", sel, res)
         #print ("AfpFinance.booking_found:", sel, res)
-        return res[0], res[1]
+        if not res: return None, None
+        return res[0][0], res[0][1]
+    ## return the key a transaction is matched with
+    # @param row - list holding [Datum,Konto,Gegenkonto,Betrag] of the transaction
+    def booking_key(self, row):
+        betrag = row[3]
+        if not betrag is None: betrag = round(float(betrag), 2)
+        return (Afp_toInternDateString(row[0]), Afp_toString(row[1]), Afp_toString(row[2]), betrag)
+    ## check which transactions are already recorded in database, \n
+    # the bookings of the date range of the transactions are loaded in one query and matched in memory by date, accounts and amount,
+    # each booking is only assigned to one transaction. \n
+    # returns the list of [BuchungsNr, VorgangsNr] (None, if not found) for each transaction, 
+    # the list of indices of unmatched and of ambiguous transactions
+    # @param rows - list of [Datum,Konto,Gegenkonto,Betrag] of the transactions
+    def bookings_found(self, rows):
+        found = [None]*len(rows)
+        unmatched = []
+        ambiguous = []
+        if not rows: return found, unmatched, ambiguous
+        dates = [row[0] for row in rows]
+        sel = "Datum >= '" + Afp_toInternDateString(min(dates)) + "' AND Datum <= '" + Afp_toInternDateString(max(dates)) + "'"
+        bookings = {}
+        for bnr, vnr, datum, konto, gegenkonto, betrag in sorted(self.get_mysql().select("BuchungsNr,VorgangsNr,Datum,Konto,Gegenkonto,Betrag", sel, "BUCHUNG")):
+            key = self.booking_key([datum, konto, gegenkonto, betrag])
+            if key in bookings: bookings[key].append([bnr, vnr])
+            else: bookings[key] = [[bnr, vnr]]
+        counts = {}
+        for row in rows:
+            key = self.booking_key(row)
+            counts[key] = counts.get(key, 0) + 1
+        for i in range(len(rows)):
+            key = self.booking_key(rows[i])
+            candidates = bookings.get(key)
+            if candidates and (len(candidates) > 1 or counts[key] > 1): ambiguous.append(i)
+            if candidates:
+                found[i] = candidates.pop(0)
+            else:
+                unmatched.append(i)
+        if self.debug: print ("AfpFinanceExchange.bookings_found:", sel, len(rows), "unmatched:", unmatched, "ambiguous:", ambiguous)
+        return found, unmatched, ambiguous
     ## absorb finance bookings from a AfpFinance object
     # overwritten from AfpFinance
     # @param object - AfpFinance object where to absorb data
     def booking_absorber(self, object):
+        self.imp_unmatched = []
+        self.imp_ambiguous = []
         if self.imp_checks:
+            checks = []
             for check in self.imp_checks:
-                bnr, vnr = self.booking_found(object.get_value_rows("BUCHUNG", "Datum,Konto,Gegenkonto,Betrag", check)[0])
-                if bnr:
-                    change = {"BuchungsNr": bnr}
-                    if vnr: change["VorgangsNr"] = vnr
+                if not check in checks: checks.append(check)
+            values = object.get_selection("BUCHUNG").get_values("Datum,Konto,Gegenkonto,Betrag")
+            found, unmatched, ambiguous = self.bookings_found([values[check] for check in checks])
+            for check, res in zip(checks, found):
+                if res and res[0]:
+                    change = {"BuchungsNr": res[0]}
+                    if res[1]: change["VorgangsNr"] = res[1]
                     object.set_data_values(change, "BUCHUNG", check)
+            self.imp_unmatched = [checks[i] for i in unmatched]
+            self.imp_ambiguous = [checks[i] for i in ambiguous]
+            if self.imp_unmatched:
+                print("WARNING: AfpFinanceExchange.booking_absorber:", len(self.imp_unmatched), "transactions not found in journal, they are imported as new bookings:", self.imp_unmatched)
+            if self.imp_ambiguous:
+                print("WARNING: AfpFinanceExchange.booking_absorber:", len(self.imp_ambiguous), "transactions match more than one booking in journal, assigned in order of the booking numbers:", self.imp_ambiguous)
         AfpFinance.booking_absorber(self, object)
+    ## return the indices of the transactions of the last import, which have not been found, 
+    # or which have been ambiguous, when checked against the journal
+    def get_import_report(self):
+        return self.imp_unmatched, self.imp_ambiguous
     ## prepare import
     # @param fname - name of  file to be imported
     # @param acc - if given, number of actuel import account
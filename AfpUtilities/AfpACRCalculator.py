@@ -9,6 +9,7 @@
 #       AfpACRPerson - class to handle all person specific data
 #       AfpACRPeopleManager - class to handle all involved persons
 #       AfpACRBooster - class to handle booster exceptions
+#       AfpACRPeopleTable - class to hold the data of all involved persons in arrays (needs numpy)
 #
 #
 #   History: \n
@@ -41,6 +42,10 @@
 
 import sys
 import os
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 import AfpBase
 from AfpBase import *
@@ -59,8 +64,11 @@ from AfpBase.AfpUtilities.AfpStringUtilities import Afp_fromString, Afp_toString
 # @param check - flag if matrices check should be performed and displayed (to confirm calculation-path)
 # @param display - different keywords to allow output of different aspects of the data and the calculation
 # @param debug - flag for debug-modus
-def AfpACRCalculator_main(conffile, datafile, rangefile, budget_str, ref_str, focal_str, part, check, display, debug):
-    if debug: print("AfpACRCalculator.main called:", conffile, datafile, rangefile, budget_str, ref_str, focal_str, part, check, display)
+# @param solve - flag if focal value exhausting the budget (including rounding) should be searched
+# @param sweep_str - if given, string holding budget percentages for a scenario sweep, p.e. "2.5:3.5:0.25" or "2.5,3.0,3.5"
+# @param boost_str - if given, string holding booster values for a scenario sweep, p.e. "PROMO=1.0,2.0;KILL=0.5"
+def AfpACRCalculator_main(conffile, datafile, rangefile, budget_str, ref_str, focal_str, part, check, display, debug, solve = False, sweep_str = None, boost_str = None):
+    if debug: print("AfpACRCalculator.main called:", conffile, datafile, rangefile, budget_str, ref_str, focal_str, part, check, display, solve, sweep_str, boost_str)
     # define data for input
     if conffile: 
         config = Afp_ReadConfig(conffile)
@@ -117,7 +125,18 @@ def AfpACRCalculator_main(conffile, datafile, rangefile, budget_str, ref_str, fo
         Calculator.set_calcflags(config["CALC_USE_FOCAL_FOR_RANGE"], config["CALC_SKIP_SPREAD_ZEROS"])
         if "MATRIX_ACR" in config:
             Calculator.set_acr_matrix(config["MATRIX_ACR"])
-        if ref_str:
+        if sweep_str or boost_str:
+            percents = None
+            if sweep_str: percents = Afp_getSweepValues(sweep_str)
+            settings = None
+            if boost_str: settings = Afp_getBoosterSettings(boost_str)
+            rows = Calculator.sweep(percents, settings, fte_distribution)
+            Calculator.view_sweep(rows)
+            display = None
+        elif solve:
+            focal = Calculator.solve_focal_value(None, fte_distribution)
+            print("AfpACRCalculator_main solved:", "Focal:", focal, "Reference:", Calculator.get_ref_value(), "Budget, Distributed, Iterations:", Calculator.get_solver_info())
+        elif ref_str:
             ref = Afp_fromString(ref_str)
             Calculator.simulate(ref)        
         elif focal_str:
@@ -129,7 +148,7 @@ def AfpACRCalculator_main(conffile, datafile, rangefile, budget_str, ref_str, fo
             Calculator.simulate()
             if check: Calculator.check_increase()
         if debug: print("AfpACRCalculator_main show:", display)
-        Calculator.view(display)
+        if display or not (sweep_str or boost_str): Calculator.view(display)
     else:
         print("AfpACRCalculator not sufficent data available!")
 ## read configuration data from file 
@@ -271,6 +290,39 @@ def Afp_holdsValues(values):
             break
     return check
     
+## get list of values for a scenario sweep
+# @param string - given string, either "start:stop:step" or comma separated values
+def Afp_getSweepValues(string):
+    values = []
+    if ":" in string:
+        split = string.split(":")
+        start = float(split[0])
+        stop = float(split[1])
+        step = 0.5
+        if len(split) > 2: step = float(split[2])
+        cnt = int((stop - start)/step + 1.000001)
+        for i in range(cnt):
+            values.append(round(start + i*step, 6))
+    else:
+        for val in string.split(","):
+            if val.strip(): values.append(float(val))
+    return values
+## get list of booster settings for a scenario sweep, \n
+# each setting is a dictionary of booster values, all combinations of the given values are delivered
+# @param string - given string, p.e. "PROMO=1.0,2.0;KILL=0.5"
+def Afp_getBoosterSettings(string):
+    settings = [{}]
+    for part in string.split(";"):
+        if not "=" in part: continue
+        name, vals = part.split("=", 1)
+        new = []
+        for setting in settings:
+            for val in Afp_getSweepValues(vals):
+                sett = setting.copy()
+                sett[name.strip()] = val
+                new.append(sett)
+        settings = new
+    return settings
 ## get difference string from string with two given values
 # @param string - given string
 def Afp_getDiff(string):
@@ -335,6 +387,8 @@ class AfpACRCalculator(object):
         self.matrix = None
         ## result over all increase
         self.increase = None
+        ## result of last solver run: budget, distributed sum, iterations
+        self.solver_info = None
         self.set_budget()
     ## set spreadmap
     # @param spread - map for relativ spread of dstribution matrix
@@ -473,7 +527,7 @@ class AfpACRCalculator(object):
         if boost in self.boosters:
             booster = self.boosters[boost]
             if booster.get_matrix():
-                matrix = self.people.get_booster_matrix(fte)
+                matrix = self.people.get_booster_matrix(boost, fte)
                 n = self.people.get_matrix_length(0)
                 m = self.people.get_matrix_length(1)
                 for i in range(m):
@@ -606,6 +660,137 @@ class AfpACRCalculator(object):
                 self.generate_booster_matrices()
         # set ote proposals for all
         self.people.set_ote_proposals(self.focal_matrix, self.booster_matrices)    
+    ## get increase sum distributed in the last simulation, including rounding
+    # @param fte - flag if full time equivalent data should be used
+    def get_distributed(self, fte = True):
+        return self.people.get_increase_sum(fte)
+    ## find focal value, where the distributed increase (including rounding) exhausts the budget. \n
+    # The focal value from calculate_focal_matrix is used as start value, a bracket around the solution is 
+    # searched and narrowed by bisection, as rounding makes the distributed sum a step function. \n
+    # Returns the focal value with a distributed sum within tolerance of the budget, 
+    # or the largest focal value found not exceeding the budget; the simulation is left at this value. 
+    # @param budget - if given, budget to be exhausted, default: self.budget
+    # @param fte - flag if full time equivalent data should be used
+    # @param tolerance - accepted deviation from budget
+    # @param maxiter - maximal number of simulations
+    def solve_focal_value(self, budget = None, fte = True, tolerance = 1.0, maxiter = 80):
+        if budget is None: budget = self.budget
+        if not self.spreadmap or not budget: return None
+        self.calculate_focal_matrix(fte)
+        start = self.focal_value
+        if not start or start <= 0.0: start = 1.0
+        iter = 0
+        lo = hi = None
+        lo_diff = hi_diff = None
+        focal = start
+        step = max(0.05*start, 0.01)
+        while iter < maxiter:
+            self.simulate(None, focal)
+            iter += 1
+            diff = self.get_distributed(fte) - budget
+            if self.debug: print("AfpACRCalculator.solve_focal_value bracket:", iter, focal, diff)
+            if abs(diff) <= tolerance:
+                lo = focal
+                lo_diff = diff
+                hi = None
+                break
+            if diff < 0.0:
+                lo, lo_diff = focal, diff
+                if not hi is None: break
+                focal += step
+            else:
+                hi, hi_diff = focal, diff
+                if not lo is None: break
+                if focal - step <= 0.0:
+                    step = focal/2.0
+                focal -= step
+            step *= 2
+        # narrow bracket by bisection
+        while not (lo is None or hi is None) and iter < maxiter and hi - lo > 1e-9*hi:
+            focal = (lo + hi)/2.0
+            self.simulate(None, focal)
+            iter += 1
+            diff = self.get_distributed(fte) - budget
+            if self.debug: print("AfpACRCalculator.solve_focal_value bisection:", iter, focal, diff)
+            if abs(diff) <= tolerance:
+                lo, lo_diff = focal, diff
+                break
+            if diff < 0.0: lo, lo_diff = focal, diff
+            else: hi, hi_diff = focal, diff
+        if lo is None: 
+            print("AfpACRCalculator.solve_focal_value WARNING: budget", budget, "can not be reached, distributed:", budget + hi_diff)
+            lo = hi
+        if not self.focal_value == lo:
+            self.simulate(None, lo)
+        self.solver_info = [budget, self.get_distributed(fte), iter]
+        if self.debug: print("AfpACRCalculator.solve_focal_value:", lo, self.solver_info)
+        return lo
+    ## find reference value, where the distributed increase (including rounding) exhausts the budget
+    # @param budget - if given, budget to be exhausted, default: self.budget
+    # @param fte - flag if full time equivalent data should be used
+    def solve_ref_value(self, budget = None, fte = True):
+        if self.solve_focal_value(budget, fte) is None: return None
+        return self.reference_value
+    ## get information of last solver run: budget, distributed sum, number of simulations
+    def get_solver_info(self):
+        return self.solver_info
+    ## evaluate a grid of budget percentages and booster settings, \n
+    # for each combination the focal value exhausting the budget is solved. \n
+    # Returns list of rows: [budget percentage, booster setting, budget, focal value, reference value, 
+    # distributed sum, variance risk (below, above), acr distribution matrix]
+    # @param percents - list of budget percentages, default: actuel percentage
+    # @param settings - list of dictionaries holding booster values to be used, default: actuel boosters
+    # @param fte - flag if full time equivalent data should be used
+    def sweep(self, percents = None, settings = None, fte = True):
+        if not percents: percents = [100*self.budgetfactor]
+        if not settings: settings = [{}]
+        factor = self.budgetfactor
+        initial_focal = self.focal_value
+        solver_info = self.solver_info
+        values = {}
+        if self.boosters:
+            for name in self.boosters:
+                values[name] = self.boosters[name].value
+        rows = []
+        for setting in settings:
+            for name in setting:
+                if self.boosters and name in self.boosters:
+                    self.boosters[name].value = setting[name]
+                else:
+                    print("AfpACRCalculator.sweep WARNING: booster", name, "not defined!")
+            for percent in percents:
+                self.set_budget(percent)
+                focal = self.solve_focal_value(None, fte)
+                if focal is None: continue
+                risk = self.get_variance_risk()
+                rows.append([percent, setting, self.budget, focal, self.reference_value, self.get_distributed(fte), risk, self.get_acr_distribution()])
+                if self.debug: print("AfpACRCalculator.sweep:", rows[-1][:7])
+        # restore initial settings and the results of the initial focal value
+        for name in values:
+            self.boosters[name].value = values[name]
+        self.budgetfactor = factor
+        self.set_budget()
+        if initial_focal is None:
+            self.focal_value = None
+            self.focal_matrix = None
+            self.reference_matrix = None
+            self.matrix = None
+            self.booster_matrices = None
+        else:
+            self.simulate(None, initial_focal)
+        self.solver_info = solver_info
+        return rows
+    ## display result of a scenario sweep
+    # @param rows - rows delivered by sweep
+    def view_sweep(self, rows):
+        print("AfpACRCalculator.sweep: Percent \tBoosters \tBudget \tFocal \tReference \tDistributed \tRisk below \tRisk above")
+        for row in rows:
+            boost = ""
+            for name in row[1]:
+                boost += name + "=" + Afp_toString(row[1][name]) + " "
+            if not boost: boost = "-"
+            print("AfpACRCalculator.sweep:", Afp_toString(row[0]), "\t", boost.strip(), "\t", Afp_toString(row[2]), "\t", Afp_toString(row[3]), "\t", Afp_toString(row[4]), "\t", Afp_toString(row[5]), "\t", Afp_toString(row[6][0]), "\t", Afp_toString(row[6][1]))
+            print("AfpACRCalculator.sweep distribution:", row[7])
     ## check increase   
     def check_increase(self):
         if self.check_matrix:
@@ -1281,6 +1466,167 @@ class AfpACRMatrixBooster(object):
             return True
         else:
             return False
+## class to hold the data of all involved persons in numpy arrays, \n
+# matrix sums, booster sums and proposals are computed as array operations. \n
+# Only eligible persons have valid matrix indices, sums are accumulated in the order of the persons,
+# so results are identical to the loops over the AfpACRPerson objects.
+class AfpACRPeopleTable(object):
+    ## initialize AfpACRPeopleTable class
+    # @param manager - AfpACRPeopleManager object holding the persons
+    def  __init__(self, manager):
+        self.debug = manager.debug
+        self.persons = manager.persons
+        self.rows = manager.get_matrix_length(1)
+        self.cols = manager.get_matrix_length(0)
+        lgh = len(self.persons)
+        self.OTE = numpy.zeros(lgh)
+        self.ote = numpy.zeros(lgh)
+        self.fte = numpy.zeros(lgh)
+        self.performance = numpy.zeros(lgh, dtype=int)
+        self.positioning = numpy.zeros(lgh, dtype=int)
+        self.cell = numpy.zeros(lgh, dtype=int)
+        self.eligible = numpy.zeros(lgh, dtype=bool)
+        self.booster = numpy.full(lgh, -1, dtype=int)
+        self.booster_names = []
+        self.ote_int = True
+        for k, person in enumerate(self.persons):
+            self.OTE[k] = person.OTE
+            self.ote[k] = person.ote
+            self.fte[k] = person.fte
+            if not type(person.OTE) == int: self.ote_int = False
+            if person.is_eligible():
+                self.eligible[k] = True
+                self.performance[k] = manager.get_matrix_index(1, person.get_performance())
+                self.positioning[k] = manager.get_matrix_index(0, person.get_positioning())
+                self.cell[k] = self.performance[k]*self.cols + self.positioning[k]
+            boost = person.get_booster()
+            if boost:
+                if not boost in self.booster_names: self.booster_names.append(boost)
+                self.booster[k] = self.booster_names.index(boost)
+        # result values already computed for the persons, NaN stands for a not yet computed value
+        self.percentage = self.get_result_values("percentage")
+        self.increase = self.get_result_values("increase")
+        self.OTE_increase = self.get_result_values("OTE_increase")
+        self.boosted_increase = self.get_result_values("boosted_increase")
+        if self.debug: print("AfpACRPeopleTable Konstruktor:", lgh, "persons", self.rows, "x", self.cols, "boosters:", self.booster_names)
+    ## get result values from the person objects, not yet computed values are set to NaN
+    # @param name - name of result attribute of AfpACRPerson
+    def get_result_values(self, name):
+        values = [getattr(person, name) for person in self.persons]
+        return numpy.array([numpy.nan if value is None else value for value in values], dtype=float)
+    ## sum of values in order of the given array
+    # @param values - array of values to be summed up
+    def sum(self, values):
+        if not len(values): return 0.0
+        return float(numpy.bincount(numpy.zeros(len(values), dtype=int), values)[0])
+    ## get ote values
+    # @param fte - flag if full time ote should be returned
+    def get_ote(self, fte = True):
+        if fte: return self.OTE
+        return self.ote
+    ## get increase values, not computed values are returned as 0.0
+    # @param fte - flag if full time increase should be returned
+    # @param boosted - flag if additional boosted increase should be returned
+    def get_increase(self, fte = True, boosted = False):
+        if boosted: inc = self.boosted_increase
+        elif fte: inc = self.OTE_increase
+        else: inc = self.increase
+        return numpy.nan_to_num(inc, nan=0.0)
+    ## generate matrix field sums, see AfpACRPeopleManager.get_matrix_sums
+    # @param fte - flag if fulltime OTE should be used
+    # @param type - type different sums than OTE, actuel "Inc" = Increase  and 'cnt' = count are supported
+    # @param mask - if given, mask of persons to be used
+    def get_matrix_sums(self, fte = True, type = None, mask = None):
+        valid = self.eligible
+        if not mask is None: valid = valid & mask
+        size = self.rows*self.cols
+        if type == "cnt":
+            matrix = numpy.bincount(self.cell[valid], minlength=size)
+            sum = int(numpy.count_nonzero(~valid))
+        else:
+            if type == "Inc": values = self.get_increase(fte)
+            else: values = self.get_ote(fte)
+            matrix = numpy.bincount(self.cell[valid], values[valid], minlength=size)
+            sum = self.sum(values[~valid])
+        return sum, matrix.reshape(self.rows, self.cols)
+    ## generate booster sum of eligible persons
+    # @param boost - name of booster to be respected
+    # @param fte - flag if fulltime ote should be used
+    # @param inc - flag if increase should be used instead of ote
+    def get_booster_sum(self, boost, fte = True, inc = False):
+        if not boost in self.booster_names: return 0.0
+        mask = self.eligible & (self.booster == self.booster_names.index(boost))
+        if inc: values = self.get_increase(fte, True)
+        else: values = self.get_ote(fte)
+        return self.sum(values[mask])
+    ## generate matrix of ote sums of eligible persons with a booster
+    # @param boost - name of booster to be respected
+    # @param fte - flag if fulltime ote should be used
+    def get_booster_matrix(self, boost, fte = True):
+        if boost in self.booster_names: 
+            mask = self.booster == self.booster_names.index(boost)
+        else:
+            mask = numpy.zeros(len(self.persons), dtype=bool)
+        return self.get_matrix_sums(fte, None, mask)[1]
+    ## set ote increase proposals, see AfpACRPerson.set_proposal and AfpACRPerson.set_rounded_proposals \n
+    # returns the sum of rounding differences
+    # @param matrix - matrix holding all increase percentages
+    # @param bmatrices - dictionary holding matrices holding all increase percentage for the different boosters
+    # @param round -list holding keywords which values should be rounded
+    def set_ote_proposals(self, matrix, bmatrices = None, round = None):
+        pmatrix = numpy.array(matrix, dtype=float).reshape(-1)
+        cell = self.cell[self.eligible]
+        percent = numpy.zeros(len(self.persons))
+        percent[self.eligible] = pmatrix[cell]
+        boost = numpy.zeros(len(self.persons))
+        boosted = numpy.zeros(len(self.persons), dtype=bool)
+        if bmatrices:
+            for ind, name in enumerate(self.booster_names):
+                mask = self.eligible & (self.booster == ind)
+                if mask.any():
+                    boost[mask] = numpy.array(bmatrices[name], dtype=float).reshape(-1)[self.cell[mask]]
+            boosted = boost != 0.0
+        self.percentage = numpy.where(boosted, boost, percent)
+        self.boosted_increase = numpy.where(boosted, self.OTE*(boost - percent)/100, self.boosted_increase)
+        self.increase = self.ote*self.percentage/100
+        self.OTE_increase = self.OTE*self.percentage/100
+        rounded = 0.0
+        if round:
+            initial_increase = self.increase
+            initial_OTE_increase = self.OTE_increase
+            if "percent" in round:
+                self.percentage = numpy.trunc(self.percentage*100 + 0.5)/100.0
+                self.increase = self.ote*self.percentage/100
+                self.OTE_increase = self.OTE*self.percentage/100
+            if "ote" in round:
+                self.increase = numpy.trunc(self.increase + 0.5)
+            if "OTE" in round:
+                self.OTE_increase = numpy.trunc(self.OTE_increase + 0.5)
+            rounded = self.sum(numpy.maximum(numpy.abs(self.increase - initial_increase), numpy.abs(self.OTE_increase - initial_OTE_increase)))
+        self.write_persons(round)
+        return rounded
+    ## write proposals back into the AfpACRPerson objects
+    # @param round -list holding keywords which values have been rounded
+    def write_persons(self, round = None):
+        if not round: round = []
+        percentage = self.percentage.tolist()
+        if "ote" in round: 
+            increase = self.increase.astype(numpy.int64).tolist()
+        else:
+            increase = self.increase.tolist()
+        if "OTE" in round: 
+            OTE_increase = self.OTE_increase.astype(numpy.int64).tolist()
+        else:
+            OTE_increase = self.OTE_increase.tolist()
+        boosted = self.boosted_increase.tolist()
+        for k, person in enumerate(self.persons):
+            person.percentage = percentage[k]
+            person.increase = increase[k]
+            person.OTE_increase = OTE_increase[k]
+            if not boosted[k] != boosted[k]: person.boosted_increase = boosted[k]
+            person.new_ote = person.ote + person.increase
+            person.new_OTE = person.OTE + person.OTE_increase
+
 ## class to handle data of all involved persons
 class AfpACRPeopleManager(object):
     ## initialize AfpACRPeopleManager class
@@ -1296,6 +1642,8 @@ class AfpACRPeopleManager(object):
         self.round = ["percent", "ote", "OTE"]
         #self.round = None
         self.rounded = None
+        self.use_table = not numpy is None
+        self.table = None
         self.set_persons(data, colmap)
     ## extract column data from row
     #@param row - row holding data
@@ -1343,6 +1691,7 @@ class AfpACRPeopleManager(object):
                 persons.append(person)
                 count += 1
         self.persons = persons
+        self.table = None
         self.names_available = names_given or merge
     ## set range of distribution matrix, range has to be symmetric to 0
     # @param dir - direction of range, 0 - social (positioning), 1  - performance
@@ -1352,6 +1701,7 @@ class AfpACRPeopleManager(object):
         if -min > max: max =  -min
         if -min < max: min =  -max
         self.matrix_range[dir] = [min, max]
+        self.table = None
     ## display percentage of people with OTE above midpoint of range
     # @param fac -faktor to scale range midpoint
     # @param list -flag if all counted persons should be listed
@@ -1450,6 +1800,7 @@ class AfpACRPeopleManager(object):
         #print "ACRPeopleManager.set_boosters:", boosters
         for person in self.persons:
             person.set_booster(boosters)
+        self.table = None
     ## set invalid flag due to input indicators
     # @param  invalidlist - list holding entries which flag this person not eligible
     # @param max_skip_perf - if given, performances below and equal this indicator are not eligible
@@ -1459,10 +1810,15 @@ class AfpACRPeopleManager(object):
         #print ("AfpACRPeopleManager.set_eligibillity:", invalidlist, max_ote_factor, max_ote)
         for person in self.persons:
             person.set_eligibillity(invalidlist, skip_perf, max_ote_factor, max_ote)
+        self.table = None
     ## set ote increase proposals
     # @param matrix - list holding all increase percentages
     # @param bmatrices - dictionary holding lists holding all increase percentage for the different boosters
     def set_ote_proposals(self, matrix, bmatrices = None):
+        table = self.get_table()
+        if table:
+            self.rounded = table.set_ote_proposals(matrix, bmatrices, self.round)
+            return
         self.rounded = 0.0
         for person in self.persons:
             if person.is_eligible():
@@ -1480,6 +1836,11 @@ class AfpACRPeopleManager(object):
             #print "AfpACRPeopleManager.set_ote_proposals:", i, j, person.get_name(),  person.is_eligible(), "PERF:",person.get_performance(), "POS:", person.get_positioning(), p, pp
             person.set_proposal(p, pp)
             if self.round: self.rounded += person.set_rounded_proposals(self.round)
+    ## get table holding the person data in arrays, if numpy is available, otherwise None
+    def get_table(self):
+        if self.table is None and self.use_table and self.persons and not None in self.matrix_range:
+            self.table = AfpACRPeopleTable(self)
+        return self.table
     ## get ranges for distribution matrix
     def are_valid(self):
         valid = True
@@ -1547,6 +1908,8 @@ class AfpACRPeopleManager(object):
     # @param fte - flag if fulltime ote should be used
     # @param inc - flag if increase should be used instead of ote
     def get_booster_sum(self, boost, fte = True, inc = False):
+        table = self.get_table()
+        if table: return table.get_booster_sum(boost, fte, inc)
         sum = 0.0
         for person in self.persons:
             if person.get_booster() == boost and person.is_eligible():
@@ -1559,6 +1922,11 @@ class AfpACRPeopleManager(object):
     # @param fte - flag if fulltime increase should be used
     # @param all - flag if all persons should be counted or only valid persons count
     def get_increase_sum(self, fte = True, all = True):
+        table = self.get_table()
+        if table: 
+            values = table.get_increase(fte)
+            if not all: values = values[table.eligible]
+            return table.sum(values)
         sum = 0.0
         for person in self.persons:
             if all or person.is_eligible():
@@ -1578,6 +1946,11 @@ class AfpACRPeopleManager(object):
     # @param new - flag if new OTE values should be used
     # @param all - flag if all OTE should be counted or only valid persons count
     def get_ote_sum(self, fte = True, new = False, all = True):
+        table = self.get_table()
+        if table and not new: 
+            values = table.get_ote(fte)
+            if not all: values = values[table.eligible]
+            return table.sum(values)
         sum = 0.0
         for person in self.persons:
             if all or person.is_eligible():
@@ -1588,6 +1961,10 @@ class AfpACRPeopleManager(object):
     # @param type - type different sums than OTE, actuel "Inc" = Increase  and 'cnt' = count are supported
     # @param promo - flag if only promoted persons should be counted
     def get_matrix_sums(self, fte = True, type = None, promo = False):
+        table = self.get_table()
+        if table and not promo and type in [None, "Inc", "cnt"]:
+            sum, matrix = table.get_matrix_sums(fte, type)
+            return sum, matrix.tolist()
         if type and type == "cnt": init = 0
         else: init = 0.0
         # generate empty array
@@ -1611,6 +1988,19 @@ class AfpACRPeopleManager(object):
                     elif type == "cnt": sum += 1
                 else: sum += person.get_ote(fte)
         return sum, matrix
+    ## generate matrix of ote sums of eligible persons with the given booster
+    # @param boost - name of booster to be respected
+    # @param fte - flag if fulltime ote should be used
+    def get_booster_matrix(self, boost, fte = True):
+        table = self.get_table()
+        if table: return table.get_booster_matrix(boost, fte).tolist()
+        matrix = Afp_initMatrix(self.get_matrix_length(0), self.get_matrix_length(1), 0.0)
+        for person in self.persons: 
+            if person.get_booster() == boost and person.is_eligible():
+                i = self.get_matrix_index(1, person.get_performance())
+                j = self.get_matrix_index(0, person.get_positioning())
+                matrix[i][j] += person.get_ote(fte)
+        return matrix
     ## get grid data
     def get_grid_data(self):
         data = []
@@ -1675,6 +2065,9 @@ if __name__ == "__main__":
     part = None
     ref = None
     display = None
+    solve = False
+    sweep = None
+    boost = None
     lgh = len(sys.argv)
     ev_indices = []
     for i in range(1,lgh):
@@ -1696,6 +2089,13 @@ if __name__ == "__main__":
         if sys.argv[i] == "-s" or sys.argv[i] == "--show": 
             ev_indices.append(i+1)
             if i < lgh-1 and sys.argv[i+1][0] != "-": display = sys.argv[i+1] 
+        if sys.argv[i] == "-w" or sys.argv[i] == "--sweep": 
+            ev_indices.append(i+1)
+            if i < lgh-1 and sys.argv[i+1][0] != "-": sweep = sys.argv[i+1] 
+        if sys.argv[i] == "-x" or sys.argv[i] == "--boost": 
+            ev_indices.append(i+1)
+            if i < lgh-1 and sys.argv[i+1][0] != "-": boost = sys.argv[i+1] 
+        if sys.argv[i] == "-o" or sys.argv[i] == "--solve": solve = True
         if sys.argv[i] == "-c" or sys.argv[i] == "--check": check = True
         if sys.argv[i] == "-p" or sys.argv[i] == "--part": part = True
         if sys.argv[i] == "-v" or sys.argv[i] == "--verbose": debug = True
@@ -1704,7 +2104,7 @@ if __name__ == "__main__":
         conffile = None
         if lgh > 1 and sys.argv[lgh-1][0] != "-"  and not lgh-1 in ev_indices:
             conffile = sys.argv[lgh-1]
-        AfpACRCalculator_main(conffile, filename, rangefile, budget, ref, focal, part, check, display, debug) 
+        AfpACRCalculator_main(conffile, filename, rangefile, budget, ref, focal, part, check, display, debug, solve, sweep, boost) 
     else:
         print("usage: AfpACRCalculator [option] configuration")
         print("AfpACRCalculator calculates a complete ACR distribution from given data.")
@@ -1718,6 +2118,7 @@ if __name__ == "__main__":
         print("-f, --focal    focal percentage to be used for simulation, if no reference is given")
         print("-m, --market   name of market salary range file (only csv files are supported)")
         print("               a salary range file has to be supplied")
+        print("-o, --solve    search focal value which exhausts the budget including rounding")
         print("-p, --part     flag if part-time should be respected during distribution calculation")
         print("-r, --refer    reference percentage to be used for simulation")
         print("-s, --show     show generated people data, following types may follow: ")
@@ -1727,6 +2128,10 @@ if __name__ == "__main__":
         print("               - increase: name/number, 100% OTE, increase percentage")
         print("               - data: name/number, job family, 100% OTE, FTE factor, CLG, DAIT, positioning index, performance index, promotion flag, increase percentage, new 100% OTE")
         print("-v,--verbose   display comments on all actions (debug-information)")
+        print("-w, --sweep    budget percentages for a scenario sweep, the budget is exhausted for each entry,")
+        print("               given as 'start:stop:step' or comma separated values, p.e. '2.5:3.5:0.25'")
+        print("-x, --boost    booster values for a scenario sweep, all combinations are evaluated,")
+        print("               p.e. 'PROMO=1.0,2.0;KILL=0.5'")
         print("configuration  name of configuration file name, the entries in this file are: 'PARAMETRE_NAME = paramter value',")
         print("               this file may hold the following parameter:")
         print("        BUDGET section:")
@@ -2,11 +2,13 @@
 # -*- coding: utf-8 -*-
 
 # AfpInternetUpdater is a helper utility to update internet sites in an easy way
-# it holds 3 classes:
+# it holds 5 classes:
 
 # AfpSlideShowGenerator generates HTML Slideshow from given Layout and allows FTP-Upload to an Internet site.
+# AfpThumbnailPipeline     generates the thumbnails of the slideshow images without wx in parallel processes
 # AfpCaldendarEntries      generates a javascript file holding given calendar entries
 # AfpFTPConnector           handles the FTP connections
+# AfpFTPManifest            holds the state of the files transferred in sync mode
 
 #
 #   History: \n
@@ -39,7 +41,15 @@ import ftplib
 import glob
 import io
 import base64
+import hashlib
+import json
+import threading
+import concurrent.futures
 import wx
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
 
 import AfpBase
 from AfpBase import AfpBaseDialog, AfpUtilities
@@ -140,6 +150,46 @@ def Afp_genDir(dir):
     if not dir is None: 
         os.makedirs(dir)
 
+## compute the hash of a file, the file is read blockwise
+# @param path - path of the file
+# @param block - size of the blocks read from the file
+def Afp_getFileHash(path, block = 65536):
+    hash = hashlib.sha1()
+    fin = open(path, "rb")
+    data = fin.read(block)
+    while data:
+        hash.update(data)
+        data = fin.read(block)
+    fin.close()
+    return hash.hexdigest()
+
+## generate the thumbnail of an image with PIL, used by AfpThumbnailPipeline in separate processes \n
+# returns [hash of image, flag if thumbnail has been written], None if the image could not be read
+# @param source - complete filename of image
+# @param target - complete filename of thumbnail, it is written in PNG format
+# @param width - width of thumbnail
+# @param height - height of thumbnail
+# @param oldhash - if given, hash of the image an existing thumbnail has been generated from, the thumbnail is only written if the hash differs
+def Afp_genThumbnail(source, target, width, height, oldhash = None):
+    hash = Afp_getFileHash(source)
+    if hash == oldhash: return [hash, False]
+    try:
+        img = Image.open(source)
+        # jpeg images are already scaled down while decoding
+        img.draft("RGB", (width, height))
+        if img.mode in ["P", "PA", "LA", "RGBA"]:
+            img = img.convert("RGBA")
+        else:
+            img = img.convert("RGB")
+        img = img.resize((width, height), Image.BILINEAR)
+        tmpname = target + ".tmp"
+        img.save(tmpname, "PNG")
+        os.replace(tmpname, target)
+    except (OSError, ValueError) as e:
+        print("WARNING: Afp_genThumbnail:", source, "not converted:", e)
+        return None
+    return [hash, True]
+
 ## routine to load settings from file
 # @param config - path and name of configuration file
 # @param idents - if given, strings to filter settings, separated by commas
@@ -194,6 +244,97 @@ def Afp_toHtml(text):
     text = text.replace( "ß", "&szlig;")
     return text
 
+## class to generate thumbnails of images without wx in a process pool \n
+# the thumbnails are held in a cache directory, an index holds for each thumbnail [source, size, mtime, hash] of the image it has been generated from,
+# images whose content did not change are skipped. \n
+# If PIL is not available, the pipeline is not usable and the thumbnails have to be generated with wx.
+class AfpThumbnailPipeline(object):
+    ## initialize AfpThumbnailPipeline class
+    # @param width - width of thumbnails
+    # @param height - height of thumbnails
+    # @param cachedir - directory where thumbnails and index are written to
+    # @param workers - if given, number of processes used to generate the thumbnails, default: number of cpus
+    # @param debug - if given, debug flag
+    def  __init__(self, width, height, cachedir, workers = None, debug = False):
+        self.width = width
+        self.height = height
+        self.pathdelimiter = Afp_getGlobalVar("path-delimiter")
+        self.cachedir = Afp_pathname(cachedir, self.pathdelimiter)
+        self.workers = workers
+        if not self.workers: self.workers = os.cpu_count() or 1
+        self.debug = debug
+        self.indexfile = self.cachedir + "AfpThumbnails.json"
+        self.index = None
+        self.changed = False
+        if self.debug: print("AfpThumbnailPipeline Konstruktor:", self.cachedir, self.workers, self.is_available())
+    ## destructor
+    def __del__(self):
+        if self.debug: print("AfpThumbnailPipeline Destruktor")
+    ## check if thumbnails can be generated without wx
+    def is_available(self):
+        return not Image is None
+    ## load index of generated thumbnails
+    def load_index(self):
+        self.index = {}
+        if Afp_existsFile(self.indexfile):
+            try:
+                fin = open(self.indexfile, "r")
+                self.index = json.load(fin)
+                fin.close()
+            except ValueError:
+                print("WARNING: AfpThumbnailPipeline.load_index: index", self.indexfile, "not readable, all thumbnails will be generated!")
+    ## write index of generated thumbnails, if it has been changed
+    def save_index(self):
+        if not self.changed: return
+        if not Afp_existsFile(self.cachedir): Afp_genDir(self.cachedir)
+        tmpname = self.indexfile + ".tmp"
+        fout = open(tmpname, "w")
+        json.dump(self.index, fout)
+        fout.close()
+        os.replace(tmpname, self.indexfile)
+        self.changed = False
+    ## return name of thumbnail in cache directory for an image
+    # @param source - complete filename of image
+    def get_cachename(self, source):
+        name = hashlib.sha1(os.path.abspath(source).encode("UTF-8")).hexdigest()
+        return self.cachedir + name + "_" + Afp_toString(self.width) + "x" + Afp_toString(self.height) + ".png"
+    ## generate thumbnails, returns the list of thumbnail filenames in the order of the images
+    # @param sources - complete filenames of images
+    # @param targets - if given, complete filenames of thumbnails, default: thumbnails are written to cache directory
+    def generate(self, sources, targets = None):
+        if not self.is_available(): return None
+        if self.index is None: self.load_index()
+        if targets is None:
+            if not Afp_existsFile(self.cachedir): Afp_genDir(self.cachedir)
+            targets = [self.get_cachename(source) for source in sources]
+        jobs = []
+        for source, target in zip(sources, targets):
+            stat = os.stat(source)
+            entry = self.index.get(target)
+            if entry and entry[0] != source: entry = None
+            if entry and Afp_existsFile(target) and entry[1] == stat.st_size and entry[2] == stat.st_mtime: continue
+            oldhash = None
+            if entry and Afp_existsFile(target): oldhash = entry[3]
+            jobs.append([source, target, [source, stat.st_size, stat.st_mtime], oldhash])
+        if self.debug: print("AfpThumbnailPipeline.generate:", len(jobs), "of", len(sources), "images to be checked")
+        if len(jobs) < 2 or self.workers < 2:
+            results = [Afp_genThumbnail(job[0], job[1], self.width, self.height, job[3]) for job in jobs]
+        else:
+            pool = concurrent.futures.ProcessPoolExecutor(max_workers = min(self.workers, len(jobs)))
+            try:
+                results = list(pool.map(Afp_genThumbnail, [job[0] for job in jobs], [job[1] for job in jobs], [self.width]*len(jobs), [self.height]*len(jobs), [job[3] for job in jobs], chunksize = 4))
+            finally:
+                pool.shutdown()
+        for job, result in zip(jobs, results):
+            if result is None:
+                self.index.pop(job[1], None)
+            else:
+                self.index[job[1]] = job[2] + [result[0]]
+            self.changed = True
+            if self.debug and result: print("AfpThumbnailPipeline.generate:", job[0], "->", job[1], "written:", result[1])
+        self.save_index()
+        return targets
+
 ## class to generate silde shows
 class AfpSlideShowGenerator(object):
     ## initialize AfpSlideShowGenerator class
@@ -249,6 +390,13 @@ class AfpSlideShowGenerator(object):
             self.name = self.settings["local-clientname"]
         if "local-max-thumbs-per-line" in self.settings: 
             self.max_thumbs_per_line = Afp_fromString(self.settings["local-max-thumbs-per-line"])
+        thumbdir = Afp_pathname(Afp_genHomeDir(), self.pathdelimiter) + ".AfpThumbnails"
+        if "local-thumbdir" in self.settings: 
+            thumbdir = self.settings["local-thumbdir"]
+        workers = None
+        if "local-thumb-workers" in self.settings: 
+            workers = int(self.settings["local-thumb-workers"])
+        self.thumbs = AfpThumbnailPipeline(self.iwidth, self.iheight, thumbdir, workers, self.debug)
         #if self.ftpcon:
             #self.ftpcon.invoke_ftp() 
         self.set_locrem()
@@ -412,9 +560,7 @@ class AfpSlideShowGenerator(object):
         self.source_pathes = self.get_filenames(dir)
         if self.debug: print("AfpSlideShowGenerator.gen_source_list:", self.source_pathes)
         #print "AfpSlideShowGenerator.gen_source_list:", self.source_pathes
-        for file in self.source_pathes:
-            img = wx.Image(file, wx.BITMAP_TYPE_ANY).Rescale(self.iwidth,self.iheight).ConvertToBitmap()
-            self.source_list.Add(img)
+        self.add_to_image_list(self.source_list, self.source_pathes)
     ## generate list of show directory
     # param dir - if given, path to directory to load
     def gen_show_list(self, dir=None):
@@ -422,10 +568,20 @@ class AfpSlideShowGenerator(object):
         if self.debug: print("AfpSlideShowGenerator.get_show_list:", self.show_pathes)
         self.show_list.RemoveAll()
         if self.show_pathes:
-            for file in self.show_pathes:
-                img = wx.Image(file, wx.BITMAP_TYPE_ANY).Rescale(self.iwidth,self.iheight).ConvertToBitmap()
-                self.show_list.Add(img)
+            self.add_to_image_list(self.show_list, self.show_pathes)
         self.extract_imagedata(dir)
+    ## add thumbnails of images to an image list, 
+    # the bitmaps are loaded from the thumbnails of the pipeline, if available, otherwise the images are scaled by wx
+    # @param imagelist - wx.ImageList the thumbnails are added to
+    # @param pathes - complete filenames of images
+    def add_to_image_list(self, imagelist, pathes):
+        thumbs = self.thumbs.generate(pathes)
+        for i in range(len(pathes)):
+            if thumbs and Afp_existsFile(thumbs[i]):
+                img = wx.Image(thumbs[i], wx.BITMAP_TYPE_PNG).ConvertToBitmap()
+            else:
+                img = wx.Image(pathes[i], wx.BITMAP_TYPE_ANY).Rescale(self.iwidth,self.iheight).ConvertToBitmap()
+            imagelist.Add(img)
     ## get filename from path list
     # @param index - index of path in pathlist, where name has to be extracted from
     def get_source_filename(self, index=0):
@@ -441,8 +597,7 @@ class AfpSlideShowGenerator(object):
     def add_source_to_show(self, index, show, text):
         if index >=0 and index < len(self.source_pathes):
             path = self.source_pathes[index]
-            img = wx.Image(path, wx.BITMAP_TYPE_ANY).Rescale(self.iwidth,self.iheight).ConvertToBitmap()
-            self.show_list.Add(img)
+            self.add_to_image_list(self.show_list, [path])
             self.insert_imagedata(show, self.show_list.GetImageCount()-1, text, path)
             self.changed = True
     ## delete image from show list
@@ -677,16 +832,22 @@ class AfpSlideShowGenerator(object):
         if gen:
             Afp_genDir(locdir + "small")
         files = self.get_filenames()
+        thumbs = []
+        for file in self.show_pathes:
+            name = file.split(self.pathdelimiter)[-1]
+            ext = "." + name.split(".")[-1]
+            thumbs.append(locdir + "small" + self.pathdelimiter + name[:-len(ext)] + ".png")
+        # thumbnails are generated from the image files, if the pipeline is available
+        self.thumbs.generate(self.show_pathes, thumbs)
         for i in range(len(self.show_pathes)):
             file = self.show_pathes[i]
             name = file.split(self.pathdelimiter)[-1]
-            ext = "." + name.split(".")[-1]
             # write files
             if not file in files:
                 to_file = locdir + name
                 #print "AfpSlideShowGenerator.store_show_images copy file:",file, "->", to_file
                 Afp_copyFile(file, to_file)
-            to_file = locdir + "small" + self.pathdelimiter + name[:-len(ext)] + ".png"
+            to_file = thumbs[i]
             # write thumbnails
             if not Afp_existsFile(to_file):
                 bit = self.show_list.GetBitmap(i)
@@ -832,23 +993,32 @@ class AfpSlideShowGenerator(object):
             if not self.ftpcon.is_connected():
                 self.ftpcon.invoke_ftp()
             print("AfpSlideShowGenerator.publish_slideshow:", self.localname, self.localindex)
-            self.ftpcon.send_ftp_dir(self.localname)
-            self.ftpcon.send_ftp_file(self.localname + ".html")
-            self.ftpcon.send_ftp_file(self.localindex)
+            if self.ftpcon.sync:
+                self.ftpcon.sync_send([self.localname, self.localname + ".html", self.localindex])
+            else:
+                self.ftpcon.send_ftp_dir(self.localname)
+                self.ftpcon.send_ftp_file(self.localname + ".html")
+                self.ftpcon.send_ftp_file(self.localindex)
     ## download slideshow data on ftp-server
     def get_slideshow(self):
         if self.ftpcon:
             if not self.ftpcon.is_connected():
                 self.ftpcon.invoke_ftp()
-            self.ftpcon.get_ftp_dir(self.localname)
-            self.ftpcon.get_ftp_file(self.localname + ".html")
-            self.ftpcon.get_ftp_file(self.localindex)
+            if self.ftpcon.sync:
+                self.ftpcon.sync_get([self.localname, self.localname + ".html", self.localindex])
+            else:
+                self.ftpcon.get_ftp_dir(self.localname)
+                self.ftpcon.get_ftp_file(self.localname + ".html")
+                self.ftpcon.get_ftp_file(self.localindex)
     ## download all slideshow data from ftp-server
     def get_all_slideshows(self):
         if self.ftpcon:
             if not self.ftpcon.is_connected():
                 self.ftpcon.invoke_ftp()
-            self.ftpcon.get_ftp_dir(None)
+            if self.ftpcon.sync:
+                self.ftpcon.sync_get([None])
+            else:
+                self.ftpcon.get_ftp_dir(None)
             self.set_locrem()
             
 ## class to handle internet pages showing dates from a singe javascript file
@@ -1033,6 +1203,76 @@ class AfpCalendarEntries(object):
         fin.close()
     
             
+## class to hold the state of the files transferred by the sync routines of AfpFTPConnector \n
+# the entries are stored in a json file, for each remote path the following values are kept: \n
+# - "send": [size, mtime, hash] of the local file which has been uploaded \n
+# - "get": [size, modify] of the remote file reported by the server, when it has been downloaded \n
+# - "pending": the new entry of a transfer which has been started but not yet completed
+class AfpFTPManifest(object):
+    ## initialize AfpFTPManifest class
+    # @param filename - path and name of the manifest file
+    # @param debug - if given, debug flag
+    def  __init__(self, filename, debug = False):
+        self.filename = filename
+        self.debug = debug
+        self.entries = {"send": {}, "get": {}, "pending": {}}
+        self.changed = False
+        self.load()
+        if self.debug: print("AfpFTPManifest Konstruktor:", self.filename)
+    ## destructor
+    def __del__(self):   
+        if self.debug: print("AfpFTPManifest Destruktor") 
+    ## load entries from manifest file
+    def load(self):
+        if Afp_existsFile(self.filename):
+            try:
+                fin = open(self.filename, "r")
+                entries = json.load(fin)
+                fin.close()
+                for typ in self.entries:
+                    if typ in entries: self.entries[typ] = entries[typ]
+            except ValueError:
+                print("WARNING: AfpFTPManifest.load: manifest", self.filename, "not readable, all files will be transferred!")
+    ## write entries to manifest file, if they have been changed
+    def save(self):
+        if not self.changed: return
+        tmpname = self.filename + ".tmp"
+        fout = open(tmpname, "w")
+        json.dump(self.entries, fout)
+        fout.close()
+        os.replace(tmpname, self.filename)
+        self.changed = False
+        if self.debug: print("AfpFTPManifest.save:", self.filename, len(self.entries["send"]), len(self.entries["get"]), len(self.entries["pending"]))
+    ## get entry of a transferred file
+    # @param typ - direction of transfer, "send" or "get"
+    # @param key - key of remote file
+    def get_entry(self, typ, key):
+        return self.entries[typ].get(key)
+    ## set entry of a completely transferred file
+    # @param typ - direction of transfer, "send" or "get"
+    # @param key - key of remote file
+    # @param entry - entry to be stored
+    def set_entry(self, typ, key, entry):
+        self.entries[typ][key] = entry
+        self.entries["pending"].pop(typ + ":" + key, None)
+        self.changed = True
+    ## get [entry, number of bytes written] of a started transfer, None if no valid transfer is pending
+    # @param typ - direction of transfer, "send" or "get"
+    # @param key - key of remote file
+    def get_pending(self, typ, key):
+        pending = self.entries["pending"].get(typ + ":" + key)
+        if not (type(pending) == list and len(pending) == 2 and type(pending[0]) == list and type(pending[1]) == int): 
+            return None
+        return pending
+    ## set entry of a started transfer
+    # @param typ - direction of transfer, "send" or "get"
+    # @param key - key of remote file
+    # @param entry - entry to be stored when the transfer is completed
+    # @param done - number of bytes written into the temporary file by this transfer
+    def set_pending(self, typ, key, entry, done = 0):
+        self.entries["pending"][typ + ":" + key] = [entry, done]
+        self.changed = True
+
 ## class to handle FTP connection and interactions
 class AfpFTPConnector(object):
     ## initialize AfpFTPConnector class
@@ -1058,6 +1298,23 @@ class AfpFTPConnector(object):
             self.localroot = Afp_pathname(self.settings["local-root"], self.pathdelimiter)
             self.localdir = self.localroot
         self.remotedir = None
+        self.login = None
+        # sync mode: only changed files are transferred, using parallel ftp sessions
+        self.sync = False
+        if "ftp-sync" in self.settings and self.settings["ftp-sync"]:
+            self.sync = True
+        self.sync_sessions = 4
+        if "ftp-sync-sessions" in self.settings and self.settings["ftp-sync-sessions"]:
+            self.sync_sessions = int(self.settings["ftp-sync-sessions"])
+        if "ftp-manifest" in self.settings:
+            self.manifest_file = self.settings["ftp-manifest"]
+        else:
+            self.manifest_file = Afp_getToLastChar(config, self.pathdelimiter) + "AfpInternetUpdater.manifest"
+        self.manifest = None
+        self.temp_ending = ".afppart" # ending of temporary files of unfinished transfers
+        self.sessions = []
+        self.session_data = threading.local()
+        self.session_lock = threading.Lock()
     # possible  ftp-commands:
     # dir() - ls
     # nlst() - ls, python list as output
@@ -1115,6 +1372,7 @@ class AfpFTPConnector(object):
             r1 = self.FTP.connect(self.server, self.server_port)
             r2 = self.FTP.login(user,base64.b64decode(word).decode("UTF-8"))
             self.connected = True
+            self.login = [user, word]
             if self.remotedir:
                 self.FTP.cwd(self.remotedir)
             if self.debug: 
@@ -1254,9 +1512,375 @@ class AfpFTPConnector(object):
                 self.chdir("..")
                 for char in remote:
                     if char == "/":  self.chdir("..")
+
+    # sync mode routines
+    ## return the manifest holding the state of the transferred files, it is loaded on first use
+    def get_manifest(self):
+        if self.manifest is None:
+            self.manifest = AfpFTPManifest(self.manifest_file, self.debug)
+        return self.manifest
+    ## return the key of a remote file in the manifest
+    # @param remote - complete path of the file on the server
+    def manifest_key(self, remote):
+        return Afp_toString(self.server) + ":" + Afp_toString(self.server_port) + remote
+    ## return complete path on the server
+    # @param name - name of file or directory, if not starting with "/", it is relativ to the actuel remote directory
+    def remote_path(self, name = None):
+        if name and name[0] == "/": return name
+        path = self.actdir()
+        if not name: return path
+        if not path.endswith("/"): path += "/"
+        return path + name
+    ## check if a remote path is a directory
+    # @param path - complete path on the server
+    def remote_is_dir(self, path):
+        current = self.FTP.pwd()
+        try:
+            self.FTP.cwd(path)
+            return True
+        except ftplib.error_perm:
+            return False
+        finally:
+            self.FTP.cwd(current)
+    ## return [size, modify] of a remote file, values which cannot be retrieved are set to None
+    # @param path - complete path of the file on the server
+    # @param ftp - if given, ftp session to be used, default: main session
+    def remote_stamp(self, path, ftp = None):
+        if ftp is None: ftp = self.FTP
+        stamp = [None, None]
+        try:
+            ftp.voidcmd("TYPE I")
+            stamp[0] = ftp.size(path)
+        except ftplib.all_errors:
+            pass
+        try:
+            stamp[1] = ftp.voidcmd("MDTM " + path).split()[-1]
+        except ftplib.all_errors:
+            pass
+        return stamp
+    ## list content of a remote directory, returns a list of files [name, size, modify] and a list of directory names
+    # @param path - complete path of the directory on the server
+    def list_remote(self, path):
+        files = []
+        dirs = []
+        try:
+            for name, facts in self.FTP.mlsd(path, ["type", "size", "modify"]):
+                if name[0] == "." or name.endswith(self.temp_ending): continue
+                if facts.get("type") == "dir":
+                    dirs.append(name)
+                elif facts.get("type") == "file":
+                    size = facts.get("size")
+                    if size: size = int(size)
+                    files.append([name, size, facts.get("modify")])
+        except ftplib.error_perm:
+            # MLSD not supported by the server, the naming rules of 'get_ftp_dir' are used
+            files = []
+            dirs = []
+            current = self.FTP.pwd()
+            self.FTP.cwd(path)
+            names = self.FTP.nlst()
+            self.FTP.cwd(current)
+            for name in names:
+                name = name.split("/")[-1]
+                if not name or name[0] == "." or name.endswith(self.temp_ending): continue
+                if "." in name:
+                    files.append([name] + self.remote_stamp(path.rstrip("/") + "/" + name))
+                else:
+                    dirs.append(name)
+        if self.debug: print("AfpFTPConnector.list_remote:", path, files, dirs)
+        return files, dirs
+    ## create the missing parent directories of remote files
+    # @param remotes - complete pathes of the files on the server
+    def make_remote_dirs(self, remotes):
+        dirs = set()
+        for remote in remotes:
+            split = remote.split("/")
+            for i in range(2, len(split)):
+                dirs.add("/".join(split[:i]))
+        for dir in sorted(dirs):
+            try:
+                self.FTP.mkd(dir)
+                if self.debug: print("AfpFTPConnector.make_remote_dirs:", dir)
+            except ftplib.error_perm:
+                pass # directory already exists
+    ## open an additional ftp session with the login data of the main connection
+    def open_session(self):
+        ftp = ftplib.FTP()
+        ftp.connect(self.server, self.server_port)
+        ftp.login(self.login[0], base64.b64decode(self.login[1]).decode("UTF-8"))
+        ftp.voidcmd("TYPE I")
+        with self.session_lock:
+            self.sessions.append(ftp)
+        return ftp
+    ## return the ftp session of the current thread, a session is opened if needed
+    # @param renew - flag if a new session should be opened
+    def get_session(self, renew = False):
+        ftp = getattr(self.session_data, "ftp", None)
+        if ftp is None or renew:
+            if ftp: self.close_session(ftp)
+            ftp = self.open_session()
+            self.session_data.ftp = ftp
+        return ftp
+    ## close an additional ftp session
+    # @param ftp - session to be closed
+    def close_session(self, ftp):
+        with self.session_lock:
+            if ftp in self.sessions: self.sessions.remove(ftp)
+        try:
+            ftp.quit()
+        except ftplib.all_errors:
+            ftp.close()
+    ## close all additional ftp sessions
+    def close_sessions(self):
+        for ftp in list(self.sessions):
+            self.close_session(ftp)
+        self.session_data = threading.local()
+    ## return the temporary name a file is transferred to, it is renamed when the transfer has been completed
+    # @param name - complete local filename or complete path of the file on the server
+    def temp_name(self, name):
+        return name + self.temp_ending
+    ## return the position where an interrupted transfer may be resumed, 0 if the transfer has to be restarted \n
+    # only bytes recorded as written by a former attempt of the same transfer are taken, 
+    # if the temporary file does not hold them anymore, the transfer is restarted
+    # @param ftp - ftp session to be used
+    # @param typ - direction of transfer, "send" or "get"
+    # @param local - complete local filename
+    # @param remote - complete path of the file on the server
+    # @param done - number of bytes recorded as written into the temporary file
+    def get_resume_offset(self, ftp, typ, local, remote, done):
+        if not done: return 0
+        if typ == "send":
+            size = self.remote_stamp(self.temp_name(remote), ftp)[0]
+        else:
+            size = None
+            if Afp_existsFile(self.temp_name(local)): size = os.path.getsize(self.temp_name(local))
+        if size is None or size < done: return 0
+        return done
+    ## move the temporary file to its destination, after its size and the source have been checked, 
+    # returns the reason, if the check failed
+    # @param ftp - ftp session to be used
+    # @param typ - direction of transfer, "send" or "get"
+    # @param local - complete local filename
+    # @param remote - complete path of the file on the server
+    # @param entry - manifest entry of transfer, entry[0] holds the size, for "send" entry[2] holds the hash of the local file
+    def sync_finish(self, ftp, typ, local, remote, entry):
+        if typ == "send":
+            tmpname = self.temp_name(remote)
+            size = self.remote_stamp(tmpname, ftp)[0]
+            if size != entry[0]:
+                return "transferred size " + Afp_toString(size) + " differs from " + Afp_toString(entry[0])
+            if Afp_getFileHash(local) != entry[2]:
+                return "local file changed during transfer"
+            try:
+                ftp.rename(tmpname, remote)
+            except ftplib.error_perm:
+                # some servers do not overwrite existing files on rename
+                ftp.delete(remote)
+                ftp.rename(tmpname, remote)
+        else:
+            tmpname = self.temp_name(local)
+            size = os.path.getsize(tmpname)
+            if not entry[0] is None and size != entry[0]:
+                return "transferred size " + Afp_toString(size) + " differs from " + Afp_toString(entry[0])
+            os.replace(tmpname, local)
+        return None
+    ## transfer one file in the session of the current thread into a temporary file, which is renamed on success,
+    # if the transfer is interrupted, it is resumed once in a new session
+    # @param typ - direction of transfer, "send" or "get"
+    # @param local - complete local filename
+    # @param remote - complete path of the file on the server
+    # @param entry - manifest entry of transfer, entry[0] holds the size
+    # @param progress - list holding [position where the transfer starts, number of bytes written into the temporary file], 
+    # the number of written bytes is updated during the transfer
+    def sync_transfer(self, typ, local, remote, entry, progress):
+        offset = progress[0]
+        for attempt in range(2):
+            try:
+                ftp = self.get_session(attempt > 0)
+                if attempt: offset = self.get_resume_offset(ftp, typ, local, remote, progress[1])
+                progress[1] = offset
+                if self.debug: print("AfpFTPConnector.sync_transfer:", typ, local, remote, offset)
+                if typ == "send":
+                    # bytes handed to the connection are only counted as written, if the server holds them afterwards
+                    sent = [offset]
+                    fin = open(local, "rb")
+                    fin.seek(offset)
+                    try:
+                        ftp.storbinary("STOR " + self.temp_name(remote), fin, rest = offset or None, callback = lambda block: sent.__setitem__(0, sent[0] + len(block)))
+                    finally:
+                        fin.close()
+                        if sent[0] > offset:
+                            size = self.remote_stamp(self.temp_name(remote), ftp)[0]
+                            if size is None: progress[1] = offset
+                            else: progress[1] = max(offset, min(size, sent[0]))
+                else:
+                    tmpname = self.temp_name(local)
+                    if offset: 
+                        fout = open(tmpname, "r+b")
+                        fout.truncate(offset)
+                        fout.seek(offset)
+                    else: 
+                        fout = open(tmpname, "wb")
+                    def write(block):
+                        fout.write(block)
+                        progress[1] += len(block)
+                    try:
+                        ftp.retrbinary("RETR " + remote, write, rest = offset or None)
+                    finally:
+                        fout.close()
+                error = self.sync_finish(ftp, typ, local, remote, entry)
+                if error:
+                    # content of temporary file is not reliable, transfer has to be restarted
+                    progress[1] = 0
+                    raise ftplib.error_temp(error)
+                return offset
+            except ftplib.all_errors as e:
+                if attempt or isinstance(e, ftplib.error_perm): raise
+                print("WARNING: FTP", typ + ":", "transfer of", remote, "interrupted (", e, "), will be resumed")
+    ## execute the transfers in parallel ftp sessions, returns the number of transferred files
+    # @param typ - direction of transfer, "send" or "get"
+    # @param jobs - list of transfers [local, remote, manifest entry, offset], manifest entry[0] holds the size
+    def sync_execute(self, typ, jobs):
+        for job in jobs:
+            job.append([job[3], job[3]])
+        manifest = self.get_manifest()
+        # pending transfers are stored, to be able to resume them in a later run
+        manifest.save()
+        done = 0
+        if jobs:
+            pool = concurrent.futures.ThreadPoolExecutor(max_workers = max(1, min(self.sync_sessions, len(jobs))))
+            futures = {}
+            for job in jobs:
+                futures[pool.submit(self.sync_transfer, typ, job[0], job[1], job[2], job[4])] = job
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    job = futures[future]
+                    try:
+                        offset = future.result()
+                    except ftplib.all_errors as e:
+                        print("ERROR: FTP", typ + ":", "transfer of", job[0], "and", job[1], "failed:", e)
+                        # the bytes written into the temporary file are recorded, to be able to resume in a later run
+                        manifest.set_pending(typ, self.manifest_key(job[1]), job[2], job[4][1])
+                        continue
+                    manifest.set_entry(typ, self.manifest_key(job[1]), job[2])
+                    done += 1
+                    if offset: print("FTP", typ + ":", "transfer of", job[0], "and", job[1], "resumed at", offset, "completed")
+                    else: print("FTP", typ + ":", "transfer of", job[0], "and", job[1], "completed")
+            finally:
+                pool.shutdown()
+                self.close_sessions()
+                manifest.save()
+        if self.debug: print("AfpFTPConnector.sync_execute:", typ, done, "of", len(jobs), "files transferred")
+        return done
+    ## collect the files to be sent from a local file or directory, directories are handled recursively
+    # returns a list of [local filename, complete path on server]
+    # @param local - complete local name of file or directory
+    # @param remote - complete path on server
+    def collect_send_files(self, local, remote):
+        if not os.path.isdir(local):
+            return [[local, remote]]
+        files = []
+        locdir = Afp_pathname(local, self.pathdelimiter)
+        for fname in Afp_readFileNames(locdir):
+            rname = self.ext_from_path(fname)
+            if not "." in rname or rname.endswith(self.temp_ending) or not os.path.isfile(fname): continue
+            files.append([Afp_pathname(fname, self.pathdelimiter, True), remote + "/" + rname])
+        for dir in Afp_getDirnames(locdir):
+            dname = self.ext_from_path(dir)
+            if "." in dname: continue
+            files += self.collect_send_files(dir, remote + "/" + dname)
+        return files
+    ## upload files and directories onto the server, only files changed since their last upload are transferred \n
+    # returns the number of transferred files
+    # @param names - local names of files and directories to be sent,
+    # they are written with the same name into the actuel remote directory
+    def sync_send(self, names):
+        if not self.connected: return 0
+        files = []
+        for name in names:
+            local = self.complete_filename(name)
+            if Afp_existsFile(local):
+                files += self.collect_send_files(local, self.remote_path(self.ext_from_path(local)))
+        return self.sync_send_files(files)
+    ## upload files onto the server, only files changed since their last upload are transferred \n
+    # returns the number of transferred files
+    # @param files - list of [local filename, complete path on server]
+    def sync_send_files(self, files):
+        manifest = self.get_manifest()
+        jobs = []
+        for local, remote in files:
+            key = self.manifest_key(remote)
+            stat = os.stat(local)
+            entry = manifest.get_entry("send", key)
+            if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime: continue
+            new = [stat.st_size, stat.st_mtime, Afp_getFileHash(local)]
+            if entry and entry[0] == new[0] and entry[2] == new[2]:
+                # only the timestamp has changed
+                manifest.set_entry("send", key, new)
+                continue
+            offset = 0
+            pending = manifest.get_pending("send", key)
+            if pending and pending[0] == new:
+                offset = self.get_resume_offset(self.FTP, "send", local, remote, pending[1])
+            manifest.set_pending("send", key, new, offset)
+            jobs.append([local, remote, new, offset])
+        if self.debug: print("AfpFTPConnector.sync_send_files:", len(jobs), "of", len(files), "files changed")
+        self.make_remote_dirs([job[1] for job in jobs])
+        return self.sync_execute("send", jobs)
+    ## collect the files to be retrieved from a remote directory, directories are handled recursively
+    # returns a list of [local filename, complete path on server, [size, modify]]
+    # @param remote - complete path of the directory on server
+    # @param local - complete local name of directory, if it does not exist, it will be created
+    def collect_get_files(self, remote, local):
+        if not Afp_existsFile(local):
+            Afp_genDir(local)
+        locdir = Afp_pathname(local, self.pathdelimiter)
+        files, dirs = self.list_remote(remote)
+        remote = remote.rstrip("/")
+        liste = []
+        for fname, size, modify in files:
+            liste.append([locdir + fname, remote + "/" + fname, [size, modify]])
+        for dname in dirs:
+            liste += self.collect_get_files(remote + "/" + dname, locdir + dname)
+        return liste
+    ## download files and directories from the server, only files changed since their last download are transferred \n
+    # returns the number of transferred files
+    # @param names - names of files and directories in the actuel remote directory,
+    # they are written with the same name into the local directory, None: the actuel remote directory is written into the local directory
+    def sync_get(self, names):
+        if not self.connected: return 0
+        files = []
+        for name in names:
+            remote = self.remote_path(name)
+            if name is None:
+                files += self.collect_get_files(remote, self.localdir)
+            elif self.remote_is_dir(remote):
+                files += self.collect_get_files(remote, self.complete_filename(remote.split("/")[-1]))
+            else:
+                files.append([self.complete_filename(remote.split("/")[-1]), remote, self.remote_stamp(remote)])
+        return self.sync_get_files(files)
+    ## download files from the server, only files changed since their last download are transferred \n
+    # returns the number of transferred files
+    # @param files - list of [local filename, complete path on server, [size, modify]]
+    def sync_get_files(self, files):
+        manifest = self.get_manifest()
+        jobs = []
+        for local, remote, stamp in files:
+            key = self.manifest_key(remote)
+            exists = Afp_existsFile(local)
+            if exists and (stamp[0] is None or os.path.getsize(local) == stamp[0]) and manifest.get_entry("get", key) == stamp: continue
+            offset = 0
+            pending = manifest.get_pending("get", key)
+            if pending and pending[0] == stamp:
+                offset = self.get_resume_offset(self.FTP, "get", local, remote, pending[1])
+            manifest.set_pending("get", key, stamp, offset)
+            jobs.append([local, remote, stamp, offset])
+        if self.debug: print("AfpFTPConnector.sync_get_files:", len(jobs), "of", len(files), "files changed")
+        return self.sync_execute("get", jobs)
     ## leave actuel ftp-session
     def quit(self):
         res = None
+        self.close_sessions()
         if self.connected: 
             res = self.FTP.quit()
             self.connected = False
@@ -1953,11 +2577,16 @@ if __name__ == "__main__":
             print("   ftp-server  name or IP of ftpserver")
             print("   ftp-user    name user on ftpserver")
             print("   ftp-word    encrypted word for user")
+            print("   ftp-sync    if set to 1, only files changed since their last transfer are sent or retrieved, using parallel sessions")
+            print("   ftp-sync-sessions   number of parallel ftp sessions in sync mode, default: 4")
+            print("   ftp-manifest        file holding the state of the transferred files in sync mode, default: 'AfpInternetUpdater.manifest' beside configuration")
             print("   LOCAL section:")
             print("   local-clientname  name of client to be displayed in dilaog")
             print("   local-root        local directory where data could be found")
             print("   local-maximages   maximum number of slides to be inserted into slideshow - only for slideshows")
             print("   local-max-thumbs-per-line   maximal number of thumbs in a line of slideshow index file - only for slideshows")
+            print("   local-thumbdir    directory where the thumbnails of the images are cached, default: '.AfpThumbnails' in home directory")
+            print("   local-thumb-workers   number of processes generating thumbnails, default: number of cpus (needs PIL, otherwise wx is used)")
             print("   CALENDAR section:")
             print("   cal-[Name]        relativ_path_to_'local-root'_for_file_holding_eventdata,relativ_path_to_file_on_ftp-site_holding_eventdata")
             print("       [Name]        type of events delivered in file, will be displayed on button")
@@ -0,0 +1,161 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+## @package AfpUtilities.test_AfpInternetUpdater
+# test of the sync mode of AfpFTPConnector against a local pyftpdlib server
+#
+#
+# This file is part of the  'Open Source' project "BusAfp" by
+#  AfpTechnologies (afptech.de)
+#
+#    BusAfp is a software to manage coach and travel acivities
+#    Copyright (C) 1989 - 2025 afptech.de (Andreas Knoblauch)
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#    This program is distributed in the hope that it will be useful, but
+#    WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#    See the GNU General Public License for more details.
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import sys
+import base64
+import tempfile
+import shutil
+import threading
+import unittest
+import importlib.util
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+available = bool(importlib.util.find_spec("pyftpdlib") and importlib.util.find_spec("wx"))
+if available:
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.servers import ThreadedFTPServer
+    from AfpUtilities.AfpInternetUpdater import AfpFTPConnector, Afp_getFileHash
+
+    ## ftp handler answering the first STOR and RETR commands of each file with a temporary error
+    class AfpTest_FlakyHandler(FTPHandler):
+        failed = set()
+        def ftp_STOR(self, file, mode = "w"):
+            if ("STOR", file) in self.failed: return FTPHandler.ftp_STOR(self, file, mode)
+            self.failed.add(("STOR", file))
+            self.respond("451 Temporary failure.")
+        def ftp_RETR(self, file):
+            if ("RETR", file) in self.failed: return FTPHandler.ftp_RETR(self, file)
+            self.failed.add(("RETR", file))
+            self.respond("451 Temporary failure.")
+
+## test sync mode of AfpFTPConnector
+@unittest.skipUnless(available, "pyftpdlib or wx not available")
+class AfpTest_FTPSync(unittest.TestCase):
+    handler = None
+    ## start local ftp server
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.serverdir = os.path.join(self.root, "server")
+        self.localdir = os.path.join(self.root, "local")
+        os.mkdir(self.serverdir)
+        os.mkdir(self.localdir)
+        authorizer = DummyAuthorizer()
+        authorizer.add_user("afp", "secret", self.serverdir, perm = "elradfmwMT")
+        handler = self.handler or FTPHandler
+        handler.authorizer = authorizer
+        if handler is not FTPHandler: handler.failed = set()
+        self.server = ThreadedFTPServer(("localhost", 0), handler)
+        self.port = self.server.address[1]
+        self.thread = threading.Thread(target = self.server.serve_forever, kwargs = {"timeout": 0.1})
+        self.thread.start()
+        self.config = os.path.join(self.root, "test.cfg")
+        fout = open(self.config, "w")
+        fout.write("ftp-sync=1\nftp-sync-sessions=2\nftp-manifest=" + os.path.join(self.root, "test.manifest") + "\n")
+        fout.close()
+        self.connectors = []
+    ## stop local ftp server
+    def tearDown(self):
+        for connector in self.connectors: connector.quit()
+        self.server.close_all()
+        self.thread.join()
+        shutil.rmtree(self.root)
+    ## return a new connector, logged into the local ftp server
+    def connect(self):
+        connector = AfpFTPConnector(self.config, False, "localhost", self.port)
+        connector.set_localdir(self.localdir)
+        connector.invoke_ftp("afp", base64.b64encode(b"secret"))
+        self.connectors.append(connector)
+        return connector
+    ## write a local file
+    def write(self, name, content):
+        fout = open(os.path.join(self.localdir, name), "wb")
+        fout.write(content)
+        fout.close()
+    ## read a file
+    def read(self, path):
+        fin = open(path, "rb")
+        content = fin.read()
+        fin.close()
+        return content
+    ## only changed files are sent
+    def test_send_changed(self):
+        self.write("a.txt", b"a"*100000)
+        self.write("b.txt", b"b"*10)
+        self.assertEqual(self.connect().sync_send(["a.txt", "b.txt"]), 2)
+        self.assertEqual(self.read(os.path.join(self.serverdir, "a.txt")), b"a"*100000)
+        self.assertEqual(self.connect().sync_send(["a.txt", "b.txt"]), 0)
+        self.write("b.txt", b"c"*20)
+        self.assertEqual(self.connect().sync_send(["a.txt", "b.txt"]), 1)
+        self.assertEqual(self.read(os.path.join(self.serverdir, "b.txt")), b"c"*20)
+        self.assertFalse([name for name in os.listdir(self.serverdir) if name.endswith(".afppart")])
+    ## a pending transfer is not resumed onto stale content of the temporary file
+    def test_send_stale_pending(self):
+        content = b"new content "*1000
+        self.write("a.txt", content)
+        connector = self.connect()
+        stale = open(os.path.join(self.serverdir, "a.txt.afppart"), "wb")
+        stale.write(b"x"*(len(content) - 10))
+        stale.close()
+        stat = os.stat(os.path.join(self.localdir, "a.txt"))
+        entry = [stat.st_size, stat.st_mtime, Afp_getFileHash(os.path.join(self.localdir, "a.txt"))]
+        # transfer has been registered, but no byte has been written by it
+        connector.get_manifest().set_pending("send", connector.manifest_key("/a.txt"), entry, 0)
+        self.assertEqual(connector.sync_send(["a.txt"]), 1)
+        self.assertEqual(self.read(os.path.join(self.serverdir, "a.txt")), content)
+    ## bytes recorded by an interrupted transfer are resumed
+    def test_send_resume_recorded(self):
+        content = os.urandom(50000)
+        self.write("a.txt", content)
+        connector = self.connect()
+        part = open(os.path.join(self.serverdir, "a.txt.afppart"), "wb")
+        part.write(content[:20000] + b"x"*5000)
+        part.close()
+        stat = os.stat(os.path.join(self.localdir, "a.txt"))
+        entry = [stat.st_size, stat.st_mtime, Afp_getFileHash(os.path.join(self.localdir, "a.txt"))]
+        connector.get_manifest().set_pending("send", connector.manifest_key("/a.txt"), entry, 20000)
+        self.assertEqual(connector.sync_send(["a.txt"]), 1)
+        self.assertEqual(self.read(os.path.join(self.serverdir, "a.txt")), content)
+    ## only changed files are retrieved, stale local temporary files are not resumed
+    def test_get_changed(self):
+        fout = open(os.path.join(self.serverdir, "r.txt"), "wb")
+        fout.write(b"r"*30000)
+        fout.close()
+        stale = open(os.path.join(self.localdir, "r.txt.afppart"), "wb")
+        stale.write(b"x"*20000)
+        stale.close()
+        connector = self.connect()
+        self.assertEqual(connector.sync_get(["r.txt"]), 1)
+        self.assertEqual(self.read(os.path.join(self.localdir, "r.txt")), b"r"*30000)
+        self.assertEqual(self.connect().sync_get(["r.txt"]), 0)
+
+## test sync mode of AfpFTPConnector, when the server answers with temporary errors before the transfer starts
+@unittest.skipUnless(available, "pyftpdlib or wx not available")
+class AfpTest_FTPSyncFlaky(AfpTest_FTPSync):
+    if available: handler = AfpTest_FlakyHandler
+
+if __name__ == "__main__":
+    unittest.main()